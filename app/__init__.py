@@ -1,8 +1,13 @@
 import os
 
 from flask import Flask
-from flasgger import Swagger  # type: ignore
 from app.db.models import db
+from app.db.engine import init_db
+from app.db.migrations import upgrade_database
+from app.db.repository import init_repository
+from app.monitoring.instrumentation import init_monitoring
+from app.notifications.dispatcher import init_notifications
+from app.utils.response_cache import init_response_cache
 
 DATABASE_PATH = "db/data/database.db"
 
@@ -15,24 +20,28 @@ def create_app(test_config=None):
     else:
         basedir = os.path.abspath(os.path.dirname(__file__))
         join_path = os.path.join(basedir, DATABASE_PATH)
-        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + join_path
+        app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
+            "DATABASE_URL", "sqlite:///" + join_path
+        )
+        # any setting can be given by a FLASK_ prefixed variable, e.g. FLASK_RESPONSE_CACHE_MAX_SIZE=0
+        app.config.from_prefixed_env()
 
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-    db.init_app(app)
-
-    swagger = Swagger(
-        app,
-        template={
-            "swagger": "2.0",
-            "info": {
-                "title": "LibraryApp",
-                "description": "LibraryApp for managing books and wishlists",
-                "version": "1.0",
-            },
-            "basePath": "/",
-        },
-    )
+    init_db(app)
+    init_monitoring(app)
+
+    if not test_config:
+        with app.app_context():
+            upgrade_database()
+
+    init_repository(app)
+    init_response_cache(app)
+    init_notifications(app)
+
+    from app.routes.apidocs import bp as apidocs
+
+    app.register_blueprint(apidocs)
 
     from app.routes.home import bp as home
 
@@ -58,4 +67,8 @@ def create_app(test_config=None):
 
     app.register_blueprint(wishlists)
 
+    from app.routes.metrics import bp as metrics
+
+    app.register_blueprint(metrics)
+
     return app
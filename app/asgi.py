@@ -0,0 +1,9 @@
+"""
+Entry point of the async serving mode, search and reports are served by coroutines
+
+    uvicorn app.asgi:app --workers 4
+"""
+
+from app.async_app import create_asgi_app
+
+app = create_asgi_app()
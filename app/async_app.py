@@ -0,0 +1,244 @@
+import asyncio
+import io
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from flask import request
+from sqlalchemy.ext.asyncio import AsyncSession
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from app.db.async_engine import AsyncUnavailable, init_async_db
+from app.notifications.dispatcher import start_notifications
+from app.routes.books import search_books_plan
+from app.routes.reports import (
+    amount_plan,
+    rental_history_plan,
+    top_rentals_by_usernames_plan,
+    top_rentals_plan,
+)
+from app.utils.read_plan import ReadPlan
+from app.utils.response_cache import lookup_response, serve_cached, store_response
+
+# request bodies larger than this are spooled to a temporary file before the Flask application reads them
+MAX_MEMORY_BODY = 1024 * 1024
+
+# defaults of ASYNC_* config
+ASYNC_DEFAULTS = {
+    # threads of a worker running requests of the Flask application, i.e. writes, streams and other endpoints
+    "ASYNC_WSGI_THREADS": 16,
+}
+
+# plans of read-only views served by coroutines by endpoint, every one of the views is cached by cached_response
+ASYNC_VIEWS = {
+    "books.search_books": search_books_plan,
+    "reports.reports_amount_of_rented_books_with_delta": amount_plan,
+    "reports.reports_top_rentals": top_rentals_plan,
+    "reports.reports_top_rentals_by_usernames": top_rentals_by_usernames_plan,
+    "reports.reports_rental_history": rental_history_plan,
+}
+
+
+class AsyncApp:
+    """
+    ASGI application serving search and reports by coroutines over the asyncio engine,
+    so a request waiting for the database holds no thread. The views run with their Flask request hooks,
+    cache and serialization, only their queries are awaited.
+    Writes, streams and other endpoints are passed to the Flask application running in a pool of threads.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        config = {
+            name: app.config.setdefault(name, value)
+            for name, value in ASYNC_DEFAULTS.items()
+        }
+        self.executor = ThreadPoolExecutor(
+            config["ASYNC_WSGI_THREADS"], thread_name_prefix="wsgi"
+        )
+        try:
+            self.engine = init_async_db(app)
+        except AsyncUnavailable as error:
+            print(f"{error} All requests are served by the Flask application.")
+            self.engine = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        if scope["type"] != "http":
+            return
+        plan = self._async_plan(scope)
+        if plan is None:
+            await self._call_wsgi(scope, receive, send)
+            return
+
+        environ = build_environ(scope)
+        with self.app.request_context(environ):
+            try:
+                response = await self._full_dispatch_request(plan)
+            except Exception as error:
+                response = self.app.handle_exception(error)
+            await send_response(response, environ, send)
+
+    def _async_plan(self, scope):
+        if self.engine is None or scope["method"] != "GET":
+            return None
+        # streams are written by a thread as they are read
+        if "stream" in parse_qs(scope["query_string"].decode("latin-1")):
+            return None
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(build_environ(scope)).match()
+        except HTTPException:
+            return None
+        return ASYNC_VIEWS.get(endpoint)
+
+    async def _full_dispatch_request(self, plan):
+        # Flask.full_dispatch_request with an awaited view
+        try:
+            response = self.app.preprocess_request()
+            if response is None:
+                response = await self._cached_view(plan)
+        except Exception as error:
+            response = self.app.handle_user_exception(error)
+        return self.app.finalize_request(response)
+
+    async def _cached_view(self, plan):
+        # generations of other workers are read by a short synchronous query once per CACHE_SYNC_INTERVAL
+        lookup = lookup_response()
+        cached = lookup.cached
+        if cached is None:
+            response = self.app.make_response(
+                await self._run_plan(plan(**request.view_args))
+            )
+            cached = store_response(lookup, response)
+            if cached is None:
+                return response
+        return serve_cached(cached, hit=lookup.cached is not None)
+
+    async def _run_plan(self, plan):
+        if not isinstance(plan, ReadPlan):
+            return plan
+        async with AsyncSession(self.engine) as session:
+            result = await session.execute(plan.query)
+            return plan.respond(result.all())
+
+    async def _call_wsgi(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        with tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_BODY) as body:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body.seek(0)
+            environ = build_environ(scope, body)
+            await loop.run_in_executor(
+                self.executor, self._run_wsgi, environ, send, loop
+            )
+
+    def _run_wsgi(self, environ: dict, send, loop):
+        # runs in a thread of the pool, chunks of the body are sent as they are produced
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started: list[dict] = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [
+                {
+                    "type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers
+                    ],
+                }
+            ]
+
+        chunks = self.app(environ, start_response)
+        try:
+            for chunk in chunks:
+                if started:
+                    send_message(started.pop())
+                if chunk:
+                    send_message(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            if started:
+                send_message(started.pop())
+            send_message({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # every server worker delivers notifications of its own
+                start_notifications(self.app)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.engine is not None:
+                    await self.engine.dispose()
+                self.app.extensions["notifications"].stop()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def build_environ(scope, body=None) -> dict:
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body if body is not None else io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("server"):
+        host, port = scope["server"]
+        environ["SERVER_NAME"], environ["SERVER_PORT"] = host, str(port or 80)
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def send_response(response, environ: dict, send):
+    # headers and body as a WSGI server would send them, e.g. without a body of 304
+    body, status, headers = response.get_wsgi_response(environ)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"".join(body)})
+
+
+def create_asgi_app(test_config=None) -> AsyncApp:
+    return AsyncApp(create_app(test_config=test_config))
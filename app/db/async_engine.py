@@ -0,0 +1,55 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.db.engine import is_memory_database, sqlite_pragmas, sqlite_pragmas_listener
+
+EXTENSION = "async_db"
+# asyncio drivers by database, psycopg serves both synchronous and asyncio connections
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+psycopg",
+}
+
+
+class AsyncUnavailable(RuntimeError):
+    pass
+
+
+def init_async_db(app) -> AsyncEngine:
+    """
+    Create an asyncio engine over the database of the application, bound after init_db
+    with the same pool options and SQLite pragmas. Its connections are not shared with the Flask session,
+    so an in-memory SQLite database cannot be used.
+    """
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise AsyncUnavailable(f"No asyncio driver for {backend} databases")
+    if backend == "sqlite" and is_memory_database(url.database):
+        raise AsyncUnavailable("In-memory SQLite database is not shared by engines")
+
+    try:
+        engine = create_async_engine(
+            url.set(drivername=ASYNC_DRIVERS[backend]),
+            **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+        )
+    except ImportError as error:
+        raise AsyncUnavailable(
+            f"Async serving requires {error.name}, install it with `poetry install --extras async`."
+        ) from error
+    if backend == "sqlite":
+        event.listen(
+            engine.sync_engine, "connect", sqlite_pragmas_listener(sqlite_pragmas(app))
+        )
+
+    monitoring = app.extensions.get("monitoring")
+    if monitoring is not None:
+        monitoring.watch_engine(engine)
+    app.extensions[EXTENSION] = engine
+    return engine
+
+
+def get_async_engine() -> AsyncEngine:
+    return current_app.extensions[EXTENSION]
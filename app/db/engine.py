@@ -0,0 +1,90 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app.db.models import db
+
+# pragmas applied on every new SQLite connection, selected by SQLITE_PROFILE config
+SQLITE_PROFILES = {
+    "default": {},
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_SQLITE_PROFILE = "tuned"
+
+# readers do not block the writer in WAL mode, so a pool larger than the default is useful
+SQLITE_ENGINE_OPTIONS = {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_timeout": 30,
+}
+
+# every worker process keeps its own pool, so total connections are workers * (pool_size + max_overflow)
+POSTGRES_ENGINE_OPTIONS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+    "pool_use_lifo": True,
+}
+POSTGRES_DRIVER = "postgresql+psycopg"
+
+
+def init_db(app):
+    """
+    Bind database to the application, engine is tuned according to SQLITE_PROFILE,
+    SQLITE_PRAGMAS and SQLALCHEMY_ENGINE_OPTIONS config.
+    Any SQLAlchemy URL is accepted, PostgreSQL ones without a driver use psycopg.
+    """
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    if url.drivername in ("postgres", "postgresql"):
+        url = url.set(drivername=POSTGRES_DRIVER)
+        app.config["SQLALCHEMY_DATABASE_URI"] = url.render_as_string(
+            hide_password=False
+        )
+
+    defaults = {}
+    if url.get_backend_name() == "postgresql":
+        defaults = POSTGRES_ENGINE_OPTIONS
+    elif url.get_backend_name() == "sqlite" and not is_memory_database(url.database):
+        defaults = SQLITE_ENGINE_OPTIONS
+
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    for name, value in defaults.items():
+        options.setdefault(name, value)
+
+    db.init_app(app)
+
+    if url.get_backend_name() == "sqlite":
+        pragmas = sqlite_pragmas(app)
+        with app.app_context():
+            event.listen(db.engine, "connect", sqlite_pragmas_listener(pragmas))
+
+
+def sqlite_pragmas(app) -> dict:
+    profile = app.config.get("SQLITE_PROFILE", DEFAULT_SQLITE_PROFILE)
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile '{profile}'")
+    return {**SQLITE_PROFILES[profile], **app.config.get("SQLITE_PRAGMAS", {})}
+
+
+def sqlite_pragmas_listener(pragmas: dict):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return set_pragmas
+
+
+def is_memory_database(database: str | None) -> bool:
+    return (
+        not database or database == ":memory:" or database.startswith("file::memory:")
+    )
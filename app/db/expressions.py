@@ -0,0 +1,38 @@
+from sqlalchemy import Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class days_since(FunctionElement):
+    """
+    Whole days elapsed between a timestamp column and the current time of the database,
+    computed by the database so that only the number is returned.
+    SQLite timestamps are stored in local time, PostgreSQL ones with a time zone.
+    """
+
+    type = Integer()
+    inherit_cache = True
+    name = "days_since"
+
+
+@compiles(days_since, "sqlite")
+def _days_since_sqlite(element, compiler, **kw):
+    (column,) = element.clauses
+    return (
+        "CAST(julianday('now', 'localtime') - julianday(%s) AS INTEGER)"
+        % compiler.process(column, **kw)
+    )
+
+
+@compiles(days_since, "postgresql")
+def _days_since_postgresql(element, compiler, **kw):
+    (column,) = element.clauses
+    return "CAST(date_part('day', now() - %s) AS INTEGER)" % compiler.process(
+        column, **kw
+    )
+
+
+@compiles(days_since)
+def _days_since_default(element, compiler, **kw):
+    (column,) = element.clauses
+    return "EXTRACT(DAY FROM CURRENT_TIMESTAMP - %s)" % compiler.process(column, **kw)
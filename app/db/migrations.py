@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+
+from sqlalchemy import Table, func, inspect, select, text, update
+
+from app.db.models import Book, User, Wishlist, Rentals, db
+from app.db.rental_history import ensure_rental_history
+from app.db.rental_stats import ensure_rental_stats
+from app.db.search_index import ensure_search_index
+
+# indexes replaced by the ones with a different name, e.g. made unique
+OBSOLETE_INDEXES = ["ix_rentals_book_id"]
+# key of the PostgreSQL advisory lock held while the schema is upgraded
+SCHEMA_LOCK_ID = 20240417
+
+
+def upgrade_database():
+    """
+    Create the schema of an empty database or bring a database created by an earlier version
+    of the application up to date. Missing tables and indexes are created, rows violating
+    new unique constraints are merged first.
+    """
+    with schema_lock():
+        _upgrade_database()
+
+
+@contextmanager
+def schema_lock():
+    # worker processes starting together over one PostgreSQL database upgrade it one by one
+    if db.engine.dialect.name != "postgresql":
+        yield
+        return
+    with db.engine.connect() as connection:
+        connection.execute(select(func.pg_advisory_lock(SCHEMA_LOCK_ID)))
+        try:
+            yield
+        finally:
+            connection.execute(select(func.pg_advisory_unlock(SCHEMA_LOCK_ID)))
+            connection.commit()
+
+
+def _upgrade_database():
+    engine = db.engine
+    if not inspect(engine).has_table(Book.__tablename__):
+        # empty database, tables are created with all of their indexes
+        db.create_all()
+        return
+
+    db.create_all()
+
+    with engine.begin() as connection:
+        merge_duplicates(
+            connection,
+            Book.__table__,
+            "book_id",
+            [Wishlist.__table__, Rentals.__table__],
+        )
+        merge_duplicates(
+            connection,
+            User.__table__,
+            "user_name",
+            [Wishlist.__table__, Rentals.__table__],
+        )
+        remove_duplicates(connection, Wishlist.__table__, ["user_id", "book_id"])
+        remove_duplicates(connection, Rentals.__table__, ["book_id"])
+        for index_name in OBSOLETE_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+    ensure_search_index()
+    # counters are built from the history, so it has to exist first
+    ensure_rental_history()
+    ensure_rental_stats()
+
+
+def merge_duplicates(connection, table: Table, key: str, referencing: list[Table]):
+    # rows sharing the key are merged into the one with the lowest id
+    foreign_key = f"{table.name}_id"
+    duplicates = connection.execute(
+        select(table.c[key], func.min(table.c.id), func.count())
+        .group_by(table.c[key])
+        .having(func.count() > 1)
+    ).all()
+
+    for value, kept_id, count in duplicates:
+        duplicate_ids = select(table.c.id).where(
+            table.c[key] == value, table.c.id != kept_id
+        )
+        for other in referencing:
+            connection.execute(
+                update(other)
+                .where(other.c[foreign_key].in_(duplicate_ids))
+                .values({foreign_key: kept_id})
+            )
+        connection.execute(table.delete().where(table.c.id.in_(duplicate_ids)))
+        print(f"Merged {count - 1} duplicates of {table.name}.{key}={value!r}")
+
+
+def remove_duplicates(connection, table: Table, key: list[str]):
+    kept_ids = select(func.min(table.c.id)).group_by(*(table.c[name] for name in key))
+    removed = connection.execute(
+        table.delete().where(table.c.id.not_in(kept_ids))
+    ).rowcount
+    if removed:
+        print(f"Removed {removed} duplicated rows of {table.name}")
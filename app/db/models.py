@@ -6,8 +6,11 @@ db = SQLAlchemy()
 
 class Book(db.Model):  # type: ignore
     id = db.Column(db.Integer, primary_key=True, nullable=False)
-    book_id = db.Column(db.Integer, nullable=False)
-    isbn = db.Column(db.Integer, nullable=False)
+    book_id = db.Column(db.Integer, nullable=False, index=True, unique=True)
+    # some ISBN-10 end with X, SQLite keeps them as text in an integer column, PostgreSQL needs a text one
+    isbn = db.Column(
+        db.Integer().with_variant(db.String(), "postgresql"), nullable=False
+    )
     authors = db.Column(db.String, nullable=False)
     publication_year = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String)
@@ -25,7 +28,7 @@ class Book(db.Model):  # type: ignore
 
 class User(db.Model):  # type: ignore
     id = db.Column(db.Integer, primary_key=True)
-    user_name = db.Column(db.String, nullable=False)
+    user_name = db.Column(db.String, nullable=False, index=True, unique=True)
     user_type = db.Column(db.String, nullable=False)
 
     wishlist = db.relationship("Wishlist", back_populates="user", uselist=False)
@@ -36,9 +39,15 @@ class User(db.Model):  # type: ignore
 
 
 class Wishlist(db.Model):  # type: ignore
+    __table_args__ = (
+        db.Index("ix_wishlist_user_id_book_id", "user_id", "book_id", unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey("book.id"), nullable=False)
+    book_id = db.Column(
+        db.Integer, db.ForeignKey("book.id"), nullable=False, index=True
+    )
 
     user = db.relationship("User", back_populates="wishlist")
     book = db.relationship("Book", back_populates="wishlisted_by")
@@ -50,8 +59,13 @@ class Wishlist(db.Model):  # type: ignore
 
 
 class Rentals(db.Model):  # type: ignore
+    # book can be borrowed only once at a time
+    __table_args__ = (db.Index("uq_rentals_book_id", "book_id", unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
     book_id = db.Column(db.Integer, db.ForeignKey("book.id"), nullable=False)
     created_at = db.Column(
         db.DateTime(timezone=True), server_default=func.now(), nullable=False
@@ -62,3 +76,141 @@ class Rentals(db.Model):  # type: ignore
 
     def __repr__(self):
         return f"<Rentals(id={self.id}, user_id={self.user_id}, book_id={self.book_id} created_at={self.created_at})>"
+
+
+class RentalEvent(db.Model):  # type: ignore
+    # append-only log of checkouts and returns, rows older than the retention are compacted
+    # into RentalDailyStats, ids are kept without foreign keys so history outlives books and users
+    __table_args__ = (
+        db.Index("ix_rental_event_occurred_at", "occurred_at"),
+        db.Index("ix_rental_event_book_id_occurred_at", "book_id", "occurred_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String, nullable=False)
+    book_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    occurred_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<RentalEvent(id={self.id}, event_type='{self.event_type}', book_id={self.book_id}, "
+            f"user_id={self.user_id}, occurred_at={self.occurred_at})>"
+        )
+
+
+class RentalDailyStats(db.Model):  # type: ignore
+    # compacted rental events, one row per day, book and user
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    checkouts = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<RentalDailyStats(day={self.day}, book_id={self.book_id}, user_id={self.user_id}, "
+            f"checkouts={self.checkouts}, returns={self.returns})>"
+        )
+
+
+class BookRentalStats(db.Model):  # type: ignore
+    # number of times a book has been borrowed, maintained by app.db.rental_stats
+    __table_args__ = (
+        db.Index(
+            "ix_book_rental_stats_rental_count_book_id",
+            db.text("rental_count DESC"),
+            "book_id",
+        ),
+    )
+
+    book_id = db.Column(
+        db.Integer, db.ForeignKey("book.id", ondelete="CASCADE"), primary_key=True
+    )
+    rental_count = db.Column(db.Integer, nullable=False, default=0)
+
+    book = db.relationship("Book")
+
+    def __repr__(self):
+        return f"<BookRentalStats(book_id={self.book_id}, rental_count={self.rental_count})>"
+
+
+class BookUserRentalStats(db.Model):  # type: ignore
+    # number of times a book has been borrowed by a user
+    __table_args__ = (
+        db.Index(
+            "ix_book_user_rental_stats_rental_count_book_id_user_id",
+            db.text("rental_count DESC"),
+            "book_id",
+            "user_id",
+        ),
+    )
+
+    book_id = db.Column(
+        db.Integer, db.ForeignKey("book.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    rental_count = db.Column(db.Integer, nullable=False, default=0)
+
+    book = db.relationship("Book")
+    user = db.relationship("User")
+
+    def __repr__(self):
+        return (
+            f"<BookUserRentalStats(book_id={self.book_id}, user_id={self.user_id}, "
+            f"rental_count={self.rental_count})>"
+        )
+
+
+class ImportCheckpoint(db.Model):  # type: ignore
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String, nullable=False, unique=True)
+    signature = db.Column(db.String, nullable=False)
+    rows_committed = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<ImportCheckpoint(id={self.id}, source='{self.source}', rows_committed={self.rows_committed})>"
+
+
+class NotificationOutbox(db.Model):  # type: ignore
+    # notifications are written in the transaction of the change they are about
+    # and delivered by the dispatcher after it has been committed
+    __table_args__ = (
+        db.Index(
+            "ix_notification_outbox_status_next_attempt_at", "status", "next_attempt_at"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_name = db.Column(db.String, nullable=False)
+    book_title = db.Column(db.String)
+    status = db.Column(db.String, nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # naive UTC, compared with timestamps computed by the dispatcher
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    claim = db.Column(db.String)
+    last_error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<NotificationOutbox(id={self.id}, user_name='{self.user_name}', "
+            f"status='{self.status}', attempts={self.attempts})>"
+        )
+
+
+class CacheGeneration(db.Model):  # type: ignore
+    # bumped when cached rows change, workers compare it to drop their stale lookup caches
+    name = db.Column(db.String, primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CacheGeneration(name='{self.name}', generation={self.generation})>"
@@ -0,0 +1,172 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import (
+    Date,
+    case,
+    cast,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+    union_all,
+)
+from sqlalchemy.sql import Select
+
+from app.db.models import RentalDailyStats, RentalEvent, Rentals, db
+from app.utils.bulk_insert import dialect_insert, execute_rowcount
+
+CHECKOUT = "checkout"
+RETURN = "return"
+# raw events are kept for this many days, older ones are compacted into daily rows
+RETENTION_DAYS = 90
+
+
+def record_events(
+    event_type: str, rentals: list[tuple[int, int]], occurred_at: datetime | None = None
+):
+    """
+    Append events for (book id, user id) pairs with a single statement, changes are not committed.
+    """
+    if not rentals:
+        return
+    occurred_at = occurred_at or datetime.now()
+    db.session.execute(
+        insert(RentalEvent),
+        [
+            {
+                "event_type": event_type,
+                "book_id": book_id,
+                "user_id": user_id,
+                "occurred_at": occurred_at,
+            }
+            for book_id, user_id in rentals
+        ],
+    )
+
+
+def event_day(column):
+    # SQLite keeps dates as ISO strings, which date() returns, other databases cast timestamps
+    if db.engine.dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def compact_rental_events(
+    retention_days: int = RETENTION_DAYS, today: date | None = None
+) -> int:
+    """
+    Roll raw events of whole days older than the retention into daily rows and delete them.
+    Returns the number of compacted events, changes are not committed.
+    """
+    cutoff = datetime.combine(
+        (today or date.today()) - timedelta(days=retention_days), time.min
+    )
+    events = RentalEvent.__table__
+    daily = RentalDailyStats.__table__
+    day = event_day(events.c.occurred_at)
+
+    rollup = (
+        select(
+            day,
+            events.c.book_id,
+            events.c.user_id,
+            func.sum(case((events.c.event_type == CHECKOUT, 1), else_=0)),
+            func.sum(case((events.c.event_type == RETURN, 1), else_=0)),
+        )
+        .where(events.c.occurred_at < cutoff)
+        .group_by(day, events.c.book_id, events.c.user_id)
+    )
+    statement = dialect_insert(daily).from_select(
+        ["day", "book_id", "user_id", "checkouts", "returns"], rollup
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["day", "book_id", "user_id"],
+        set_={
+            "checkouts": daily.c.checkouts + statement.excluded.checkouts,
+            "returns": daily.c.returns + statement.excluded.returns,
+        },
+    )
+    db.session.execute(statement)
+    return execute_rowcount(events.delete().where(events.c.occurred_at < cutoff))
+
+
+def rental_counts() -> Select:
+    """
+    Query of (book_id, user_id, checkouts, returns) over the whole history, raw and compacted.
+    """
+    events = RentalEvent.__table__
+    daily = RentalDailyStats.__table__
+    history = union_all(
+        select(
+            events.c.book_id,
+            events.c.user_id,
+            case((events.c.event_type == CHECKOUT, 1), else_=0).label("checkouts"),
+            case((events.c.event_type == RETURN, 1), else_=0).label("returns"),
+        ),
+        select(daily.c.book_id, daily.c.user_id, daily.c.checkouts, daily.c.returns),
+    ).subquery()
+    return select(
+        history.c.book_id,
+        history.c.user_id,
+        func.sum(history.c.checkouts).label("checkouts"),
+        func.sum(history.c.returns).label("returns"),
+    ).group_by(history.c.book_id, history.c.user_id)
+
+
+def rental_history_query(start: date, end: date) -> Select:
+    """
+    Query of (book_id, checkouts, returns) of events between start and end days, both included.
+    Recent days are read from raw events and older ones from daily rows, both by index range scans.
+    """
+    events = RentalEvent.__table__
+    daily = RentalDailyStats.__table__
+    history = union_all(
+        select(
+            events.c.book_id,
+            case((events.c.event_type == CHECKOUT, 1), else_=0).label("checkouts"),
+            case((events.c.event_type == RETURN, 1), else_=0).label("returns"),
+        ).where(
+            events.c.occurred_at >= datetime.combine(start, time.min),
+            events.c.occurred_at < datetime.combine(end + timedelta(days=1), time.min),
+        ),
+        select(daily.c.book_id, daily.c.checkouts, daily.c.returns).where(
+            daily.c.day >= start, daily.c.day <= end
+        ),
+    ).subquery()
+    return select(
+        history.c.book_id,
+        func.sum(history.c.checkouts).label("checkouts"),
+        func.sum(history.c.returns).label("returns"),
+    ).group_by(history.c.book_id)
+
+
+def ensure_rental_history() -> bool:
+    """
+    Start the history of a database created before it existed with checkouts of current rentals.
+    Returns True if events have been added.
+    """
+    if not inspect(db.engine).has_table(RentalEvent.__tablename__):
+        return False
+    has_history = db.session.scalar(
+        select(literal(1)).select_from(RentalEvent).limit(1)
+    ) or db.session.scalar(select(literal(1)).select_from(RentalDailyStats).limit(1))
+    has_rentals = db.session.scalar(select(Rentals.id).limit(1))
+    if has_history or has_rentals is None:
+        db.session.rollback()
+        return False
+
+    rentals = Rentals.__table__
+    db.session.execute(
+        insert(RentalEvent).from_select(
+            ["event_type", "book_id", "user_id", "occurred_at"],
+            select(
+                literal(CHECKOUT),
+                rentals.c.book_id,
+                rentals.c.user_id,
+                rentals.c.created_at,
+            ),
+        )
+    )
+    db.session.commit()
+    return True
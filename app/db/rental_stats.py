@@ -0,0 +1,108 @@
+from collections import Counter
+
+from sqlalchemy import func, inspect, select
+
+from app.db.models import (
+    Book,
+    BookRentalStats,
+    BookUserRentalStats,
+    User,
+    db,
+)
+from app.db.rental_history import rental_counts
+from app.utils.bulk_insert import dialect_insert
+
+
+def record_rentals(rentals: list[tuple[int, int]]):
+    """
+    Increment rental counters for (book id, user id) pairs of created rentals, changes are not committed.
+    Counters are upserted in key order, so concurrent transactions lock rows in the same order.
+    """
+    if not rentals:
+        return
+    by_book = Counter(book_id for book_id, _ in rentals)
+    by_book_user = Counter(rentals)
+
+    _increment(
+        BookRentalStats,
+        ["book_id"],
+        [
+            {"book_id": book_id, "rental_count": count}
+            for book_id, count in sorted(by_book.items())
+        ],
+    )
+    _increment(
+        BookUserRentalStats,
+        ["book_id", "user_id"],
+        [
+            {"book_id": book_id, "user_id": user_id, "rental_count": count}
+            for (book_id, user_id), count in sorted(by_book_user.items())
+        ],
+    )
+
+
+def _increment(model, key: list[str], rows: list[dict]):
+    table = model.__table__
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key,
+        set_={"rental_count": table.c.rental_count + statement.excluded.rental_count},
+    )
+    db.session.execute(statement, rows)
+
+
+def rebuild_rental_stats() -> tuple[int, int]:
+    """
+    Recompute rental counters from the rental history, returns the number of book and (book, user) counters.
+    Changes are not committed.
+    """
+    counts = rental_counts().subquery()
+    # history is kept for removed books and users, counters only for existing ones
+    existing = (
+        select(counts.c.book_id, counts.c.user_id, counts.c.checkouts)
+        .join(Book.__table__, Book.__table__.c.id == counts.c.book_id)
+        .join(User.__table__, User.__table__.c.id == counts.c.user_id)
+        .where(counts.c.checkouts > 0)
+        .subquery()
+    )
+    db.session.execute(BookRentalStats.__table__.delete())
+    db.session.execute(BookUserRentalStats.__table__.delete())
+
+    db.session.execute(
+        BookUserRentalStats.__table__.insert().from_select(
+            ["book_id", "user_id", "rental_count"],
+            select(existing.c.book_id, existing.c.user_id, existing.c.checkouts),
+        )
+    )
+    db.session.execute(
+        BookRentalStats.__table__.insert().from_select(
+            ["book_id", "rental_count"],
+            select(existing.c.book_id, func.sum(existing.c.checkouts)).group_by(
+                existing.c.book_id
+            ),
+        )
+    )
+    return (
+        db.session.scalar(select(func.count()).select_from(BookRentalStats)) or 0,
+        db.session.scalar(select(func.count()).select_from(BookUserRentalStats)) or 0,
+    )
+
+
+def ensure_rental_stats() -> bool:
+    """
+    Build rental counters for a database created before they existed.
+    Returns True if the counters have been built.
+    """
+    if not inspect(db.engine).has_table(BookRentalStats.__tablename__):
+        return False
+    has_stats = db.session.scalar(select(BookRentalStats.book_id).limit(1))
+    has_history = db.session.scalar(
+        select(rental_counts().limit(1).subquery().c.book_id)
+    )
+    if has_stats is not None or has_history is None:
+        db.session.rollback()
+        return False
+
+    rebuild_rental_stats()
+    db.session.commit()
+    return True
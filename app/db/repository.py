@@ -0,0 +1,279 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from flask import current_app, has_app_context
+from sqlalchemy import select
+
+from app.db.models import Book, CacheGeneration, User, db
+from app.utils.bulk_insert import chunked, dialect_insert
+
+EXTENSION = "repository"
+BOOKS = "books"
+USERS = "users"
+
+# defaults of CACHE_* config
+CACHE_DEFAULTS = {
+    "CACHE_MAX_SIZE": 10_000,
+    "CACHE_TTL": 300.0,
+    # seconds between checks of cache generations changed by other workers, 0 disables them
+    "CACHE_SYNC_INTERVAL": 5.0,
+}
+# tests share a single process, invalidation is local
+TESTING_DEFAULTS = {"CACHE_SYNC_INTERVAL": 0}
+
+
+@dataclass(frozen=True)
+class BookRecord:
+    id: int
+    book_id: int
+    isbn: int | str
+    authors: str
+    publication_year: int
+    title: str | None
+    language: str | None
+
+
+@dataclass(frozen=True)
+class UserRecord:
+    id: int
+    user_name: str
+    user_type: str
+
+
+class LookupCache:
+    """
+    Thread safe LRU cache whose entries expire after ttl seconds, counts hits, misses and evictions.
+    Values are immutable records, so they are shared by requests and threads without copying.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, generation: int):
+        with self._lock:
+            # value read before an invalidation is not cached
+            if generation != self.generation or not self.max_size:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys=None):
+        # all entries are dropped without keys
+        with self._lock:
+            self.generation += 1
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "generation": self.generation,
+            }
+
+
+class Repository:
+    """
+    Read-through lookups of books by book_id and users by user_name kept in memory of the worker.
+    Writers call invalidate_books and invalidate_users after commit, with CACHE_SYNC_INTERVAL
+    invalidations are also recorded in cache_generation table and picked up by other workers.
+    """
+
+    def __init__(self, app):
+        defaults = {**CACHE_DEFAULTS, **(TESTING_DEFAULTS if app.testing else {})}
+        config = {
+            name: app.config.setdefault(name, value) for name, value in defaults.items()
+        }
+        self.caches = {
+            name: LookupCache(config["CACHE_MAX_SIZE"], config["CACHE_TTL"])
+            for name in (BOOKS, USERS)
+        }
+        self.sync_interval = config["CACHE_SYNC_INTERVAL"]
+        # generations are read by the first lookup, changes made since then are applied by later ones
+        self._synced_at = float("-inf")
+        self._shared_generations: dict[str, int] | None = None
+        self._sync_lock = threading.Lock()
+
+    def get_book(self, book_id: int) -> BookRecord | None:
+        return self._get(BOOKS, book_id, _load_books)
+
+    def get_books(self, book_ids: list[int]) -> dict[int, BookRecord]:
+        return self._get_many(BOOKS, book_ids, _load_books)
+
+    def get_user(self, user_name: str) -> UserRecord | None:
+        return self._get(USERS, user_name, _load_users)
+
+    def get_users(self, user_names: list[str]) -> dict[str, UserRecord]:
+        return self._get_many(USERS, user_names, _load_users)
+
+    def invalidate_books(self, book_ids: list[int] | None = None):
+        self._invalidate(BOOKS, book_ids)
+
+    def invalidate_users(self, user_names: list[str] | None = None):
+        self._invalidate(USERS, user_names)
+
+    def generation(self, name: str) -> int:
+        self._sync()
+        return self.caches[name].generation
+
+    def metrics(self) -> dict:
+        return {name: cache.stats() for name, cache in self.caches.items()}
+
+    def _get(self, name: str, key, load):
+        return self._get_many(name, [key], load).get(key)
+
+    def _get_many(self, name: str, keys: list, load) -> dict:
+        self._sync()
+        cache = self.caches[name]
+        found = {}
+        missing = []
+        for key in keys:
+            value = cache.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            # misses are not cached, so a created row is found by its first lookup
+            generation = cache.generation
+            loaded = load(missing)
+            for key, value in loaded.items():
+                cache.put(key, value, generation)
+            found.update(loaded)
+        return found
+
+    def _invalidate(self, name: str, keys: list | None):
+        self.record_invalidation(name, db.session)
+        if self.sync_interval:
+            db.session.commit()
+        self.apply_invalidation(name, keys)
+
+    def add_cache(self, name: str, cache: LookupCache):
+        # caches of other layers share invalidation by generations across workers
+        self.caches[name] = cache
+
+    def record_invalidation(self, name: str, session):
+        """
+        Bump the shared generation of a cache within the transaction of the session or connection, other workers
+        drop the whole cache, so keys are not shared. Nothing is recorded without CACHE_SYNC_INTERVAL.
+        """
+        if not self.sync_interval:
+            return
+        table = CacheGeneration.__table__
+        statement = dialect_insert(table).values(name=name, generation=1)
+        statement = statement.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"generation": table.c.generation + 1},
+        )
+        session.execute(statement)
+
+    def apply_invalidation(self, name: str, keys: list | None = None):
+        # called once the change and its recorded invalidation have been committed
+        self.caches[name].invalidate(keys)
+        # own invalidation does not have to be applied again
+        if self.sync_interval and self._shared_generations is not None:
+            self._shared_generations[name] = self._shared_generations.get(name, 0) + 1
+
+    def _sync(self):
+        if not self.sync_interval:
+            return
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        with self._sync_lock:
+            if now - self._synced_at < self.sync_interval:
+                return
+            self._synced_at = now
+            generations = dict(
+                db.session.execute(
+                    select(CacheGeneration.name, CacheGeneration.generation)
+                ).all()
+            )
+            previous = self._shared_generations
+            self._shared_generations = generations
+        if previous is None:
+            return
+        for name, cache in self.caches.items():
+            if generations.get(name, 0) != previous.get(name, 0):
+                cache.invalidate()
+
+
+def _load_books(book_ids: list[int]) -> dict[int, BookRecord]:
+    books = {}
+    for ids in chunked(book_ids):
+        for row in db.session.execute(
+            select(
+                Book.id,
+                Book.book_id,
+                Book.isbn,
+                Book.authors,
+                Book.publication_year,
+                Book.title,
+                Book.language,
+            ).where(Book.book_id.in_(ids))
+        ):
+            books[row.book_id] = BookRecord(**row._mapping)
+    return books
+
+
+def _load_users(user_names: list[str]) -> dict[str, UserRecord]:
+    users = {}
+    for names in chunked(user_names):
+        for row in db.session.execute(
+            select(User.id, User.user_name, User.user_type).where(
+                User.user_name.in_(names)
+            )
+        ):
+            users[row.user_name] = UserRecord(**row._mapping)
+    return users
+
+
+def init_repository(app) -> Repository:
+    repository = Repository(app)
+    app.extensions[EXTENSION] = repository
+    return repository
+
+
+def get_repository() -> Repository:
+    return current_app.extensions[EXTENSION]
+
+
+def invalidate_books(book_ids: list[int] | None = None):
+    # called by writers after commit, outside of the application nothing is cached
+    if has_app_context() and EXTENSION in current_app.extensions:
+        get_repository().invalidate_books(book_ids)
+
+
+def invalidate_users(user_names: list[str] | None = None):
+    if has_app_context() and EXTENSION in current_app.extensions:
+        get_repository().invalidate_users(user_names)
@@ -0,0 +1,212 @@
+import re
+
+from sqlalchemy import (
+    DDL,
+    Double,
+    and_,
+    case,
+    cast,
+    column,
+    event,
+    false,
+    func,
+    inspect,
+    literal_column,
+    or_,
+    select,
+    table,
+)
+from sqlalchemy.sql import Select
+
+from app.db.models import Book, db
+
+SEARCH_TABLE = "book_fts"
+
+# external content FTS5 table, rows are kept in sync with Book by triggers below
+CREATE_STATEMENTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "title, authors, content='book', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON book BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, authors) "
+    "VALUES (new.id, new.title, new.authors); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON book BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, authors) "
+    "VALUES ('delete', old.id, old.title, old.authors); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE ON book BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, authors) "
+    "VALUES ('delete', old.id, old.title, old.authors); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, authors) "
+    "VALUES (new.id, new.title, new.authors); END",
+)
+REBUILD_STATEMENT = f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"
+DROP_STATEMENT = f"DROP TABLE IF EXISTS {SEARCH_TABLE}"
+
+# PostgreSQL searches GIN indexes over text search vectors of the same columns
+TSVECTOR_EXPRESSION = "to_tsvector('simple', coalesce({column}, ''))"
+POSTGRES_INDEXES = {
+    "ix_book_title_tsvector": "title",
+    "ix_book_authors_tsvector": "authors",
+}
+POSTGRES_CREATE_STATEMENTS = tuple(
+    f"CREATE INDEX IF NOT EXISTS {name} ON book "
+    f"USING gin ({TSVECTOR_EXPRESSION.format(column=column_name)})"
+    for name, column_name in POSTGRES_INDEXES.items()
+)
+
+book_fts = table(SEARCH_TABLE, column("rowid"), column("rank"))
+
+_TERM = re.compile(r"\w+")
+
+for statement in CREATE_STATEMENTS:
+    event.listen(
+        Book.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Book.__table__, "before_drop", DDL(DROP_STATEMENT).execute_if(dialect="sqlite")
+)
+for statement in POSTGRES_CREATE_STATEMENTS:
+    event.listen(
+        Book.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
+
+
+def ensure_search_index() -> bool:
+    """
+    Create and populate the search index for a database created before it existed.
+    Returns True if the index has been built.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    if not inspector.has_table("book"):
+        return False
+
+    if engine.dialect.name == "postgresql":
+        existing = {index["name"] for index in inspector.get_indexes("book")}
+        if existing.issuperset(POSTGRES_INDEXES):
+            return False
+        with engine.begin() as connection:
+            for statement in POSTGRES_CREATE_STATEMENTS:
+                connection.exec_driver_sql(statement)
+        return True
+
+    if engine.dialect.name != "sqlite" or inspector.has_table(SEARCH_TABLE):
+        return False
+
+    with engine.begin() as connection:
+        for statement in CREATE_STATEMENTS:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(REBUILD_STATEMENT)
+    return True
+
+
+def build_match_expression(title: str | None, author: str | None) -> str | None:
+    # every term of a phrase has to match as a (case-insensitive) prefix of a word
+    clauses = []
+    for column_name, phrase in (("title", title), ("authors", author)):
+        terms = _TERM.findall(phrase or "")
+        if terms:
+            prefixes = " AND ".join(f'"{term}"*' for term in terms)
+            clauses.append(f"({column_name} : ({prefixes}))")
+    return " OR ".join(clauses) if clauses else None
+
+
+def search_books_query(
+    title: str | None, author: str | None, after: list | None = None
+) -> Select:
+    """
+    Build a query returning (Book, rank) rows matching title or author, best match first.
+    after is the (rank, book_id) of the last row of a previous page.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return _search_books_tsvector_query(title, author, after)
+    if dialect != "sqlite":
+        return _search_books_like_query(title, author, after)
+
+    match = build_match_expression(title, author)
+    if match is None:
+        return select(Book, literal_column("0").label("rank")).where(false())
+
+    hits = (
+        select(book_fts.c.rowid.label("book_pk"), book_fts.c.rank.label("rank"))
+        .where(literal_column(SEARCH_TABLE).op("MATCH")(match))
+        .subquery()
+    )
+    best_rank = func.min(hits.c.rank).label("rank")
+    query = (
+        select(Book, best_rank)
+        .join(hits, hits.c.book_pk == Book.id)
+        .group_by(Book.book_id)
+        .order_by(best_rank, Book.book_id)
+    )
+    if after:
+        rank, book_id = after
+        query = query.having(
+            or_(best_rank > rank, and_(best_rank == rank, Book.book_id > book_id))
+        )
+    return query
+
+
+def build_tsquery(phrase: str | None) -> str | None:
+    terms = _TERM.findall(phrase or "")
+    return " & ".join(f"{term}:*" for term in terms) if terms else None
+
+
+def _search_books_tsvector_query(
+    title: str | None, author: str | None, after: list | None
+) -> Select:
+    conditions = []
+    ranks = []
+    for book_column, phrase in ((Book.title, title), (Book.authors, author)):
+        tsquery = build_tsquery(phrase)
+        if tsquery is None:
+            continue
+        # expression has to be the same as the one of the index
+        vector = func.to_tsvector(
+            literal_column("'simple'"), func.coalesce(book_column, literal_column("''"))
+        )
+        terms = func.to_tsquery(literal_column("'simple'"), tsquery)
+        condition = vector.op("@@")(terms)
+        conditions.append(condition)
+        ranks.append(case((condition, func.ts_rank(vector, terms)), else_=0))
+
+    if not conditions:
+        return select(Book, literal_column("0").label("rank")).where(false())
+
+    # negated, so that as with bm25 of SQLite lower rank is a better match,
+    # double precision survives the round trip through a page cursor unlike real
+    rank = cast(-func.greatest(*ranks), Double)
+    query = (
+        select(Book, rank.label("rank"))
+        .where(or_(*conditions))
+        .order_by(rank, Book.book_id)
+    )
+    if after:
+        after_rank, book_id = after
+        query = query.where(
+            or_(rank > after_rank, and_(rank == after_rank, Book.book_id > book_id))
+        )
+    return query
+
+
+def _search_books_like_query(
+    title: str | None, author: str | None, after: list | None
+) -> Select:
+    conditions = []
+    if title:
+        conditions.append(Book.title.ilike(f"%{title}%"))
+    if author:
+        conditions.append(Book.authors.ilike(f"%{author}%"))
+
+    query: Select = (
+        select(Book, literal_column("0").label("rank"))
+        .where(or_(*conditions))
+        .order_by(Book.book_id, Book.id)
+    )
+    if after:
+        _rank, book_id = after
+        query = query.where(Book.book_id > book_id)
+    return query
@@ -1,12 +1,9 @@
 from app import create_app, db
 from app.db.setup_db import load_bootstrap_data
+from app.notifications.dispatcher import start_notifications
 
 app = create_app()
 
-print("Registered routes:")
-for rule in app.url_map.iter_rules():
-    print(f"{rule.endpoint}: {rule.methods} -> {rule.rule}")
-
 if __name__ == "__main__":
     print("Create tables")
     with app.app_context():
@@ -14,7 +11,8 @@ if __name__ == "__main__":
     print("Tables created!")
 
     print("Load bootstrap data")
-    load_bootstrap_data()
+    load_bootstrap_data(app)
     print("Bootstrap data loaded!")
 
+    start_notifications(app)
     app.run(debug=True)
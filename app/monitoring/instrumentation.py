@@ -0,0 +1,263 @@
+import cProfile
+import os
+import time
+import uuid
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from app.db.models import db
+from app.monitoring.metrics import (
+    CollectedMetric,
+    Counter,
+    Histogram,
+    Registry,
+)
+
+EXTENSION = "monitoring"
+PROFILE_HEADER = "X-Profile"
+PROFILE_FILE_HEADER = "X-Profile-File"
+# label of statements executed outside of requests, e.g. by notification workers
+BACKGROUND = "background"
+# slow statements are logged with parameters shortened to this many characters
+MAX_LOGGED_PARAMETERS = 1000
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# defaults of monitoring config
+MONITORING_DEFAULTS = {
+    # statements running longer are logged with their parameters, None disables the log
+    "SLOW_QUERY_THRESHOLD": 0.5,
+    # requests with X-Profile header are profiled only if enabled
+    "PROFILING_ENABLED": False,
+    # profiles are written into instance/profiles by default
+    "PROFILE_DIRECTORY": None,
+}
+
+
+class Monitoring:
+    """
+    Latency of requests by endpoint, numbers and time of their SQL statements and slow statements,
+    rendered in Prometheus text format by /metrics. Numbers are kept by every worker process.
+    Latency of a streamed response covers the view, not sending of the stream.
+    """
+
+    def __init__(self, app):
+        config = {
+            name: app.config.setdefault(name, value)
+            for name, value in MONITORING_DEFAULTS.items()
+        }
+        self.slow_query_threshold = config["SLOW_QUERY_THRESHOLD"]
+        self.profiling = config["PROFILING_ENABLED"]
+        self.profile_directory = config["PROFILE_DIRECTORY"] or os.path.join(
+            app.instance_path, "profiles"
+        )
+
+        self.registry = Registry()
+        self.requests = self.registry.register(
+            Counter(
+                "http_requests_total",
+                "Requests by endpoint, method and status",
+                ("endpoint", "method", "status"),
+            )
+        )
+        self.latency = self.registry.register(
+            Histogram(
+                "http_request_duration_seconds",
+                "Latency of requests by endpoint",
+                ("endpoint", "method"),
+            )
+        )
+        self.statements_per_request = self.registry.register(
+            Histogram(
+                "http_request_sql_statements",
+                "SQL statements executed by a request by endpoint",
+                ("endpoint",),
+                buckets=STATEMENT_BUCKETS,
+            )
+        )
+        self.statements = self.registry.register(
+            Counter(
+                "sql_statements_total",
+                "SQL statements by endpoint",
+                ("endpoint",),
+            )
+        )
+        self.statement_time = self.registry.register(
+            Counter(
+                "sql_statement_seconds_total",
+                "Time spent executing SQL statements by endpoint",
+                ("endpoint",),
+            )
+        )
+        self.slow_statements = self.registry.register(
+            Counter(
+                "sql_slow_statements_total",
+                "SQL statements slower than SLOW_QUERY_THRESHOLD by endpoint",
+                ("endpoint",),
+            )
+        )
+        for name, documentation, kind in (
+            ("hits", "Lookups served from memory by cache", "counter"),
+            ("misses", "Lookups not found in memory by cache", "counter"),
+            ("evictions", "Entries evicted by cache", "counter"),
+            ("size", "Entries kept by cache", "gauge"),
+        ):
+            self.registry.register(
+                CollectedMetric(
+                    f"cache_{name}" + ("_total" if kind == "counter" else ""),
+                    documentation,
+                    _cache_stat(name),
+                    ("cache",),
+                    kind,
+                )
+            )
+        self.registry.register(
+            CollectedMetric(
+                "notification_queue_size",
+                "Notifications waiting for delivery in the queue of the worker",
+                _notification_queue_size,
+            )
+        )
+
+    def watch_engine(self, engine):
+        # statements of an asyncio engine are executed by its synchronous one
+        engine = getattr(engine, "sync_engine", engine)
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_request(self):
+        g.monitoring_started_at = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+        g.profiler = self._start_profiler()
+
+    def after_request(self, response):
+        started_at = g.pop("monitoring_started_at", None)
+        if started_at is None:
+            return response
+        duration = time.perf_counter() - started_at
+        endpoint = request.endpoint or "unmatched"
+
+        self.requests.inc(endpoint, request.method, str(response.status_code))
+        self.latency.observe(duration, endpoint, request.method)
+        self.statements_per_request.observe(g.sql_statements, endpoint)
+        response.headers["Server-Timing"] = (
+            f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_statements} statements", '
+            f"total;dur={duration * 1000:.1f}"
+        )
+
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            response.headers[PROFILE_FILE_HEADER] = self._save_profile(
+                profiler, endpoint, duration
+            )
+        return response
+
+    def teardown_request(self, error):
+        # profiler of a request which failed before after_request
+        profiler = g.pop("profiler", None)
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        elif profiler is not None:
+            profiler.stop()
+
+    def before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        if context is not None:
+            context._monitoring_started_at = time.perf_counter()
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        started_at = getattr(context, "_monitoring_started_at", None)
+        if started_at is None:
+            return
+        duration = time.perf_counter() - started_at
+        if has_request_context() and "sql_statements" in g:
+            endpoint = request.endpoint or "unmatched"
+            g.sql_statements += 1
+            g.sql_seconds += duration
+        else:
+            endpoint = BACKGROUND
+
+        self.statements.inc(endpoint)
+        self.statement_time.inc(endpoint, amount=duration)
+        if (
+            self.slow_query_threshold is not None
+            and duration >= self.slow_query_threshold
+        ):
+            self.slow_statements.inc(endpoint)
+            parameters = repr(parameters)
+            if len(parameters) > MAX_LOGGED_PARAMETERS:
+                parameters = parameters[:MAX_LOGGED_PARAMETERS] + "..."
+            print(
+                f"Slow query of {endpoint} took {duration:.3f}s: {statement} with {parameters}"
+            )
+
+    def _start_profiler(self):
+        mode = request.headers.get(PROFILE_HEADER)
+        if not self.profiling or not mode:
+            return None
+        if mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler  # type: ignore
+            except ImportError:
+                print("pyinstrument is not installed, request is profiled by cProfile")
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _save_profile(self, profiler, endpoint: str, duration: float) -> str:
+        os.makedirs(self.profile_directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            name += ".prof"
+            profiler.dump_stats(os.path.join(self.profile_directory, name))
+        else:
+            profiler.stop()
+            name += ".html"
+            with open(
+                os.path.join(self.profile_directory, name), "w", encoding="utf-8"
+            ) as file:
+                file.write(profiler.output_html())
+        print(f"Profiled {endpoint} in {duration:.3f}s into {name}")
+        return name
+
+
+# collectors read extensions of the current application, the engine listeners keep no reference to it
+def _cache_stat(stat: str):
+    def collect():
+        repository = current_app.extensions.get("repository")
+        if repository is None:
+            return {}
+        return {(name,): stats[stat] for name, stats in repository.metrics().items()}
+
+    return collect
+
+
+def _notification_queue_size():
+    dispatcher = current_app.extensions.get("notifications")
+    if dispatcher is None:
+        return {}
+    return {(): dispatcher.queue.qsize()}
+
+
+def init_monitoring(app) -> Monitoring:
+    monitoring = Monitoring(app)
+    app.extensions[EXTENSION] = monitoring
+    app.before_request(monitoring.before_request)
+    app.after_request(monitoring.after_request)
+    app.teardown_request(monitoring.teardown_request)
+    with app.app_context():
+        monitoring.watch_engine(db.engine)
+    return monitoring
+
+
+def get_monitoring() -> Monitoring:
+    return current_app.extensions[EXTENSION]
@@ -0,0 +1,146 @@
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, TypeVar
+
+# default buckets of Prometheus client libraries, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+M = TypeVar("M", bound="Metric")
+
+
+class Metric(ABC):
+    """
+    Named metric whose samples are kept by tuples of label values, rendered in Prometheus text format.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> list[str]: ...
+
+    def _format(self, name: str, values: tuple, value, extra=()) -> str:
+        pairs = list(zip(self.labels, values)) + list(extra)
+        labels = ",".join(f'{label}="{escape(str(v))}"' for label, v in pairs)
+        return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def value(self, *values) -> float:
+        with self._lock:
+            return self._values.get(values, 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [self._format(self.name, values, value) for values, value in items]
+
+
+class CollectedMetric(Metric):
+    # values by label values are read by a callback when the metrics are rendered
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], dict[tuple, float]],
+        labels: tuple[str, ...] = (),
+        kind: str = "gauge",
+    ):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def _samples(self) -> list[str]:
+        return [
+            self._format(self.name, values, value)
+            for values, value in sorted(self.collect().items())
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        # counts of observations by bucket, the last one is +Inf, with their sum
+        self._values: dict[tuple, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, *values):
+        with self._lock:
+            counts, total = self._values.get(values, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[values] = (counts, total + value)
+
+    def count(self, *values) -> int:
+        with self._lock:
+            counts, _ = self._values.get(values, ([0], 0))
+            return sum(counts)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(
+                (values, (list(counts), total))
+                for values, (counts, total) in self._values.items()
+            )
+        samples = []
+        for values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append(
+                    self._format(
+                        f"{self.name}_bucket", values, cumulative, [("le", le)]
+                    )
+                )
+            samples.append(self._format(f"{self.name}_sum", values, total))
+            samples.append(self._format(f"{self.name}_count", values, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
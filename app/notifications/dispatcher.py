@@ -0,0 +1,304 @@
+import atexit
+import queue
+import threading
+import uuid
+from datetime import timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from app.db.models import NotificationOutbox, db
+from app.notifications.notifications import FAILED, PENDING, SESSION_KEY, utcnow
+from app.notifications.sinks import Notification, make_sink
+
+EXTENSION = "notifications"
+# how long an idle worker waits for the queue before checking whether it should stop
+IDLE_TIMEOUT = 0.5
+
+# defaults of NOTIFICATION_* config
+NOTIFICATION_DEFAULTS = {
+    "NOTIFICATION_WORKERS": 2,
+    "NOTIFICATION_QUEUE_SIZE": 1000,
+    "NOTIFICATION_BATCH_SIZE": 100,
+    "NOTIFICATION_BATCH_WAIT": 0.05,
+    "NOTIFICATION_MAX_ATTEMPTS": 5,
+    "NOTIFICATION_BACKOFF": 1.0,
+    "NOTIFICATION_MAX_BACKOFF": 300.0,
+    "NOTIFICATION_LEASE": 60.0,
+    "NOTIFICATION_SWEEP_INTERVAL": 5.0,
+    "NOTIFICATION_COALESCE_WINDOW": 1.0,
+    "NOTIFICATION_SINK": "log",
+}
+# tests deliver notifications explicitly and immediately by drain()
+TESTING_DEFAULTS = {
+    "NOTIFICATION_WORKERS": 0,
+    "NOTIFICATION_COALESCE_WINDOW": 0,
+}
+
+
+class NotificationDispatcher:
+    """
+    Deliver notifications of the outbox to a sink in the background.
+    Ids of committed notifications are put on a bounded queue consumed by worker threads in batches,
+    a sweeper puts there also notifications left over by a crash, a full queue or a failed delivery.
+    A batch is claimed with a conditional update, so several processes can share the outbox.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        defaults = {
+            **NOTIFICATION_DEFAULTS,
+            **(TESTING_DEFAULTS if app.testing else {}),
+        }
+        config = {
+            name: app.config.setdefault(name, value) for name, value in defaults.items()
+        }
+
+        self.sink = make_sink(config["NOTIFICATION_SINK"])
+        self.workers = config["NOTIFICATION_WORKERS"]
+        self.batch_size = config["NOTIFICATION_BATCH_SIZE"]
+        self.batch_wait = config["NOTIFICATION_BATCH_WAIT"]
+        self.max_attempts = config["NOTIFICATION_MAX_ATTEMPTS"]
+        self.backoff = config["NOTIFICATION_BACKOFF"]
+        self.max_backoff = config["NOTIFICATION_MAX_BACKOFF"]
+        self.lease = timedelta(seconds=config["NOTIFICATION_LEASE"])
+        self.coalesce_window = config["NOTIFICATION_COALESCE_WINDOW"]
+        # delayed notifications are found by the sweep, so it runs at least once per window
+        self.sweep_interval = min(
+            config["NOTIFICATION_SWEEP_INTERVAL"],
+            self.coalesce_window or config["NOTIFICATION_SWEEP_INTERVAL"],
+        )
+
+        self.queue: queue.Queue[int] = queue.Queue(config["NOTIFICATION_QUEUE_SIZE"])
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._registered = False
+
+    def start(self):
+        if not self.workers or self._threads:
+            return
+        # a dispatcher stopped before the application is forked into server workers starts again in every worker
+        self._stop.clear()
+        for number in range(self.workers):
+            self._threads.append(
+                threading.Thread(
+                    target=self._work, name=f"notifications-{number}", daemon=True
+                )
+            )
+        self._threads.append(
+            threading.Thread(
+                target=self._sweep, name="notifications-sweep", daemon=True
+            )
+        )
+        for thread in self._threads:
+            thread.start()
+        if not self._registered:
+            atexit.register(self.stop)
+            self._registered = True
+
+    def stop(self, timeout: float = 5.0):
+        # undelivered notifications stay in the outbox and are sent after a restart
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, ids: list[int]):
+        if self.coalesce_window:
+            # not due yet, the sweep enqueues them once the window has passed
+            return
+        self._enqueue(ids)
+
+    def _enqueue(self, ids: list[int]):
+        for notification_id in ids:
+            try:
+                self.queue.put_nowait(notification_id)
+            except queue.Full:
+                # picked up by the next sweep
+                return
+
+    def due_ids(self, limit: int) -> list[int]:
+        return list(
+            db.session.scalars(
+                select(NotificationOutbox.id)
+                .where(
+                    NotificationOutbox.status == PENDING,
+                    NotificationOutbox.next_attempt_at <= utcnow(),
+                )
+                .order_by(NotificationOutbox.id)
+                .limit(limit)
+            )
+        )
+
+    def sweep(self) -> int:
+        ids = self.due_ids(self.queue.maxsize or self.batch_size)
+        db.session.commit()
+        self._enqueue(ids)
+        return len(ids)
+
+    def drain(self) -> int:
+        """
+        Synchronously deliver all notifications which are due, returns the number of delivered ones
+        """
+        delivered = 0
+        while ids := self.due_ids(self.batch_size):
+            delivered += self.deliver(ids)
+        return delivered
+
+    def deliver(self, ids: list[int]) -> int:
+        """
+        Send a batch of notifications to the sink, returns the number of delivered outbox rows.
+        Pending rows of the same users are sent with the batch, all rows of a user are coalesced into one message.
+        Failed batches are retried with exponential backoff until NOTIFICATION_MAX_ATTEMPTS.
+        """
+        token = uuid.uuid4().hex
+        now = utcnow()
+        db.session.execute(
+            update(NotificationOutbox)
+            .where(
+                NotificationOutbox.id.in_(ids),
+                NotificationOutbox.status == PENDING,
+                NotificationOutbox.next_attempt_at <= now,
+            )
+            .values(claim=token, next_attempt_at=now + self.lease)
+        )
+        # pull in notifications of the same users still waiting for their window
+        db.session.execute(
+            update(NotificationOutbox)
+            .where(
+                NotificationOutbox.user_name.in_(
+                    select(NotificationOutbox.user_name)
+                    .where(NotificationOutbox.claim == token)
+                    .scalar_subquery()
+                ),
+                NotificationOutbox.status == PENDING,
+                NotificationOutbox.attempts == 0,
+                NotificationOutbox.claim.is_(None),
+            )
+            .values(claim=token, next_attempt_at=now + self.lease)
+        )
+        db.session.commit()
+
+        claimed = db.session.execute(
+            select(
+                NotificationOutbox.id,
+                NotificationOutbox.user_name,
+                NotificationOutbox.book_title,
+                NotificationOutbox.attempts,
+            )
+            .where(NotificationOutbox.claim == token)
+            .order_by(NotificationOutbox.id)
+        ).all()
+        if not claimed:
+            return 0
+
+        try:
+            self.sink.send(coalesce(claimed))
+        except Exception as error:
+            self._retry_later(claimed, token, error)
+            return 0
+
+        db.session.execute(
+            delete(NotificationOutbox).where(NotificationOutbox.claim == token)
+        )
+        db.session.commit()
+        return len(claimed)
+
+    def _retry_later(self, claimed, token: str, error: Exception):
+        print(f"Delivery of {len(claimed)} notifications failed: {error!r}")
+        # every row of a batch has been attempted the same number of times unless batches were mixed by a sweep
+        for row in claimed:
+            attempts = row.attempts + 1
+            delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+            db.session.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id == row.id,
+                    NotificationOutbox.claim == token,
+                )
+                .values(
+                    attempts=attempts,
+                    status=FAILED if attempts >= self.max_attempts else PENDING,
+                    next_attempt_at=utcnow() + timedelta(seconds=delay),
+                    claim=None,
+                    last_error=repr(error),
+                )
+            )
+        db.session.commit()
+
+    def _next_batch(self) -> list[int]:
+        try:
+            ids = [self.queue.get(timeout=IDLE_TIMEOUT)]
+        except queue.Empty:
+            return []
+        while len(ids) < self.batch_size:
+            try:
+                ids.append(self.queue.get(timeout=self.batch_wait))
+            except queue.Empty:
+                break
+        return ids
+
+    def _work(self):
+        while not self._stop.is_set():
+            ids = self._next_batch()
+            if not ids:
+                continue
+            try:
+                with self.app.app_context():
+                    self.deliver(ids)
+            except Exception as error:
+                # rows stay pending and are swept again once their lease expires
+                print(f"Notification worker failed: {error!r}")
+
+    def _sweep(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.sweep()
+            except Exception as error:
+                print(f"Notification sweep failed: {error!r}")
+            if self._stop.wait(self.sweep_interval):
+                return
+
+
+def coalesce(rows) -> list[Notification]:
+    # one notification per user, titles in the order the events happened
+    by_user: dict[str, list] = {}
+    for row in rows:
+        by_user.setdefault(row.user_name, []).append(row)
+    return [
+        Notification(
+            ids=tuple(row.id for row in user_rows),
+            user_name=user_name,
+            book_titles=tuple(dict.fromkeys(row.book_title for row in user_rows)),
+        )
+        for user_name, user_rows in by_user.items()
+    ]
+
+
+def init_notifications(app) -> NotificationDispatcher:
+    # threads are started by serving entry points, CLI tools and benchmarks only write the outbox
+    dispatcher = NotificationDispatcher(app)
+    app.extensions[EXTENSION] = dispatcher
+    return dispatcher
+
+
+def start_notifications(app):
+    app.extensions[EXTENSION].start()
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    return current_app.extensions[EXTENSION]
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_notifications(session):
+    ids = session.info.pop(SESSION_KEY, None)
+    if ids and has_app_context() and EXTENSION in current_app.extensions:
+        get_dispatcher().enqueue(ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_notifications(session):
+    session.info.pop(SESSION_KEY, None)
@@ -1,2 +1,60 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app.db.models import NotificationOutbox, db
+
+PENDING = "pending"
+FAILED = "failed"
+COALESCE_WINDOW_CONFIG = "NOTIFICATION_COALESCE_WINDOW"
+# ids of notifications of the current transaction, enqueued by the dispatcher after commit
+SESSION_KEY = "notification_ids"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 def notify(user_name, book_title):
-    print(f"Notification - User's '{user_name}' book '{book_title}' changed the status")
+    """
+    Queue a notification in the outbox of the current session.
+    It is delivered by the dispatcher once the transaction is committed and dropped on rollback.
+    """
+    notify_many([user_name], book_title)
+
+
+def notify_many(user_names: Iterable[str], book_title):
+    """
+    Queue a notification about the same book for every user.
+    """
+    notify_all((user_name, book_title) for user_name in user_names)
+
+
+def notify_all(recipients: Iterable[tuple[str, str | None]]):
+    """
+    Queue notifications for (user_name, book_title) pairs, duplicated pairs are notified once.
+    Rows are inserted by a single statement, delivery is delayed by NOTIFICATION_COALESCE_WINDOW
+    so that notifications of a user about several books are coalesced into one message.
+    """
+    now = utcnow()
+    window = current_app.config.get(COALESCE_WINDOW_CONFIG) or 0
+    due_at = now + timedelta(seconds=window)
+    rows = [
+        {
+            "user_name": user_name,
+            "book_title": book_title,
+            "status": PENDING,
+            "attempts": 0,
+            "next_attempt_at": due_at,
+            "created_at": now,
+        }
+        for user_name, book_title in dict.fromkeys(recipients)
+    ]
+    if not rows:
+        return
+    ids = db.session.scalars(
+        insert(NotificationOutbox).returning(NotificationOutbox.id), rows
+    ).all()
+    db.session.info.setdefault(SESSION_KEY, []).extend(ids)
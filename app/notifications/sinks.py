@@ -0,0 +1,63 @@
+import json
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+
+
+@dataclass(frozen=True)
+class Notification:
+    # outbox rows coalesced into this notification
+    ids: tuple[int, ...]
+    user_name: str
+    book_titles: tuple[str | None, ...]
+
+    @property
+    def message(self) -> str:
+        if len(self.book_titles) == 1:
+            return f"Notification - User's '{self.user_name}' book '{self.book_titles[0]}' changed the status"
+        titles = ", ".join(f"'{title}'" for title in self.book_titles)
+        return f"Notification - User's '{self.user_name}' books {titles} changed the status"
+
+
+class Sink(ABC):
+    """
+    Delivery channel of notifications. send receives a batch and raises if any of them was not delivered,
+    the whole batch is retried then, so delivery has to tolerate duplicates.
+    """
+
+    @abstractmethod
+    def send(self, notifications: list[Notification]) -> None: ...
+
+
+class LogSink(Sink):
+    def send(self, notifications: list[Notification]) -> None:
+        for notification in notifications:
+            print(notification.message)
+
+
+class FileSink(Sink):
+    # appends notifications as JSON lines, mostly useful for tests and local development
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, notifications: list[Notification]) -> None:
+        lines = "".join(
+            json.dumps({**asdict(notification), "message": notification.message}) + "\n"
+            for notification in notifications
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+def make_sink(value) -> Sink:
+    """
+    Sink from NOTIFICATION_SINK config, either a Sink instance, 'log' or 'file:<path>'
+    """
+    if isinstance(value, Sink):
+        return value
+    if value is None or value == "log":
+        return LogSink()
+    if isinstance(value, str) and value.startswith("file:"):
+        return FileSink(value.removeprefix("file:"))
+    raise ValueError(f"Unknown notification sink '{value}'")
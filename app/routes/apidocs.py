@@ -0,0 +1,74 @@
+import importlib.util
+import os
+
+from flask import Blueprint, current_app, jsonify, redirect, render_template, url_for
+
+EXTENSION = "swagger"
+SPEC_ENDPOINT = "apispec_1"
+SWAGGER_TEMPLATE = {
+    "swagger": "2.0",
+    "info": {
+        "title": "LibraryApp",
+        "description": "LibraryApp for managing books and wishlists",
+        "version": "1.0",
+    },
+    "basePath": "/",
+}
+
+
+def flasgger_ui_directory() -> str:
+    # Swagger UI templates and static files of flasgger, located without importing it
+    spec = importlib.util.find_spec("flasgger")
+    if spec is None or spec.origin is None:
+        raise ImportError("flasgger is required to serve the API documentation")
+    return os.path.join(os.path.dirname(spec.origin), "ui3")
+
+
+FLASGGER_UI = flasgger_ui_directory()
+
+# routes of flasgger under its blueprint name, flasgger is imported and the spec built by the first request
+bp = Blueprint(
+    "flasgger",
+    __name__,
+    template_folder=os.path.join(FLASGGER_UI, "templates"),
+    static_folder=os.path.join(FLASGGER_UI, "static"),
+    static_url_path="/flasgger_static",
+)
+
+
+@bp.route("/apidocs/", methods=["GET"])
+def apidocs():
+    from flasgger.base import APIDocsView  # type: ignore
+
+    return APIDocsView(view_args={"config": get_swagger().config}).get()
+
+
+@bp.route("/apidocs/index.html", methods=["GET"])
+def apidocs_index():
+    return redirect(url_for(".apidocs"))
+
+
+@bp.route(f"/{SPEC_ENDPOINT}.json", endpoint=SPEC_ENDPOINT, methods=["GET"])
+def apispec():
+    return jsonify(get_swagger().get_apispecs(SPEC_ENDPOINT))
+
+
+@bp.route("/oauth2-redirect.html", methods=["GET"])
+def oauth_redirect():
+    return render_template("flasgger/oauth2-redirect.html")
+
+
+def get_swagger():
+    """
+    Swagger of the current application, created on first use. Its spec is built once from docstrings of the views
+    and kept until the worker exits.
+    """
+    swagger = current_app.extensions.get(EXTENSION)
+    if swagger is None:
+        from flasgger import Swagger  # type: ignore
+
+        # not bound by init_app, the routes of this blueprint replace the ones it would register
+        swagger = Swagger(template=SWAGGER_TEMPLATE)
+        swagger.app = current_app._get_current_object()
+        current_app.extensions[EXTENSION] = swagger
+    return swagger
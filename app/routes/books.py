@@ -1,15 +1,22 @@
 from flask import request, jsonify, Blueprint
-from sqlalchemy import or_
+from sqlalchemy import exists
 
-from app.db.models import Book, Wishlist, db
+from app.db.models import Book, Wishlist
+from app.db.search_index import search_books_query
+from app.utils.pagination import page_response, parse_page_args
+from app.utils.read_plan import ReadPlan, run_plan
+from app.utils.response_cache import cached_response
 
 bp = Blueprint("books", __name__, url_prefix="/v1/books")
 
 
 @bp.route("search", methods=["GET"])
+@cached_response
 def search_books():
     """
     Search for books by title or author
+    Every word of a given title or author matches case-insensitively as a word prefix,
+    best matches are returned first
     ---
     parameters:
       - name: title
@@ -20,11 +27,33 @@ def search_books():
         in: query
         type: string
         required: false
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of books, cursor of the next page is returned in X-Next-Cursor header
+      - name: after
+        in: query
+        type: string
+        required: false
+        description: Cursor of the page to return
+      - name: stream
+        in: query
+        type: string
+        enum: [json, ndjson]
+        required: false
+        description: Stream results as a JSON array or newline delimited JSON
     responses:
       200:
         description: A list of books and their availability
+      400:
+        description: Missing search phrase or invalid pagination parameters
     """
 
+    return run_plan(search_books_plan())
+
+
+def search_books_plan():
     title = request.args.get("title", "", type=str)
     author = request.args.get("author", "", type=str)
 
@@ -38,42 +67,41 @@ def search_books():
             400,
         )
 
+    try:
+        page = parse_page_args(cursor_size=2)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
     title = title.strip() if title else None
     author = author.strip() if author else None
 
-    query = Book.query
+    # wishlist membership is resolved within the search query itself
+    is_wishlisted = exists().where(Wishlist.book_id == Book.id).label("is_wishlisted")
+    query = search_books_query(title, author, page.after).add_columns(is_wishlisted)
+    if page.limit is not None:
+        query = query.limit(page.limit)
 
-    if title and author:
-        query = query.filter(
-            or_(
-                Book.title.ilike(f"%{title}%"),
-                Book.authors.ilike(f"%{author}%"),
-            )
-        )
-    elif title:
-        query = query.filter(Book.title.ilike(f"%{title}%"))
-    elif author:
-        query = query.filter(Book.authors.ilike(f"%{author}%"))
+    return ReadPlan(
+        query,
+        lambda rows: page_response(
+            rows,
+            serialize=serialize_search_result,
+            cursor_of=lambda row: (row.rank, row.Book.book_id),
+            page=page,
+        ),
+        stream=page.stream is not None,
+    )
 
-    results = query.group_by(Book.book_id).all()
-
-    books_list = []
-    for book in results:
-        is_wishlisted = db.session.query(
-            db.session.query(Wishlist).filter(Wishlist.book_id == book.id).exists()
-        ).scalar()
-
-        books_list.append(
-            {
-                "id": book.id,
-                "book_id": book.book_id,
-                "isbn": book.isbn,
-                "authors": book.authors,
-                "publication_year": book.publication_year,
-                "title": book.title,
-                "language": book.language,
-                "is_wishlisted": is_wishlisted,
-            }
-        )
 
-    return jsonify(books_list)
+def serialize_search_result(row) -> dict:
+    book, _rank, is_wishlisted = row
+    return {
+        "id": book.id,
+        "book_id": book.book_id,
+        "isbn": book.isbn,
+        "authors": book.authors,
+        "publication_year": book.publication_year,
+        "title": book.title,
+        "language": book.language,
+        "is_wishlisted": bool(is_wishlisted),
+    }
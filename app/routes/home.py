@@ -1,4 +1,6 @@
-from flask import Blueprint, redirect
+from flask import Blueprint, jsonify, redirect
+
+from app.db.repository import get_repository
 
 bp = Blueprint("home", __name__)
 
@@ -6,3 +8,15 @@ bp = Blueprint("home", __name__)
 @bp.route("/")
 def index():
     return redirect("/apidocs")
+
+
+@bp.route("/v1/cache", methods=["GET"])
+def cache_metrics():
+    """
+    Get sizes, hits, misses and evictions of book and user lookup caches of the worker
+    ---
+    responses:
+      200:
+        description: Metrics of every cache by name
+    """
+    return jsonify(get_repository().metrics()), 200
@@ -0,0 +1,22 @@
+from flask import Blueprint, Response
+
+from app.monitoring.instrumentation import get_monitoring
+
+bp = Blueprint("metrics", __name__)
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Get request latency, SQL statement and cache metrics of the worker in Prometheus text format
+    ---
+    tags:
+      - Monitoring
+    responses:
+      200:
+        description: Metrics in Prometheus text exposition format
+    """
+    return Response(
+        get_monitoring().registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,15 +1,27 @@
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Sequence
 
 from flask import Blueprint
-from flask import jsonify
+from flask import jsonify, request
+from sqlalchemy import Row, delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
 
-from app.db.models import Book, db, Wishlist, Rentals
+from app.db.models import db, Wishlist, Rentals, User
 from app.app_types.BookStatus import BookStatus
+from app.db.rental_history import CHECKOUT, RETURN, record_events
+from app.db.rental_stats import record_rentals
+from app.db.repository import BookRecord, get_repository
 
 from app.notifications import notifications
+from app.utils.bulk_insert import chunked, execute_rowcount
+from app.utils.response_cache import mark_changed
 
 bp = Blueprint("rentals", __name__, url_prefix="/v1/rentals")
 
+MAX_TRANSITION_ATTEMPTS = 10
+MAX_BULK_BOOKS = 5000
+
 
 @bp.route("/<int:book_id>", methods=["POST"])
 def change_rental_status(book_id):
@@ -31,106 +43,329 @@ def change_rental_status(book_id):
           application/json:
             message: "Status of the book 'Book Title' has been changed from borrowed to available"
       404:
-        description: Book not found / No rentals found
+        description: Book not found / No wishlists found
         examples:
           application/json:
-            error: "Book not found / No rentals found"
+            error: "Book not found"
+      409:
+        description: Status of the book kept changing concurrently, request can be retried
     """
 
-    book = get_book(book_id)
+    book = get_repository().get_book(book_id)
     if not book:
         return jsonify({"error": "Book not found"}), 404
 
-    rental_of_book = get_rental(book)
-    if rental_of_book:
-        # if rental exists in database, we assume that book is borrowed, so we will make it available
-        # we will fetch rentals with books and then remove the rental and notify users who had this book on a wishlist
-        rentals_with_book = get_rentals_with_book(book)
+    try:
+        transition = toggle_rental(book)
+    except RentalConflict:
+        return (
+            jsonify({"error": "Rental status of the book is being changed, try again"}),
+            409,
+        )
 
-        db.session.delete(rental_of_book)
-        db.session.commit()
+    if transition.status is None:
+        return (
+            jsonify({"message": f"No wishlists found being linked to {book.title}"}),
+            404,
+        )
 
-        for wishlist_for_book in get_wishlists(book):
-            notifications.notify(
-                user_name=wishlist_for_book.user.user_name, book_title=book.title
-            )
+    results = [
+        {
+            "book_id": book.id,
+            "book_title": book.title,
+            "book_status": transition.status.value,
+        }
+        for _ in range(transition.rentals)
+    ]
+    return jsonify(results), 200
+
+
+@bp.route("/bulk", methods=["POST"])
+def change_rental_statuses():
+    """
+    Change the rental status of many books in a single transaction
+    ---
+    tags:
+      - Rentals
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            book_ids:
+              type: array
+              items:
+                type: integer
+        description: IDs of the books to change status for, every book is changed once
+    responses:
+      200:
+        description: Result for every book, either its new status or an error
+        examples:
+          application/json:
+            - book_id: 1
+              book_title: "Book Title"
+              book_status: "available"
+            - book_id: 2
+              error: "Book not found"
+      400:
+        description: Invalid list of book IDs
+      409:
+        description: Status of the books kept changing concurrently, request can be retried
+    """
 
-        if rentals_with_book:
-            results = [
+    payload = request.get_json(silent=True)
+    book_ids = payload.get("book_ids") if isinstance(payload, dict) else None
+    if (
+        not isinstance(book_ids, list)
+        or not 0 < len(book_ids) <= MAX_BULK_BOOKS
+        or not all(
+            isinstance(book_id, int) and not isinstance(book_id, bool)
+            for book_id in book_ids
+        )
+    ):
+        return (
+            jsonify(
                 {
-                    "book_id": book.id,
-                    "book_title": book.title,
-                    "book_status": BookStatus.AVAILABLE.value,
+                    "error": f"'book_ids' must be a list of 1 to {MAX_BULK_BOOKS} book IDs."
                 }
-                for rentals, book in rentals_with_book
-            ]
-            return jsonify(results), 200
+            ),
+            400,
+        )
+    book_ids = list(dict.fromkeys(book_ids))
+
+    try:
+        transitions = toggle_rentals(book_ids)
+    except RentalConflict:
+        return (
+            jsonify(
+                {"error": "Rental status of the books is being changed, try again"}
+            ),
+            409,
+        )
+
+    results = []
+    for book_id in book_ids:
+        transition = transitions.get(book_id)
+        if transition is None:
+            results.append({"book_id": book_id, "error": "Book not found"})
+        elif transition.status is None:
+            results.append(
+                {
+                    "book_id": book_id,
+                    "book_title": transition.book_title,
+                    "error": f"No wishlists found being linked to {transition.book_title}",
+                }
+            )
         else:
-            return jsonify({"message": f"No rentals found"}), 404
-    else:
-        # if rental does not exist in database, we assume that book it's ready to be borrowed
-        # fetch first wishlist among all users and create a rental for that user
-        # remove wishlist for given user
-        # notify only user who is going to be eligible to borrow a book
-        wishlists_for_book = get_wishlists(book)
-        if wishlists_for_book:
-            first_wishlist = wishlists_for_book[0]
-            first_user_with_wishlist_for_book = first_wishlist.user
-
-            new_rental = Rentals(
-                user_id=first_user_with_wishlist_for_book.id,
-                book_id=book.id,
-                created_at=datetime.now(),
+            results.append(
+                {
+                    "book_id": book_id,
+                    "book_title": transition.book_title,
+                    "book_status": transition.status.value,
+                }
             )
+    return jsonify(results), 200
+
+
+class RentalConflict(Exception):
+    pass
+
 
-            db.session.add(new_rental)
-            db.session.delete(first_wishlist)
+@dataclass
+class RentalTransition:
+    status: BookStatus | None
+    rentals: int = 0
+    user_name: str | None = None
+    book_title: str | None = None
+
+
+def toggle_rental(book: BookRecord) -> RentalTransition:
+    """
+    Atomically return a borrowed book or lend an available one to the owner of its first wishlist.
+    Every step is a conditional write, so concurrent transitions of the same book
+    conflict on a row or on the unique book_id of Rentals and are retried from scratch.
+    """
+
+    def transition():
+        result = _toggle_rental(book)
+        # notifications are committed together with the transition they are about
+        notify_transition(book, result)
+        return result
+
+    return with_retries(transition)
+
+
+def toggle_rentals(book_ids: list[int]) -> dict[int, RentalTransition]:
+    """
+    Apply toggle_rental to many books at once with a fixed number of set-based statements.
+    Returns transitions by book_id, books which do not exist are missing.
+    """
+    return with_retries(lambda: _toggle_rentals(book_ids))
+
+
+def with_retries(transition):
+    # run transition in its own transaction, retried from scratch when it loses a race
+    for _ in range(MAX_TRANSITION_ATTEMPTS):
+        try:
+            result = transition()
+            mark_changed()
             db.session.commit()
+            return result
+        except (IntegrityError, RentalConflict):
+            db.session.rollback()
+    raise RentalConflict("Could not change rental status")
 
-            notifications.notify(
-                user_name=first_user_with_wishlist_for_book.user_name,
-                book_title=book.title,
-            )
 
-            rentals_with_book = get_rentals_with_book(book)
-
-            if rentals_with_book:
-                results = [
-                    {
-                        "book_id": book.id,
-                        "book_title": book.title,
-                        "book_status": BookStatus.BORROWED.value,
-                    }
-                    for rentals, book in rentals_with_book
-                ]
-                return jsonify(results), 200
-            else:
-                return jsonify({"message": f"No rentals found"}), 404
-        else:
-            return (
-                jsonify(
-                    {"message": f"No wishlists found being linked to {book.title}"}
-                ),
-                404,
-            )
+def _toggle_rental(book: BookRecord) -> RentalTransition:
+    # if rental exists in database, we assume that book is borrowed, so we will make it available
+    returned: Sequence[int] = db.session.scalars(
+        delete(Rentals).where(Rentals.book_id == book.id).returning(Rentals.user_id)
+    ).all()
+    if returned:
+        record_events(RETURN, [(book.id, user_id) for user_id in returned])
+        return RentalTransition(status=BookStatus.AVAILABLE, rentals=len(returned))
 
+    # if rental does not exist in database, we assume that book it's ready to be borrowed
+    # first wishlist among all users is consumed and a rental is created for its owner
+    first_wishlist = db.session.execute(
+        select(Wishlist.id, Wishlist.user_id, User.user_name)
+        .join(User, Wishlist.user_id == User.id)
+        .where(Wishlist.book_id == book.id)
+        .order_by(Wishlist.id)
+        .limit(1)
+    ).first()
+    if first_wishlist is None:
+        return RentalTransition(status=None)
 
-def get_book(book_id: int) -> Book | None:
-    return Book.query.filter_by(book_id=book_id).first()
+    consumed = execute_rowcount(
+        delete(Wishlist).where(Wishlist.id == first_wishlist.id)
+    )
+    if not consumed:
+        # wishlist has been consumed by a concurrent transition
+        raise RentalConflict()
+
+    created_at = datetime.now()
+    db.session.execute(
+        insert(Rentals).values(
+            user_id=first_wishlist.user_id, book_id=book.id, created_at=created_at
+        )
+    )
+    record_events(CHECKOUT, [(book.id, first_wishlist.user_id)], created_at)
+    record_rentals([(book.id, first_wishlist.user_id)])
+    return RentalTransition(
+        status=BookStatus.BORROWED, rentals=1, user_name=first_wishlist.user_name
+    )
 
 
-def get_rental(book: Book) -> Rentals | None:
-    return Rentals.query.filter_by(book_id=book.id).first()
+def _toggle_rentals(book_ids: list[int]) -> dict[int, RentalTransition]:
+    books = {book.id: book for book in get_repository().get_books(book_ids).values()}
+
+    # borrowed books are returned
+    returned_rentals: list[tuple[int, int]] = []
+    for ids in chunked(list(books)):
+        returned_rentals.extend(
+            (row.book_id, row.user_id)
+            for row in db.session.execute(
+                delete(Rentals)
+                .where(Rentals.book_id.in_(ids))
+                .returning(Rentals.book_id, Rentals.user_id)
+            )
+        )
+    record_events(RETURN, returned_rentals)
+    returned = {book_id for book_id, _ in returned_rentals}
 
+    # available books are lent to the owners of their first wishlists
+    first_wishlists: list[Row] = []
+    for ids in chunked([pk for pk in books if pk not in returned]):
+        first_ids = (
+            select(func.min(Wishlist.id))
+            .where(Wishlist.book_id.in_(ids))
+            .group_by(Wishlist.book_id)
+        )
+        first_wishlists.extend(
+            db.session.execute(
+                select(Wishlist.id, Wishlist.user_id, Wishlist.book_id, User.user_name)
+                .join(User, Wishlist.user_id == User.id)
+                .where(Wishlist.id.in_(first_ids))
+            )
+        )
+    for rows in chunked(first_wishlists):
+        consumed = execute_rowcount(
+            delete(Wishlist).where(Wishlist.id.in_([row.id for row in rows]))
+        )
+        if consumed != len(rows):
+            # some of the wishlists have been consumed by a concurrent transition
+            raise RentalConflict()
+    if first_wishlists:
+        created_at = datetime.now()
+        db.session.execute(
+            insert(Rentals),
+            [
+                {
+                    "user_id": row.user_id,
+                    "book_id": row.book_id,
+                    "created_at": created_at,
+                }
+                for row in first_wishlists
+            ],
+        )
+        borrowed = [(row.book_id, row.user_id) for row in first_wishlists]
+        record_events(CHECKOUT, borrowed, created_at)
+        record_rentals(borrowed)
 
-def get_rentals_with_book(book: Book) -> list[tuple[Rentals, Book]]:
-    return (
-        db.session.query(Rentals, Book)
-        .join(Book, Rentals.book_id == Book.id)
-        .filter(Book.id == book.id)
-        .all()
+    # notifications of all books are queued by a single insert
+    recipients: list[tuple[str, str | None]] = []
+    for ids in chunked(list(returned)):
+        recipients.extend(
+            (row.user_name, books[row.book_id].title)
+            for row in db.session.execute(
+                select(Wishlist.book_id, User.user_name)
+                .join(User, Wishlist.user_id == User.id)
+                .where(Wishlist.book_id.in_(ids))
+                .order_by(Wishlist.id)
+            )
+        )
+    recipients.extend(
+        (row.user_name, books[row.book_id].title) for row in first_wishlists
     )
+    notifications.notify_all(recipients)
+
+    borrowers = {row.book_id: row.user_name for row in first_wishlists}
+    transitions = {}
+    for pk, book in books.items():
+        if pk in returned:
+            status = BookStatus.AVAILABLE
+        elif pk in borrowers:
+            status = BookStatus.BORROWED
+        else:
+            status = None
+        transitions[book.book_id] = RentalTransition(
+            status=status,
+            rentals=0 if status is None else 1,
+            user_name=borrowers.get(pk),
+            book_title=book.title,
+        )
+    return transitions
 
 
-def get_wishlists(book: Book) -> list[Wishlist]:
-    return Wishlist.query.filter_by(book_id=book.id).all()
+def notify_transition(book: BookRecord, transition: RentalTransition):
+    if transition.status == BookStatus.AVAILABLE:
+        # book has been returned, notify users who have this book on a wishlist
+        notifications.notify_many(get_waiting_users(book), book_title=book.title)
+    elif transition.status == BookStatus.BORROWED:
+        # book has been borrowed, notify only user who is eligible to borrow it
+        notifications.notify(user_name=transition.user_name, book_title=book.title)
+
+
+def get_waiting_users(book: BookRecord) -> list[str]:
+    # names of all users waiting for the book, in the order of their wishlists, by a single query
+    return list(
+        db.session.scalars(
+            select(User.user_name)
+            .join(Wishlist, Wishlist.user_id == User.id)
+            .where(Wishlist.book_id == book.id)
+            .order_by(Wishlist.id)
+        )
+    )
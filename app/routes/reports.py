@@ -1,15 +1,29 @@
-from datetime import datetime
+import os
+from dataclasses import asdict
+from datetime import date, timedelta
 
-from flask import jsonify, Blueprint
-from sqlalchemy import func, desc
+from flask import current_app, jsonify, Blueprint, request
+from sqlalchemy import Select, and_, case, func, literal, or_, select
 
-from app.db.models import Book, db, Rentals, User
+from app.db.expressions import days_since
+from app.db.models import Book, BookRentalStats, BookUserRentalStats, db, Rentals, User
+from app.db.rental_history import (
+    RETENTION_DAYS,
+    compact_rental_events,
+    rental_history_query,
+)
+from app.db.rental_stats import rebuild_rental_stats
 from app.app_types.BookStatus import BookStatus
+from app.utils.analytics_export import ExportUnavailable, export_database
+from app.utils.pagination import page_response, parse_page_args
+from app.utils.read_plan import ReadPlan, run_plan
+from app.utils.response_cache import cached_response, mark_changed
 
 bp = Blueprint("reports", __name__, url_prefix="/v1/reports")
 
 
 @bp.route("/amount/<string:status>", methods=["GET"])
+@cached_response
 def reports_amount_of_rented_books_with_delta(status):
     """
     Get report of books by rental status and days for how long they were rented for
@@ -23,46 +37,194 @@ def reports_amount_of_rented_books_with_delta(status):
         required: true
         enum: [borrowed]
         description: Book status
+      - name: min_days
+        in: query
+        type: integer
+        required: false
+        description: Only books rented for at least this many days
+      - name: max_days
+        in: query
+        type: integer
+        required: false
+        description: Only books rented for at most this many days
+      - name: overdue_days
+        in: query
+        type: integer
+        required: false
+        description: Books rented for longer are flagged as overdue and counted in histogram buckets
+      - name: histogram
+        in: query
+        type: integer
+        required: false
+        description: Return numbers of books in buckets of this many days instead of the books
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of rows, cursor of the next page is returned in X-Next-Cursor header
+      - name: after
+        in: query
+        type: string
+        required: false
+        description: Cursor of the page to return
+      - name: stream
+        in: query
+        type: string
+        enum: [json, ndjson]
+        required: false
+        description: Stream rows as a JSON array or newline delimited JSON
     responses:
       200:
-        description: Number of books with the given status and days for how long they were rented for
+        description: Books with the given status and days for how long they were rented for, or a histogram of them
         schema:
-          type: object
-          properties:
-            status:
-              type: string
-            count:
-              type: integer
+          type: array
+          items:
+            type: object
+            properties:
+              book_id:
+                type: integer
+              title:
+                type: string
+              days_rented:
+                type: integer
+              overdue:
+                type: boolean
       400:
         description: Invalid status. Use 'borrowed'.
     """
-    if not BookStatus.is_valid_status(status):
+    return run_plan(amount_plan(status))
+
+
+def amount_plan(status):
+    # only borrowed books have a rental duration
+    if not BookStatus.is_valid_status(status) or (
+        status.strip().lower() != BookStatus.BORROWED
+    ):
         return jsonify({"error": "Invalid status. Use 'borrowed'."}), 400
 
-    records = (
-        db.session.query(Book, Rentals).join(Rentals, Rentals.book_id == Book.id).all()
+    try:
+        page = parse_page_args(cursor_size=1)
+        min_days = parse_days("min_days")
+        max_days = parse_days("max_days")
+        overdue_days = parse_days("overdue_days")
+        bucket_days = parse_days("histogram")
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    if bucket_days == 0:
+        return jsonify({"error": "'histogram' must be a positive number."}), 400
+
+    # days are computed by the database, only scalar columns are returned
+    days_rented = days_since(Rentals.created_at)
+    filters = []
+    if min_days is not None:
+        filters.append(days_rented >= min_days)
+    if max_days is not None:
+        filters.append(days_rented <= max_days)
+
+    if bucket_days is not None:
+        return ReadPlan(
+            days_rented_histogram_query(
+                days_rented, filters, bucket_days, overdue_days
+            ),
+            lambda rows: jsonify(
+                days_rented_histogram(rows, bucket_days, overdue_days)
+            ),
+        )
+
+    overdue = (
+        (days_rented > overdue_days).label("overdue")
+        if overdue_days is not None
+        else literal(None).label("overdue")
     )
+    query = (
+        select(
+            Rentals.id,
+            Book.book_id,
+            Book.title,
+            days_rented.label("days_rented"),
+            overdue,
+        )
+        .join(Book, Rentals.book_id == Book.id)
+        .filter(*filters)
+        .order_by(Rentals.id)
+    )
+    if page.after:
+        query = query.filter(Rentals.id > page.after[0])
+    if page.limit is not None:
+        query = query.limit(page.limit)
 
-    if records:
-        now = datetime.now()
-        results = [
-            {
-                "book_id": book.book_id,
-                "title": book.title,
-                "days_rented": get_delta(now, rentals.created_at),
-            }
-            for book, rentals in records
-        ]
-        return jsonify(results), 200
+    def serialize(row):
+        result = {
+            "book_id": row.book_id,
+            "title": row.title,
+            "days_rented": row.days_rented,
+        }
+        if overdue_days is not None:
+            result["overdue"] = bool(row.overdue)
+        return result
 
-    return jsonify({"message": f"No books found with given status of {status}"}), 404
+    return ReadPlan(
+        query,
+        lambda rows: page_response(
+            rows,
+            serialize=serialize,
+            cursor_of=lambda row: (row.id,),
+            page=page,
+            empty_response=(
+                jsonify({"message": f"No books found with given status of {status}"}),
+                404,
+            ),
+        ),
+        stream=page.stream is not None,
+    )
 
 
-def get_delta(now: datetime, created_at: datetime) -> int:
-    return (now - created_at).days
+def parse_days(name: str) -> int | None:
+    value = request.args.get(name, None, type=str)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValueError(f"'{name}' must be a number of days.")
+    return int(value)
+
+
+def days_rented_histogram_query(
+    days_rented, filters: list, bucket_days: int, overdue_days: int | None
+) -> Select:
+    # integer division of non-negative days, grouped by the database
+    bucket = (days_rented // bucket_days).label("bucket")
+    columns = [bucket, func.count().label("count")]
+    if overdue_days is not None:
+        columns.append(
+            func.sum(case((days_rented > overdue_days, 1), else_=0)).label("overdue")
+        )
+    return (
+        select(*columns)
+        .select_from(Rentals)
+        .where(*filters)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+
+def days_rented_histogram(
+    rows, bucket_days: int, overdue_days: int | None
+) -> list[dict]:
+    histogram = []
+    for row in rows:
+        result = {
+            "from_days": row.bucket * bucket_days,
+            "to_days": (row.bucket + 1) * bucket_days - 1,
+            "count": row.count,
+        }
+        if overdue_days is not None:
+            result["overdue"] = int(row.overdue)
+        histogram.append(result)
+    return histogram
 
 
 @bp.route("/top_rentals", methods=["GET"])
+@cached_response
 def reports_top_rentals():
     """
     Get a list of the top rented books.
@@ -70,7 +232,24 @@ def reports_top_rentals():
     tags:
       - Reports
     summary: Top Rented Books Report
-    description: Returns a list of books ordered by the number of rentals.
+    description: Returns a list of books ordered by the number of rentals, read from precomputed counters.
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of rows, cursor of the next page is returned in X-Next-Cursor header
+      - name: after
+        in: query
+        type: string
+        required: false
+        description: Cursor of the page to return
+      - name: stream
+        in: query
+        type: string
+        enum: [json, ndjson]
+        required: false
+        description: Stream rows as a JSON array or newline delimited JSON
     responses:
       200:
         description: A list of top rented books
@@ -89,31 +268,58 @@ def reports_top_rentals():
                 type: integer
                 description: Number of times the book was rented
     """
-    results = (
-        db.session.query(
-            Book.id,
+    return run_plan(top_rentals_plan())
+
+
+def top_rentals_plan():
+    try:
+        page = parse_page_args(cursor_size=2)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    # counters are read in the order of their index, top-N does not depend on the number of rentals
+    rental_count = BookRentalStats.rental_count
+    query = (
+        select(
+            BookRentalStats.book_id.label("id"),
             Book.title,
             Book.authors,
-            func.count(Rentals.id).label("rental_count"),
+            rental_count.label("rental_count"),
         )
-        .join(Rentals, Rentals.book_id == Book.id)
-        .group_by(
-            Book.id, Book.title, Book.authors
-        )  # all not-aggregated columns from query
-        .order_by(func.count(Rentals.id).desc())
-        .all()
+        .join(Book, Book.id == BookRentalStats.book_id)
+        .filter(rental_count > 0)
+        .order_by(rental_count.desc(), BookRentalStats.book_id)
+    )
+    if page.after:
+        count, book_id = page.after
+        query = query.filter(
+            or_(
+                rental_count < count,
+                and_(rental_count == count, BookRentalStats.book_id > book_id),
+            )
+        )
+    if page.limit is not None:
+        query = query.limit(page.limit)
+
+    return ReadPlan(
+        query,
+        lambda rows: page_response(
+            rows,
+            serialize=lambda r: {
+                "title": r.title,
+                "authors": r.authors,
+                "rental_count": r.rental_count,
+            },
+            cursor_of=lambda r: (r.rental_count, r.id),
+            page=page,
+            empty_response=jsonify({"error": "No rentals found"}),
+        ),
+        stream=page.stream is not None,
     )
-    if results:
-        report = [
-            {"title": r.title, "authors": r.authors, "rental_count": r.rental_count}
-            for r in results
-        ]
-        return jsonify(report)
-    else:
-        return jsonify({"error": "No rentals found"})
 
 
 @bp.route("/top_rentals_by_username", methods=["GET"])
+@cached_response
 def reports_top_rentals_by_usernames():
     """
     Get a list of the top rented books with usernames
@@ -121,7 +327,24 @@ def reports_top_rentals_by_usernames():
     tags:
       - Reports
     summary: Top Rented Books Report With Username
-    description: Returns a list of books ordered by the number of rentals.
+    description: Returns a list of books and users ordered by the number of rentals, read from precomputed counters.
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of rows, cursor of the next page is returned in X-Next-Cursor header
+      - name: after
+        in: query
+        type: string
+        required: false
+        description: Cursor of the page to return
+      - name: stream
+        in: query
+        type: string
+        enum: [json, ndjson]
+        required: false
+        description: Stream rows as a JSON array or newline delimited JSON
     responses:
       200:
         description: A list of top rented books by username
@@ -140,21 +363,280 @@ def reports_top_rentals_by_usernames():
                 type: integer
                 description: Rental count
     """
-    results = (
-        db.session.query(
-            Book.title, User.user_name, func.count(Rentals.id).label("rental_count")
+    return run_plan(top_rentals_by_usernames_plan())
+
+
+def top_rentals_by_usernames_plan():
+    try:
+        page = parse_page_args(cursor_size=3)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    rental_count = BookUserRentalStats.rental_count
+    query = (
+        select(
+            BookUserRentalStats.book_id,
+            BookUserRentalStats.user_id,
+            Book.title,
+            User.user_name,
+            rental_count.label("rental_count"),
+        )
+        .join(Book, Book.id == BookUserRentalStats.book_id)
+        .join(User, User.id == BookUserRentalStats.user_id)
+        .filter(rental_count > 0)
+        .order_by(
+            rental_count.desc(),
+            BookUserRentalStats.book_id,
+            BookUserRentalStats.user_id,
         )
-        .join(Rentals, Rentals.book_id == Book.id)
-        .join(User, Rentals.user_id == User.id)
-        .group_by(Book.title, User.user_name)  # all not-aggregated columns from query
-        .order_by(desc("rental_count"))
-        .all()
     )
-    if results:
-        report = [
-            {"title": r.title, "user_name": r.user_name, "rental_count": r.rental_count}
-            for r in results
-        ]
-        return jsonify(report)
-    else:
-        return jsonify({"error": "No rentals found"})
+    if page.after:
+        count, book_id, user_id = page.after
+        query = query.filter(
+            or_(
+                rental_count < count,
+                and_(rental_count == count, BookUserRentalStats.book_id > book_id),
+                and_(
+                    rental_count == count,
+                    BookUserRentalStats.book_id == book_id,
+                    BookUserRentalStats.user_id > user_id,
+                ),
+            )
+        )
+    if page.limit is not None:
+        query = query.limit(page.limit)
+
+    return ReadPlan(
+        query,
+        lambda rows: page_response(
+            rows,
+            serialize=lambda r: {
+                "title": r.title,
+                "user_name": r.user_name,
+                "rental_count": r.rental_count,
+            },
+            cursor_of=lambda r: (r.rental_count, r.book_id, r.user_id),
+            page=page,
+            empty_response=jsonify({"error": "No rentals found"}),
+        ),
+        stream=page.stream is not None,
+    )
+
+
+@bp.route("/rental_stats/rebuild", methods=["POST"])
+def rebuild_rental_statistics():
+    """
+    Rebuild rental counters of the top rentals reports from scratch
+    ---
+    tags:
+      - Reports
+    description: Counters are maintained when books are borrowed, rebuild recomputes them from checkouts of the rental history, so returned rentals are counted too.
+    responses:
+      200:
+        description: Number of rebuilt counters
+        schema:
+          type: object
+          properties:
+            books:
+              type: integer
+            book_users:
+              type: integer
+    """
+    books, book_users = rebuild_rental_stats()
+    mark_changed()
+    db.session.commit()
+    return jsonify({"books": books, "book_users": book_users}), 200
+
+
+@bp.route("/rental_history", methods=["GET"])
+@cached_response
+def reports_rental_history():
+    """
+    Get numbers of checkouts and returns of books within a range of days
+    ---
+    tags:
+      - Reports
+    parameters:
+      - name: from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: First day of the range, 30 days ago by default
+      - name: to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Last day of the range, today by default
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of rows, cursor of the next page is returned in X-Next-Cursor header
+      - name: after
+        in: query
+        type: string
+        required: false
+        description: Cursor of the page to return
+      - name: stream
+        in: query
+        type: string
+        enum: [json, ndjson]
+        required: false
+        description: Stream rows as a JSON array or newline delimited JSON
+    responses:
+      200:
+        description: Books ordered by the number of checkouts within the range
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              book_id:
+                type: integer
+              title:
+                type: string
+              checkouts:
+                type: integer
+              returns:
+                type: integer
+      400:
+        description: Invalid range of days
+    """
+    return run_plan(rental_history_plan())
+
+
+def rental_history_plan():
+    try:
+        page = parse_page_args(cursor_size=2)
+        end = parse_day("to", date.today())
+        start = parse_day("from", end - timedelta(days=30))
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    if start > end:
+        return jsonify({"error": "'from' must not be after 'to'."}), 400
+
+    history = rental_history_query(start, end).subquery()
+    query = (
+        select(
+            history.c.book_id.label("id"),
+            Book.book_id,
+            Book.title,
+            history.c.checkouts,
+            history.c.returns,
+        )
+        .join(Book, Book.id == history.c.book_id)
+        .order_by(history.c.checkouts.desc(), history.c.book_id)
+    )
+    if page.after:
+        checkouts, book_id = page.after
+        query = query.filter(
+            or_(
+                history.c.checkouts < checkouts,
+                and_(history.c.checkouts == checkouts, history.c.book_id > book_id),
+            )
+        )
+    if page.limit is not None:
+        query = query.limit(page.limit)
+
+    return ReadPlan(
+        query,
+        lambda rows: page_response(
+            rows,
+            serialize=lambda r: {
+                "book_id": r.book_id,
+                "title": r.title,
+                "checkouts": int(r.checkouts),
+                "returns": int(r.returns),
+            },
+            cursor_of=lambda r: (int(r.checkouts), r.id),
+            page=page,
+        ),
+        stream=page.stream is not None,
+    )
+
+
+def parse_day(name: str, default: date) -> date:
+    value = request.args.get(name, None, type=str)
+    if value is None:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format.")
+
+
+@bp.route("/rental_history/compact", methods=["POST"])
+def compact_rental_history():
+    """
+    Compact rental events older than the retention into daily rows
+    ---
+    tags:
+      - Reports
+    parameters:
+      - name: retention_days
+        in: query
+        type: integer
+        required: false
+        description: Number of days whose raw events are kept, 90 by default
+    responses:
+      200:
+        description: Number of compacted events
+        schema:
+          type: object
+          properties:
+            compacted:
+              type: integer
+      400:
+        description: Invalid retention
+    """
+    retention_days = request.args.get("retention_days", RETENTION_DAYS, type=str)
+    if not str(retention_days).isdigit():
+        return jsonify({"error": "'retention_days' must be a number."}), 400
+
+    compacted = compact_rental_events(int(retention_days))
+    mark_changed()
+    db.session.commit()
+    return jsonify({"compacted": compacted}), 200
+
+
+@bp.route("/export", methods=["POST"])
+def export_for_analytics():
+    """
+    Export books, users, wishlists, rentals and rental events into Parquet files for offline analytics
+    ---
+    tags:
+      - Reports
+    parameters:
+      - name: incremental
+        in: query
+        type: boolean
+        required: false
+        description: Add only rentals and rental events created since the previous export
+    responses:
+      200:
+        description: Export directory and numbers of exported rows by table
+        schema:
+          type: object
+          properties:
+            directory:
+              type: string
+            since:
+              type: string
+            until:
+              type: string
+            rows:
+              type: object
+      501:
+        description: Parquet support is not installed
+    """
+    incremental = request.args.get("incremental", "false").lower() in ("1", "true")
+    directory = current_app.config.get("EXPORT_DIRECTORY") or os.path.join(
+        current_app.instance_path, "exports"
+    )
+    try:
+        report = export_database(directory, incremental)
+    except ExportUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+    return jsonify(asdict(report)), 200
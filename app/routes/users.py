@@ -1,7 +1,13 @@
 from flask import jsonify, Blueprint
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
 from app.db.models import User, db
+from app.db.repository import get_repository, invalidate_users
 from app.app_types.UserType import UserType
+from app.utils.bulk_insert import BATCH_SIZE, chunked, dialect_insert
+from app.utils.bulk_request import parse_bulk_rows
+from app.utils.response_cache import mark_changed
 
 bp = Blueprint("users", __name__, url_prefix="/v1/users")
 
@@ -34,13 +40,20 @@ def create_user(user_name, user_type):
     if not UserType.is_valid_usertype(user_type):
         return jsonify({"error": "User type is not supported"}), 409
 
-    existing_user = User.query.filter_by(user_name=user_name).first()
+    existing_user = get_repository().get_user(user_name)
     if existing_user:
         return jsonify({"error": "Username already exists"}), 409
 
     new_user = User(user_name=user_name, user_type=user_type)
     db.session.add(new_user)
-    db.session.commit()
+    mark_changed()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # created by a concurrent request since the lookup
+        db.session.rollback()
+        return jsonify({"error": "Username already exists"}), 409
+    invalidate_users([user_name])
 
     return (
         jsonify(
@@ -51,3 +64,112 @@ def create_user(user_name, user_type):
         ),
         201,
     )
+
+
+@bp.route("/bulk", methods=["POST"])
+def create_users():
+    """
+    Create many users at once
+    ---
+    consumes:
+      - application/json
+      - application/x-ndjson
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            users:
+              type: array
+              items:
+                type: object
+                properties:
+                  user_name:
+                    type: string
+                  user_type:
+                    type: string
+        description: Users as a JSON object, or NDJSON with one user per line
+    responses:
+      200:
+        description: Status of every row, one of created, exists, duplicate or invalid
+        examples:
+          application/json:
+            - row: 0
+              user_name: "Anna"
+              status: "created"
+              user_id: 1
+            - row: 1
+              user_name: "Anna"
+              status: "duplicate"
+              error: "Username is repeated in the request"
+      400:
+        description: Bad request, e.g. body is not a list of users
+    """
+
+    try:
+        rows = parse_bulk_rows("users")
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    results = []
+    new_users = {}
+    for number, row in enumerate(rows):
+        user_name = row.get("user_name") if isinstance(row, dict) else None
+        user_type = row.get("user_type") if isinstance(row, dict) else None
+        result = {"row": number, "user_name": user_name}
+        results.append(result)
+        if not isinstance(user_name, str) or not user_name:
+            result.update(status="invalid", error="Username is missing")
+        elif not isinstance(user_type, str) or not UserType.is_valid_usertype(
+            user_type
+        ):
+            result.update(status="invalid", error="User type is not supported")
+        elif user_name in new_users:
+            result.update(
+                status="duplicate", error="Username is repeated in the request"
+            )
+        else:
+            new_users[user_name] = {"user_name": user_name, "user_type": user_type}
+
+    existing = get_existing_user_names(list(new_users))
+    created = insert_users(
+        [user for name, user in new_users.items() if name not in existing]
+    )
+    mark_changed()
+    db.session.commit()
+    invalidate_users(list(created))
+
+    for result in results:
+        if "status" in result:
+            continue
+        if result["user_name"] in created:
+            result.update(status="created", user_id=created[result["user_name"]])
+        else:
+            result.update(status="exists", error="Username already exists")
+    return jsonify(results), 200
+
+
+def get_existing_user_names(user_names: list[str]) -> set[str]:
+    existing: set[str] = set()
+    for names in chunked(user_names):
+        existing.update(
+            db.session.scalars(select(User.user_name).where(User.user_name.in_(names)))
+        )
+    return existing
+
+
+def insert_users(users: list[dict]) -> dict[str, int]:
+    # users created concurrently in the meantime are skipped, returns ids of inserted users by name
+    statement = (
+        dialect_insert(User.__table__)
+        .on_conflict_do_nothing(index_elements=["user_name"])
+        .returning(User.__table__.c.user_name, User.__table__.c.id)
+    )
+    created: dict[str, int] = {}
+    for batch in chunked(users, BATCH_SIZE):
+        created.update(
+            (row.user_name, row.id) for row in db.session.execute(statement, batch)
+        )
+    return created
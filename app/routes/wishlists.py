@@ -1,7 +1,13 @@
 from flask import jsonify, Blueprint
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
-from app.db.models import User, Book, Wishlist, db
+from app.db.models import Wishlist, db
+from app.db.repository import get_repository
 from app.notifications import notifications
+from app.utils.bulk_insert import BATCH_SIZE, chunked, dialect_insert
+from app.utils.bulk_request import parse_bulk_rows
+from app.utils.response_cache import mark_changed
 
 bp = Blueprint("wishlists", __name__, url_prefix="/v1/wishlists")
 
@@ -56,11 +62,11 @@ def add_to_wishlist(user_name, book_id):
       - ApiKeyAuth: []
     """
 
-    user = get_user(user_name)
+    user = get_repository().get_user(user_name)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    book = get_book(book_id)
+    book = get_repository().get_book(book_id)
     if not book:
         return jsonify({"error": "Book not found"}), 404
 
@@ -68,24 +74,23 @@ def add_to_wishlist(user_name, book_id):
         user_id=user.id, book_id=book.id
     ).first()
     if existing_wishlist_given_user and existing_wishlist_given_user.user_id == user.id:
-        return (
-            jsonify(
-                {
-                    "message": f"Given user '{user_name}' already has this book in a wishlist"
-                }
-            ),
-            200,
-        )
+        return already_wishlisted(user_name)
 
     existing_wishlist_other_user = Wishlist.query.filter_by(book_id=book.id).first()
     if existing_wishlist_other_user:
         return jsonify({"message": "Book already in wishlist of other user"}), 200
 
-    wishlist_entry = Wishlist(user=user, book=book)
+    wishlist_entry = Wishlist(user_id=user.id, book_id=book.id)
     db.session.add(wishlist_entry)
-    db.session.commit()
-
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # added by a concurrent request since the lookup
+        db.session.rollback()
+        return already_wishlisted(user_name)
     notifications.notify(user_name=user.user_name, book_title=book.title)
+    mark_changed()
+    db.session.commit()
 
     return (
         jsonify(
@@ -131,11 +136,11 @@ def remove_from_wishlist(user_name, book_id):
       - ApiKeyAuth: []
     """
 
-    user = get_user(user_name)
+    user = get_repository().get_user(user_name)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    book = get_book(book_id)
+    book = get_repository().get_book(book_id)
     if not book:
         return jsonify({"error": "Book not found"}), 404
 
@@ -154,9 +159,9 @@ def remove_from_wishlist(user_name, book_id):
         )
 
     db.session.delete(existing_wishlist_given_user)
-    db.session.commit()
-
     notifications.notify(user_name=user.user_name, book_title=book.title)
+    mark_changed()
+    db.session.commit()
 
     return (
         jsonify(
@@ -168,9 +173,153 @@ def remove_from_wishlist(user_name, book_id):
     )
 
 
-def get_book(book_id: int) -> Book:
-    return Book.query.filter_by(book_id=book_id).first()
+@bp.route("/bulk", methods=["POST"])
+def add_to_wishlists():
+    """
+    ---
+    summary: Add many books to wishlists of users at once
+    consumes:
+      - application/json
+      - application/x-ndjson
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            wishlists:
+              type: array
+              items:
+                type: object
+                properties:
+                  user_name:
+                    type: string
+                  book_id:
+                    type: integer
+        description: Wishlists as a JSON object, or NDJSON with one wishlist per line
+    responses:
+      200:
+        description: Status of every row, one of created, exists, duplicate, conflict, not_found or invalid
+        content:
+          application/json:
+            schema:
+              type: array
+              items:
+                type: object
+      400:
+        description: Bad request, e.g. body is not a list of wishlists
+    security:
+      - ApiKeyAuth: []
+    """
+
+    try:
+        rows = parse_bulk_rows("wishlists")
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    results = []
+    valid = []
+    for number, row in enumerate(rows):
+        user_name = row.get("user_name") if isinstance(row, dict) else None
+        book_id = row.get("book_id") if isinstance(row, dict) else None
+        result = {"row": number, "user_name": user_name, "book_id": book_id}
+        results.append(result)
+        if not isinstance(user_name, str) or not user_name:
+            result.update(status="invalid", error="Username is missing")
+        elif not isinstance(book_id, int) or isinstance(book_id, bool):
+            result.update(status="invalid", error="Book ID must be a number")
+        else:
+            valid.append(result)
+
+    users = get_repository().get_users(list({result["user_name"] for result in valid}))
+    books = get_repository().get_books(list({result["book_id"] for result in valid}))
+    # user ids having each book on a wishlist, rows of the request are applied in order
+    wishlisted = get_wishlisted_by([book.id for book in books.values()])
+
+    new_wishlists = []
+    for result in valid:
+        user = users.get(result["user_name"])
+        book = books.get(result["book_id"])
+        if user is None:
+            result.update(status="not_found", error="User not found")
+            continue
+        if book is None:
+            result.update(status="not_found", error="Book not found")
+            continue
+        owners = wishlisted.setdefault(book.id, {})
+        if user.id in owners:
+            if owners[user.id]:
+                result.update(
+                    status="duplicate", error="Wishlist is repeated in the request"
+                )
+            else:
+                result.update(
+                    status="exists",
+                    error=f"Given user '{user.user_name}' already has this book in a wishlist",
+                )
+        elif owners:
+            result.update(
+                status="conflict", error="Book already in wishlist of other user"
+            )
+        else:
+            owners[user.id] = True
+            new_wishlists.append((result, user, book))
+
+    created = insert_wishlists(
+        [{"user_id": user.id, "book_id": book.id} for _, user, book in new_wishlists]
+    )
+    notifications.notify_all(
+        (user.user_name, book.title)
+        for _, user, book in new_wishlists
+        if (user.id, book.id) in created
+    )
+    mark_changed()
+    db.session.commit()
+
+    for result, user, book in new_wishlists:
+        if (user.id, book.id) in created:
+            result.update(status="created")
+        else:
+            # added concurrently by another request
+            result.update(
+                status="exists",
+                error=f"Given user '{user.user_name}' already has this book in a wishlist",
+            )
+    return jsonify(results), 200
+
+
+def get_wishlisted_by(book_pks: list[int]) -> dict[int, dict[int, bool]]:
+    # existing wishlists are marked False, the ones added by the request True
+    wishlisted: dict[int, dict[int, bool]] = {}
+    for ids in chunked(book_pks):
+        for row in db.session.execute(
+            select(Wishlist.book_id, Wishlist.user_id).where(Wishlist.book_id.in_(ids))
+        ):
+            wishlisted.setdefault(row.book_id, {})[row.user_id] = False
+    return wishlisted
 
 
-def get_user(user_name: str) -> User:
-    return User.query.filter_by(user_name=user_name).first()
+def insert_wishlists(wishlists: list[dict]) -> set[tuple[int, int]]:
+    # returns (user_id, book_id) of inserted wishlists
+    table = Wishlist.__table__
+    statement = (
+        dialect_insert(table)
+        .on_conflict_do_nothing(index_elements=["user_id", "book_id"])
+        .returning(table.c.user_id, table.c.book_id)
+    )
+    created: set[tuple[int, int]] = set()
+    for batch in chunked(wishlists, BATCH_SIZE):
+        created.update(
+            (row.user_id, row.book_id) for row in db.session.execute(statement, batch)
+        )
+    return created
+
+
+def already_wishlisted(user_name: str):
+    return (
+        jsonify(
+            {"message": f"Given user '{user_name}' already has this book in a wishlist"}
+        ),
+        200,
+    )
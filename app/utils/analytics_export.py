@@ -0,0 +1,245 @@
+"""
+Export tables of the library database into Parquet files for offline analytics.
+
+    python -m app.utils.analytics_export exports --incremental
+"""
+
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import Boolean, Date, DateTime, Integer, String, select, type_coerce
+
+from app import db
+from app.db.models import Book, RentalEvent, Rentals, User, Wishlist
+
+# pandas is imported by exports only, not by the application serving the export endpoint
+if TYPE_CHECKING:
+    import pandas as pd
+
+CHUNK_SIZE = 50_000
+MANIFEST = "manifest.json"
+# tables exported whole on every run
+SNAPSHOT_MODELS: dict[str, Any] = {"book": Book, "user": User, "wishlist": Wishlist}
+# tables exported by parts, incremental exports add rows created since the previous one
+INCREMENTAL_MODELS: dict[str, tuple[Any, str]] = {
+    "rentals": (Rentals, "created_at"),
+    "rental_event": (RentalEvent, "occurred_at"),
+}
+# SQLite keeps ISBN-10 ending with X as text in the integer column
+STRING_COLUMNS = {"book.isbn"}
+
+
+class ExportUnavailable(RuntimeError):
+    pass
+
+
+@dataclass
+class ExportReport:
+    directory: str
+    until: str
+    since: str | None = None
+    rows: dict[str, int] = field(default_factory=dict)
+
+
+def export_database(
+    directory,
+    incremental: bool = False,
+    chunksize: int = CHUNK_SIZE,
+    until: datetime | None = None,
+) -> ExportReport:
+    """
+    Write a consistent snapshot of the database into Parquet files of the directory, chunk by chunk.
+    Book, user and wishlist tables are replaced, rentals and rental events are written as parts of
+    a dataset directory; with incremental only rows created after the previous export are added.
+    Rows are split at whole seconds, rows of the current second are left to the next export.
+    """
+    pq = _import_parquet()
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    since = manifest.get("until") if incremental else None
+    until = (until or datetime.now()).replace(microsecond=0)
+    report = ExportReport(
+        directory=os.path.abspath(directory),
+        since=since,
+        until=until.isoformat(),
+    )
+    started_at = time.perf_counter()
+
+    with snapshot_connection() as connection:
+        for name, model in SNAPSHOT_MODELS.items():
+            path = os.path.join(directory, f"{name}.parquet")
+            report.rows[name] = write_parquet(
+                pq, connection, select(model.__table__), model, path, chunksize
+            )
+
+        for name, (model, column_name) in INCREMENTAL_MODELS.items():
+            column = model.__table__.c[column_name]
+            query = select(model.__table__).where(
+                column < comparable(connection, until)
+            )
+            if since is not None:
+                query = query.where(
+                    column >= comparable(connection, datetime.fromisoformat(since))
+                )
+
+            parts = os.path.join(directory, name)
+            os.makedirs(parts, exist_ok=True)
+            if since is None:
+                # full export replaces all previous parts
+                for part in os.listdir(parts):
+                    os.remove(os.path.join(parts, part))
+            path = os.path.join(parts, f"part-{until:%Y%m%dT%H%M%S}.parquet")
+            report.rows[name] = write_parquet(
+                pq, connection, query, model, path, chunksize
+            )
+
+    write_manifest(directory, {"until": report.until})
+    elapsed = time.perf_counter() - started_at
+    print(
+        f"Exported {sum(report.rows.values())} rows into {report.directory} in {elapsed:.2f}s: "
+        + ", ".join(f"{name} {rows}" for name, rows in report.rows.items())
+    )
+    return report
+
+
+def _import_parquet():
+    try:
+        import pyarrow.parquet as pq  # type: ignore
+    except ImportError:
+        raise ExportUnavailable(
+            "Parquet export requires pyarrow, install it with `poetry install --extras analytics`."
+        )
+    return pq
+
+
+@contextmanager
+def snapshot_connection():
+    # all tables are read in one transaction, repeatable read gives PostgreSQL a single snapshot
+    with db.engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection = connection.execution_options(isolation_level="REPEATABLE READ")
+        with connection.begin() as transaction:
+            yield connection
+            transaction.rollback()
+
+
+def comparable(connection, value: datetime):
+    # SQLite compares timestamps as text, server defaults have no fraction of a second
+    if connection.dialect.name == "sqlite":
+        return type_coerce(f"{value:%Y-%m-%d %H:%M:%S}", String)
+    return value.astimezone()
+
+
+def arrow_schema(model):
+    import pyarrow as pa  # type: ignore
+
+    types = []
+    for column in model.__table__.columns:
+        if f"{model.__tablename__}.{column.name}" in STRING_COLUMNS:
+            arrow_type = pa.string()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, DateTime):
+            # timestamps with a time zone are written in UTC
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, Date):
+            arrow_type = pa.date32()
+        elif isinstance(column.type, String):
+            arrow_type = pa.string()
+        else:
+            arrow_type = pa.string()
+        types.append(pa.field(column.name, arrow_type, nullable=True))
+    return pa.schema(types)
+
+
+def write_parquet(pq, connection, query, model, path, chunksize: int) -> int:
+    """
+    Stream query results into a Parquet file with one row group per chunk, returns the number of rows.
+    The file is written aside and moved into place once complete.
+    """
+    import pandas as pd
+    import pyarrow as pa  # type: ignore
+
+    schema = arrow_schema(model)
+    columns = model.__table__.columns
+    partial = f"{path}.partial"
+    rows = 0
+    result = connection.execution_options(
+        stream_results=True, yield_per=chunksize
+    ).execute(query)
+    with pq.ParquetWriter(partial, schema) as writer:
+        for chunk in result.partitions(chunksize):
+            frame = pd.DataFrame(chunk, columns=[column.name for column in columns])
+            for column in columns:
+                if f"{model.__tablename__}.{column.name}" in STRING_COLUMNS:
+                    frame[column.name] = frame[column.name].map(
+                        lambda value: None if value is None else str(value)
+                    )
+                elif isinstance(column.type, DateTime):
+                    frame[column.name] = to_naive_utc(frame[column.name])
+            writer.write_table(
+                pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            )
+            rows += len(frame)
+        if rows == 0:
+            writer.write_table(schema.empty_table())
+    os.replace(partial, path)
+    return rows
+
+
+def to_naive_utc(values: "pd.Series") -> "pd.Series":
+    import pandas as pd
+
+    values = pd.to_datetime(values, utc=bool(values.map(_is_aware).any()))
+    if values.dt.tz is not None:
+        values = values.dt.tz_convert(None)
+    return values
+
+
+def _is_aware(value) -> bool:
+    return getattr(value, "tzinfo", None) is not None
+
+
+def read_manifest(directory) -> dict:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def write_manifest(directory, manifest: dict):
+    path = os.path.join(directory, MANIFEST)
+    with open(f"{path}.partial", "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(f"{path}.partial", path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="add only rentals created since the previous export into the directory",
+    )
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from app import create_app
+
+    with create_app().app_context():
+        report = export_database(args.directory, args.incremental, args.chunksize)
+    print(json.dumps(asdict(report), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import time
+from typing import TYPE_CHECKING, cast
+
+from sqlalchemy import CursorResult, insert
+
+from app.db.models import db
+
+# frames are built by the loaders, the application imports only chunked and dialect_insert of this module
+if TYPE_CHECKING:
+    import pandas as pd
+
+BATCH_SIZE = 10_000
+# IN lists are split to stay far below the bound parameter limit of SQLite
+IN_CHUNK_SIZE = 500
+
+
+def to_records(df: "pd.DataFrame") -> list[dict]:
+    # object dtype boxes numpy scalars into python ones, missing values become NULLs
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def bulk_insert(model, df: "pd.DataFrame", batch_size: int = BATCH_SIZE) -> int:
+    """
+    Insert rows of a frame whose columns are named after model columns with executemany batches.
+    Changes are not committed.
+    """
+    statement = insert(model.__table__)
+    for start in range(0, len(df), batch_size):
+        db.session.execute(statement, to_records(df.iloc[start : start + batch_size]))
+    return len(df)
+
+
+def chunked(values: list, size: int = IN_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def dialect_insert(table):
+    # INSERT supporting ON CONFLICT clauses of the current database
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+        return postgresql_insert(table)
+
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    return sqlite_insert(table)
+
+
+def execute_rowcount(statement) -> int:
+    # number of rows matched by an UPDATE or DELETE executed in the session
+    return cast(CursorResult, db.session.execute(statement)).rowcount
+
+
+def bulk_upsert(
+    table, df: "pd.DataFrame", key: list[str], batch_size: int = BATCH_SIZE
+) -> int:
+    """
+    Insert rows of a frame, rows with an already existing key replace the stored ones.
+    Changes are not committed.
+    """
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key,
+        set_={name: statement.excluded[name] for name in df.columns if name not in key},
+    )
+    for start in range(0, len(df), batch_size):
+        db.session.execute(statement, to_records(df.iloc[start : start + batch_size]))
+    return len(df)
+
+
+def report_throughput(rows: int, what: str, started_at: float) -> None:
+    elapsed = time.perf_counter() - started_at
+    rate = rows / elapsed if elapsed else float(rows)
+    print(
+        f"Inserted {rows} {what} into the database in {elapsed:.2f}s ({rate:.0f} rows/s)."
+    )
@@ -0,0 +1,35 @@
+import json
+
+from flask import request
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+MAX_BULK_ROWS = 50_000
+
+
+def parse_bulk_rows(collection: str, max_rows: int = MAX_BULK_ROWS) -> list:
+    """
+    Read rows of a bulk request, raises ValueError if the body is invalid.
+    The body is either a JSON object with rows in the given collection, e.g. {"users": [...]},
+    or NDJSON with one row per line. Rows are returned as sent, they are validated by the caller.
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        rows = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON.")
+    else:
+        payload = request.get_json(silent=True)
+        collected = payload.get(collection) if isinstance(payload, dict) else None
+        if not isinstance(collected, list):
+            raise ValueError(
+                f"Body must be a JSON object with '{collection}' list or NDJSON."
+            )
+        rows = collected
+
+    if not 0 < len(rows) <= max_rows:
+        raise ValueError(f"Between 1 and {max_rows} {collection} can be sent at once.")
+    return rows
@@ -1,27 +1,246 @@
+import os
+import time
+from dataclasses import dataclass
+
 import pandas as pd
+from sqlalchemy import (
+    Column,
+    MetaData,
+    Table,
+    exists,
+    func,
+    or_,
+    select,
+    true,
+)
+
 from app import db
-from app.db.models import Book
+from app.db.models import Book, ImportCheckpoint, Rentals, Wishlist
+from app.db.repository import invalidate_books
+from app.utils.bulk_insert import bulk_upsert, dialect_insert, execute_rowcount
+from app.utils.response_cache import mark_changed
+
+INVENTORY_COLUMNS = {
+    "Id": "book_id",
+    "ISBN": "isbn",
+    "Authors": "authors",
+    "Publication Year": "publication_year",
+    "Title": "title",
+    "Language": "language",
+}
+BOOK_COLUMNS = list(INVENTORY_COLUMNS.values())
+CHUNK_SIZE = 50_000
+
+# rows of the imported file, compared with books once the whole file is read
+book_staging = Table(
+    "book_staging",
+    MetaData(),
+    *(
+        Column(
+            name,
+            Book.__table__.c[name].type,
+            primary_key=name == "book_id",
+            autoincrement=False,
+            nullable=Book.__table__.c[name].nullable,
+        )
+        for name in BOOK_COLUMNS
+    ),
+)
+
+
+@dataclass
+class SyncReport:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    # books missing from the file but still rented, removed by a sync after their return
+    kept_rented: int = 0
+
+
+def read_inventory(csv_path, **kwargs):
+    return pd.read_csv(
+        csv_path,
+        header=0,
+        skip_blank_lines=True,
+        usecols=list(INVENTORY_COLUMNS),
+        dtype={"Id": "int64", "ISBN": "object", "Publication Year": "int64"},
+        **kwargs,
+    )
 
 
-def load_inventory(csv_path):
-    df = pd.read_csv(csv_path, header=0, skip_blank_lines=True)
+def to_books(df: pd.DataFrame) -> pd.DataFrame:
+    return df.rename(columns=INVENTORY_COLUMNS)[BOOK_COLUMNS]
 
-    db.session.query(Book).delete()
+
+def load_inventory(csv_path, chunksize: int | None = None) -> SyncReport:
+    """
+    Synchronize books with the content of the inventory file, books are matched by book_id.
+    With chunksize the file is streamed and every chunk is committed on its own,
+    an interrupted import is resumed from the last committed chunk by the next call.
+    """
+    if chunksize:
+        return stream_inventory(csv_path, chunksize)
+
+    started_at = time.perf_counter()
+    prepare_sync()
+
+    # the whole file is staged again, a later chunked import must not resume an earlier one
+    db.session.execute(
+        ImportCheckpoint.__table__.delete().where(
+            ImportCheckpoint.source == os.path.abspath(csv_path)
+        )
+    )
+    db.session.execute(book_staging.delete())
+    rows = bulk_upsert(
+        book_staging, to_books(read_inventory(csv_path)), key=["book_id"]
+    )
+    report = sync_books()
+    report.rows = rows
+    mark_changed()
     db.session.commit()
+    invalidate_books()
+
+    print_report(report, started_at)
+    return report
+
+
+def stream_inventory(csv_path, chunksize: int = CHUNK_SIZE) -> SyncReport:
+    started_at = time.perf_counter()
+    source = os.path.abspath(csv_path)
+    signature = file_signature(csv_path)
+
+    prepare_sync()
+    checkpoint = ImportCheckpoint.query.filter_by(source=source).first()
+    if checkpoint and checkpoint.signature != signature:
+        print(f"Inventory {source} changed since the interrupted import, restarting")
+        db.session.delete(checkpoint)
+        db.session.flush()
+        checkpoint = None
 
-    books = []
-    for _, row in df.iterrows():
-        print(f"Row {row=}")
-        book = Book(
-            book_id=row["Id"],
-            isbn=row["ISBN"],
-            authors=row["Authors"],
-            publication_year=int(row["Publication Year"]),
-            title=row["Title"],
-            language=row["Language"],
+    if checkpoint:
+        print(f"Resuming import of {source} after row {checkpoint.rows_committed}")
+    else:
+        db.session.execute(book_staging.delete())
+        checkpoint = ImportCheckpoint(
+            source=source, signature=signature, rows_committed=0
         )
-        books.append(book)
+        db.session.add(checkpoint)
+        db.session.commit()
 
-    db.session.add_all(books)
+    to_skip = checkpoint.rows_committed
+    rows = 0
+    with read_inventory(csv_path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            # rows of already committed chunks are parsed again but not staged
+            if to_skip >= len(chunk):
+                to_skip -= len(chunk)
+                continue
+            chunk = chunk.iloc[to_skip:]
+            to_skip = 0
+
+            rows += bulk_upsert(book_staging, to_books(chunk), key=["book_id"])
+            # chunk and its checkpoint are committed in a single transaction
+            checkpoint.rows_committed += len(chunk)
+            db.session.commit()
+
+    report = sync_books()
+    report.rows = rows
+    db.session.delete(checkpoint)
+    mark_changed()
     db.session.commit()
-    print(f"Inserted {len(df)} book into the database.")
+    invalidate_books()
+
+    print_report(report, started_at)
+    return report
+
+
+def prepare_sync():
+    # databases created before books were synchronized lack the tables and the book_id index
+    ImportCheckpoint.__table__.create(db.engine, checkfirst=True)
+    book_staging.create(db.engine, checkfirst=True)
+    for index in Book.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+def sync_books() -> SyncReport:
+    """
+    Apply differences between staged rows and books, only new, changed and removed books are written.
+    Wishlists of removed books are deleted with them, rented books are kept until they are returned.
+    Staged rows are cleared, changes are not committed.
+    """
+    book = Book.__table__
+    staged = book_staging.c
+    wishlist = Wishlist.__table__
+    rentals = Rentals.__table__
+
+    changed = or_(
+        *(book.c[name].is_distinct_from(staged[name]) for name in BOOK_COLUMNS)
+    )
+    inserted = db.session.scalar(
+        select(func.count())
+        .select_from(book_staging)
+        .where(~exists().where(book.c.book_id == staged.book_id))
+    )
+    updated = db.session.scalar(
+        select(func.count())
+        .select_from(book_staging.join(book, book.c.book_id == staged.book_id))
+        .where(changed)
+    )
+
+    missing = ~exists().where(staged.book_id == book.c.book_id)
+    rented = exists().where(rentals.c.book_id == book.c.id)
+    kept_rented = db.session.scalar(
+        select(func.count()).select_from(book).where(missing, rented)
+    )
+    db.session.execute(
+        wishlist.delete().where(
+            wishlist.c.book_id.in_(select(book.c.id).where(missing, ~rented))
+        )
+    )
+    deleted = execute_rowcount(book.delete().where(missing, ~rented))
+
+    upsert = dialect_insert(book)
+    upsert = upsert.from_select(
+        BOOK_COLUMNS,
+        select(*(staged[name] for name in BOOK_COLUMNS)).where(true()),
+    ).on_conflict_do_update(
+        index_elements=["book_id"],
+        set_={
+            name: upsert.excluded[name] for name in BOOK_COLUMNS if name != "book_id"
+        },
+        where=or_(
+            *(
+                book.c[name].is_distinct_from(upsert.excluded[name])
+                for name in BOOK_COLUMNS
+            )
+        ),
+    )
+    db.session.execute(upsert)
+
+    db.session.execute(book_staging.delete())
+    return SyncReport(
+        inserted=inserted or 0,
+        updated=updated or 0,
+        deleted=deleted,
+        kept_rented=kept_rented or 0,
+    )
+
+
+def print_report(report: SyncReport, started_at: float):
+    elapsed = time.perf_counter() - started_at
+    rate = report.rows / elapsed if elapsed else float(report.rows)
+    print(
+        f"Synchronized {report.rows} inventory rows in {elapsed:.2f}s ({rate:.0f} rows/s): "
+        f"{report.inserted} books inserted, {report.updated} updated, {report.deleted} deleted."
+        + (
+            f" {report.kept_rented} removed books are kept until they are returned."
+            if report.kept_rented
+            else ""
+        )
+    )
+
+
+def file_signature(path) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
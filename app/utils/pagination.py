@@ -0,0 +1,142 @@
+import base64
+import binascii
+import json
+import math
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator
+from urllib.parse import urlencode
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+MAX_LIMIT = 1000
+YIELD_PER = 500
+STREAM_FORMATS = ("json", "ndjson")
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass(frozen=True)
+class PageArgs:
+    limit: int | None
+    after: list | None
+    stream: str | None
+
+
+def parse_page_args(cursor_size: int) -> PageArgs:
+    """
+    Read 'limit', 'after' and 'stream' query parameters, raises ValueError if any of them is invalid
+    """
+    limit = None
+    limit_arg = request.args.get("limit", None, type=str)
+    if limit_arg is not None:
+        if not limit_arg.isdigit() or not 0 < int(limit_arg) <= MAX_LIMIT:
+            raise ValueError(f"'limit' must be a number between 1 and {MAX_LIMIT}.")
+        limit = int(limit_arg)
+
+    after = None
+    after_arg = request.args.get("after", None, type=str)
+    if after_arg is not None:
+        after = decode_cursor(after_arg)
+        if len(after) != cursor_size:
+            raise ValueError("'after' is not a valid cursor.")
+
+    stream = request.args.get("stream", None, type=str)
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise ValueError(f"'stream' must be one of {', '.join(STREAM_FORMATS)}.")
+
+    return PageArgs(limit=limit, after=after, stream=stream)
+
+
+def encode_cursor(values: Iterable[Any]) -> str:
+    payload = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError):
+        raise ValueError("'after' is not a valid cursor.")
+    if not isinstance(values, list) or not all(map(_is_cursor_value, values)):
+        raise ValueError("'after' is not a valid cursor.")
+    return values
+
+
+def _is_cursor_value(value) -> bool:
+    # cursors hold ranks, counters and ids, other values are forged and would fail to bind
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -(2**63) <= value < 2**63
+    return isinstance(value, float) and math.isfinite(value)
+
+
+def page_response(
+    rows: Iterable,
+    serialize: Callable[[Any], dict],
+    cursor_of: Callable[[Any], Iterable[Any]],
+    page: PageArgs,
+    empty_response=None,
+):
+    """
+    Respond with serialized rows either as a single page or as a stream.
+    empty_response is returned instead if the first page of the results is empty.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        if empty_response is not None and page.after is None:
+            return empty_response
+        rows = iter(())
+    else:
+        rows = chain([first], rows)
+
+    if page.stream == "ndjson":
+        return Response(
+            stream_with_context(_stream_ndjson(rows, serialize)),
+            mimetype="application/x-ndjson",
+        )
+    if page.stream == "json":
+        return Response(
+            stream_with_context(_stream_json_array(rows, serialize)),
+            mimetype="application/json",
+        )
+
+    items = []
+    last = None
+    for row in rows:
+        items.append(serialize(row))
+        last = row
+
+    response = jsonify(items)
+    if page.limit is not None and len(items) == page.limit:
+        cursor = encode_cursor(cursor_of(last))
+        args = request.args.to_dict()
+        args["after"] = cursor
+        next_url = f"{request.base_url}?{urlencode(args)}"
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def _chunks(rows: Iterator, serialize: Callable[[Any], dict]) -> Iterator[list[str]]:
+    dumps = current_app.json.dumps
+    while chunk := list(islice(rows, YIELD_PER)):
+        yield [dumps(serialize(row)) for row in chunk]
+
+
+def _stream_ndjson(rows: Iterator, serialize: Callable[[Any], dict]) -> Iterator[str]:
+    for chunk in _chunks(rows, serialize):
+        yield "\n".join(chunk) + "\n"
+
+
+def _stream_json_array(
+    rows: Iterator, serialize: Callable[[Any], dict]
+) -> Iterator[str]:
+    yield "["
+    separator = ""
+    for chunk in _chunks(rows, serialize):
+        yield separator + ",".join(chunk)
+        separator = ","
+    yield "]"
@@ -0,0 +1,48 @@
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from flask import current_app
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from app.db.models import db
+from app.utils.pagination import YIELD_PER
+
+
+@dataclass(frozen=True)
+class ReadPlan:
+    """
+    Query of a read-only view and the function building its response from the result rows,
+    so that the view is served both by the Flask session and by the asyncio engine.
+    """
+
+    query: Select
+    respond: Callable[[Any], Any]
+    stream: bool = False
+
+
+def run_plan(plan):
+    # plans of invalid arguments are error responses already
+    if not isinstance(plan, ReadPlan):
+        return plan
+    query = plan.query.execution_options(yield_per=YIELD_PER)
+    if not plan.stream:
+        return plan.respond(db.session.execute(query))
+
+    # the session of the request is closed before a stream is sent,
+    # so a stream reads its rows by a session closed once they are read or the response is closed
+    session = Session(db.engine)
+    try:
+        response = current_app.make_response(plan.respond(_read_rows(session, query)))
+    except Exception:
+        session.close()
+        raise
+    response.call_on_close(session.close)
+    return response
+
+
+def _read_rows(session: Session, query: Select):
+    try:
+        yield from session.execute(query)
+    finally:
+        session.close()
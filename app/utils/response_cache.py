@@ -0,0 +1,154 @@
+import hashlib
+from dataclasses import dataclass
+from functools import wraps
+
+from flask import Response, current_app, has_app_context, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.models import db
+from app.db.repository import EXTENSION, LookupCache, get_repository
+from app.utils.pagination import NEXT_CURSOR_HEADER
+
+RESPONSES = "responses"
+SESSION_KEY = "responses_changed"
+# headers of a page kept together with its body
+CACHED_HEADERS = (NEXT_CURSOR_HEADER, "Link")
+
+# defaults of RESPONSE_CACHE_* config
+RESPONSE_CACHE_DEFAULTS = {
+    "RESPONSE_CACHE_MAX_SIZE": 1000,
+    # days of rentals in reports grow with time, so bodies are recomputed at least this often
+    "RESPONSE_CACHE_TTL": 60.0,
+    # larger bodies are only revalidated by ETag
+    "RESPONSE_CACHE_MAX_BODY": 1024 * 1024,
+    # clients and proxies may store responses but revalidate them on every use
+    "RESPONSE_CACHE_CONTROL": "public, no-cache",
+}
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    mimetype: str | None
+    etag: str
+    headers: tuple[tuple[str, str], ...]
+
+
+@dataclass(frozen=True)
+class CacheLookup:
+    key: tuple
+    generation: int
+    cached: CachedResponse | None
+
+
+def init_response_cache(app):
+    config = {
+        name: app.config.setdefault(name, value)
+        for name, value in RESPONSE_CACHE_DEFAULTS.items()
+    }
+    cache = LookupCache(config["RESPONSE_CACHE_MAX_SIZE"], config["RESPONSE_CACHE_TTL"])
+    app.extensions[EXTENSION].add_cache(RESPONSES, cache)
+    return cache
+
+
+def cached_response(view):
+    """
+    Serve GET responses of the view from memory by path and normalized query arguments with a strong ETag,
+    a request whose If-None-Match matches is answered by 304. Cached bodies are dropped
+    when a transaction marked by mark_changed commits, streamed responses are not cached.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.args.get("stream"):
+            return view(*args, **kwargs)
+
+        lookup = lookup_response()
+        cached = lookup.cached
+        if cached is None:
+            response = make_response(view(*args, **kwargs))
+            cached = store_response(lookup, response)
+            if cached is None:
+                return response
+        return serve_cached(cached, hit=lookup.cached is not None)
+
+    return wrapper
+
+
+def lookup_response() -> CacheLookup:
+    repository = get_repository()
+    # generation is read before the view, so a body computed during a change is not kept
+    generation = repository.generation(RESPONSES)
+    key = (request.path, tuple(sorted(request.args.items(multi=True))))
+    return CacheLookup(key, generation, repository.caches[RESPONSES].get(key))
+
+
+def store_response(lookup: CacheLookup, response: Response) -> CachedResponse | None:
+    """
+    Keep a response computed on a miss of the lookup, returns None if it is not served as a cached one
+    """
+    if response.status_code != 200 or response.is_streamed:
+        return None
+    cached = to_cached_response(response)
+    if len(cached.body) <= current_app.config["RESPONSE_CACHE_MAX_BODY"]:
+        get_repository().caches[RESPONSES].put(lookup.key, cached, lookup.generation)
+    return cached
+
+
+def serve_cached(cached: CachedResponse, hit: bool) -> Response:
+    response = Response(cached.body, mimetype=cached.mimetype)
+    response.headers.extend(cached.headers)
+    response.set_etag(cached.etag)
+    response.headers["Cache-Control"] = current_app.config["RESPONSE_CACHE_CONTROL"]
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    # answered by 304 Not Modified if the request carries a matching ETag
+    response.make_conditional(request)
+    return response
+
+
+def to_cached_response(response: Response) -> CachedResponse:
+    body = response.get_data()
+    return CachedResponse(
+        body=body,
+        mimetype=response.mimetype,
+        etag=hashlib.sha256(body).hexdigest()[:32],
+        headers=tuple(
+            (name, response.headers[name])
+            for name in CACHED_HEADERS
+            if name in response.headers
+        ),
+    )
+
+
+def mark_changed():
+    """
+    Drop cached responses once the current transaction commits, writers of books, users,
+    wishlists and rentals call it before commit.
+    """
+    db.session.info[SESSION_KEY] = True
+
+
+def _has_response_cache() -> bool:
+    return (
+        has_app_context()
+        and EXTENSION in current_app.extensions
+        and RESPONSES in current_app.extensions[EXTENSION].caches
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_changed_responses(session):
+    if session.info.pop(SESSION_KEY, None) and _has_response_cache():
+        repository = get_repository()
+        # shared with other workers by a transaction of its own, as Repository._invalidate does,
+        # so concurrent writes do not hold the lock of the generation row until they commit
+        if repository.sync_interval:
+            with session.get_bind().begin() as connection:
+                repository.record_invalidation(RESPONSES, connection)
+        repository.apply_invalidation(RESPONSES)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_responses(session):
+    session.info.pop(SESSION_KEY, None)
@@ -1,20 +1,32 @@
+import time
+
 import pandas as pd
 from app import db
 from app.db.models import User
+from app.db.repository import invalidate_users
+from app.utils.bulk_insert import bulk_insert, report_throughput
+from app.utils.response_cache import mark_changed
+
+USER_COLUMNS = {"User Name": "user_name", "User Type": "user_type"}
 
 
 def load_users(csv_path):
-    df = pd.read_csv(csv_path, header=0, skip_blank_lines=True)
+    started_at = time.perf_counter()
+    df = pd.read_csv(
+        csv_path,
+        header=0,
+        skip_blank_lines=True,
+        usecols=list(USER_COLUMNS),
+        dtype="object",
+    )
+    users = df.rename(columns=USER_COLUMNS)[list(USER_COLUMNS.values())]
+    users = users.drop_duplicates("user_name", keep="last")
 
     db.session.query(User).delete()
+    inserted = bulk_insert(User, users)
+    mark_changed()
     db.session.commit()
+    # every user is replaced, so ids of cached ones are stale
+    invalidate_users()
 
-    users = []
-    for _, row in df.iterrows():
-        print(f"Row {row=}")
-        user = User(user_name=row["User Name"], user_type=row["User Type"])
-        users.append(user)
-
-    db.session.add_all(users)
-    db.session.commit()
-    print(f"Inserted {len(df)} user into the database.")
+    report_throughput(inserted, "users", started_at)
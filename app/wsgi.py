@@ -0,0 +1,11 @@
+"""
+Production entry point served by gunicorn with settings of gunicorn.conf.py
+
+    gunicorn app.wsgi:app
+"""
+
+from app import create_app
+from app.notifications.dispatcher import start_notifications
+
+app = create_app()
+start_notifications(app)
@@ -0,0 +1,635 @@
+"""
+Load test endpoints over a synthetic library through the Flask test client, a threaded WSGI server,
+the production gunicorn server and the async serving mode of uvicorn. Latency percentiles, requests per second
+and peak RSS of every scenario are printed, saved as a JSON baseline and compared with a baseline of another commit.
+
+    python -m benchmarks.bench_endpoints --books 100000 --requests 500 --save baseline.json
+    python -m benchmarks.bench_endpoints --books 100000 --requests 500 --compare baseline.json
+    python -m benchmarks.bench_endpoints --drivers werkzeug gunicorn uvicorn --concurrency 16
+"""
+
+import argparse
+import functools
+import http.client
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.db.models import Book, Rentals, User, Wishlist
+from app.db.rental_history import ensure_rental_history
+from app.db.rental_stats import rebuild_rental_stats
+from app.notifications.dispatcher import get_dispatcher, start_notifications
+from app.utils.response_cache import RESPONSE_CACHE_DEFAULTS
+from app.utils.bulk_insert import bulk_insert
+
+CHUNK_SIZE = 100_000
+WORDS = (
+    "ancient atlas autumn bridge castle city dark dream empire forest garden glass "
+    "harbor hidden island journey king light lost memory midnight moon night ocean "
+    "orchard paper queen river road secret shadow silent silver song star stone "
+    "storm summer sun tale time tower valley voyage war water wind winter wolf world"
+).split()
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUNICORN_CONFIG = os.path.join(ROOT, "gunicorn.conf.py")
+# ranges of books reserved for write scenarios of every driver
+BLOCKS = ("rented", "wishlisted", "free")
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # path of the request number, numbers start at 0 within every scenario
+    path: Callable[[int], str]
+    statuses: tuple[int, ...] = (200,)
+
+
+@dataclass
+class Result:
+    requests: int
+    errors: int
+    seconds: float
+    requests_per_second: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+    # share of responses served from the response cache, see --response-cache
+    cache_hit_ratio: float
+
+
+class Library:
+    """
+    Synthetic catalogue of books and users. Every driver gets its own blocks of books
+    which are rented, wishlisted or free, so write scenarios of every driver succeed.
+    """
+
+    def __init__(self, books: int, users: int, requests: int, drivers: int, seed: int):
+        self.books = books
+        self.users = users
+        self.requests = requests
+        self.drivers = drivers
+        self.seed = seed
+        if books < len(BLOCKS) * drivers * requests:
+            raise SystemExit(
+                f"--books must be at least {len(BLOCKS) * drivers * requests} "
+                f"for {requests} requests of {drivers} drivers"
+            )
+
+    def block(self, kind: str, driver: int) -> int:
+        # first book id of the block
+        index = BLOCKS.index(kind) * self.drivers + driver
+        return index * self.requests + 1
+
+    def populate(self):
+        rng = np.random.default_rng(self.seed)
+        started_at = time.perf_counter()
+        for start in range(1, self.books + 1, CHUNK_SIZE):
+            ids = pd.RangeIndex(start, min(start + CHUNK_SIZE, self.books + 1))
+            words = rng.choice(WORDS, size=(len(ids), 3))
+            bulk_insert(
+                Book,
+                pd.DataFrame(
+                    {
+                        "id": ids,
+                        "book_id": ids,
+                        "isbn": ids,
+                        "authors": [f"Author {number % 1000}" for number in ids],
+                        "publication_year": rng.integers(1900, 2025, len(ids)),
+                        "title": [
+                            f"{first} {second} {third} {number}"
+                            for (first, second, third), number in zip(words, ids)
+                        ],
+                        "language": "en",
+                    }
+                ),
+            )
+            db.session.commit()
+
+        user_ids = pd.RangeIndex(1, self.users + 1)
+        bulk_insert(
+            User,
+            pd.DataFrame(
+                {
+                    "id": user_ids,
+                    "user_name": [f"user-{number}" for number in user_ids],
+                    "user_type": "user",
+                }
+            ),
+        )
+
+        now = datetime.now()
+        for driver in range(self.drivers):
+            rented = pd.RangeIndex(
+                self.block("rented", driver),
+                self.block("rented", driver) + self.requests,
+            )
+            bulk_insert(
+                Rentals,
+                pd.DataFrame(
+                    {
+                        "book_id": rented,
+                        "user_id": rented % self.users + 1,
+                        "created_at": [
+                            now - timedelta(days=int(days))
+                            for days in rng.integers(0, 60, len(rented))
+                        ],
+                    }
+                ),
+            )
+            wishlisted = pd.RangeIndex(
+                self.block("wishlisted", driver),
+                self.block("wishlisted", driver) + self.requests,
+            )
+            bulk_insert(
+                Wishlist,
+                pd.DataFrame(
+                    {"book_id": wishlisted, "user_id": wishlisted % self.users + 1}
+                ),
+            )
+        db.session.commit()
+        if db.engine.dialect.name == "postgresql":
+            # ids are given explicitly, so sequences of the tables have to follow them
+            for table in ("book", "user"):
+                db.session.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                        f'(SELECT max(id) FROM "{table}"))'
+                    )
+                )
+        ensure_rental_history()
+        rebuild_rental_stats()
+        db.session.commit()
+        print(
+            f"Populated {self.books} books and {self.users} users "
+            f"in {time.perf_counter() - started_at:.1f}s"
+        )
+
+    def scenarios(self, driver: int, driver_name: str) -> list[Scenario]:
+        words = np.random.default_rng(self.seed + driver).choice(WORDS, self.requests)
+        rented = self.block("rented", driver)
+        wishlisted = self.block("wishlisted", driver)
+        free = self.block("free", driver)
+        return [
+            Scenario(
+                "search",
+                "GET",
+                lambda number: f"/v1/books/search?title={words[number]}&limit=20",
+            ),
+            Scenario(
+                "amount report",
+                "GET",
+                lambda number: "/v1/reports/amount/borrowed?limit=100",
+            ),
+            Scenario(
+                "top rentals", "GET", lambda number: "/v1/reports/top_rentals?limit=10"
+            ),
+            Scenario(
+                "top rentals by username",
+                "GET",
+                lambda number: "/v1/reports/top_rentals_by_username?limit=10",
+            ),
+            Scenario(
+                "rental history",
+                "GET",
+                lambda number: "/v1/reports/rental_history?limit=100",
+            ),
+            # borrowed books are returned, wishlisted ones are lent
+            Scenario("return", "POST", lambda number: f"/v1/rentals/{rented + number}"),
+            Scenario(
+                "borrow", "POST", lambda number: f"/v1/rentals/{wishlisted + number}"
+            ),
+            Scenario(
+                "add to wishlist",
+                "POST",
+                lambda number: f"/v1/wishlists/user-{number % self.users + 1}/{free + number}",
+                statuses=(201,),
+            ),
+            Scenario(
+                "create user",
+                "POST",
+                lambda number: f"/v1/users/{driver_name}-{number}/user",
+                statuses=(201,),
+            ),
+        ]
+
+
+@contextmanager
+def test_client_driver(app, args):
+    client = app.test_client()
+
+    def send(scenario: Scenario, number: int) -> tuple[int, bool]:
+        response = client.open(scenario.path(number), method=scenario.method)
+        return response.status_code, response.headers.get("X-Cache") == "HIT"
+
+    yield send, 1, peak_rss_mb
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+@contextmanager
+def werkzeug_driver(app, args):
+    server = make_server(
+        "127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield http_sender(server.server_port), args.concurrency, peak_rss_mb
+    finally:
+        server.shutdown()
+
+
+@contextmanager
+def gunicorn_driver(app, args):
+    # the production server of gunicorn.conf.py serves the same database from its own processes
+    port = free_port()
+    with server_process(
+        ["gunicorn", "-c", GUNICORN_CONFIG, "app.wsgi:app"],
+        port,
+        {
+            **app_environment(app),
+            "GUNICORN_BIND": f"127.0.0.1:{port}",
+            "WEB_CONCURRENCY": str(args.workers),
+            "GUNICORN_THREADS": str(args.threads),
+            "GUNICORN_ACCESS_LOG": "",
+        },
+    ) as peak_rss:
+        yield http_sender(port), args.concurrency, peak_rss
+
+
+@contextmanager
+def uvicorn_driver(app, args):
+    # async serving mode of app.asgi with the same number of worker processes
+    port = free_port()
+    with server_process(
+        [
+            "uvicorn",
+            "app.asgi:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+            "--no-access-log",
+        ],
+        port,
+        app_environment(app),
+    ) as peak_rss:
+        yield http_sender(port), args.concurrency, peak_rss
+
+
+def app_environment(app) -> dict:
+    # settings of the measured application passed to server processes
+    return {
+        "DATABASE_URL": app.config["SQLALCHEMY_DATABASE_URI"],
+        "FLASK_RESPONSE_CACHE_MAX_SIZE": str(app.config["RESPONSE_CACHE_MAX_SIZE"]),
+    }
+
+
+@contextmanager
+def server_process(command: list[str], port: int, environment: dict):
+    process = subprocess.Popen(
+        [sys.executable, "-m", *command],
+        cwd=ROOT,
+        env={**os.environ, **environment},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port, process)
+        yield lambda: process_tree_rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+DRIVERS = {
+    "test-client": test_client_driver,
+    "werkzeug": werkzeug_driver,
+    "gunicorn": gunicorn_driver,
+    "uvicorn": uvicorn_driver,
+}
+
+
+def http_sender(port: int):
+    connections = threading.local()
+
+    def send(scenario: Scenario, number: int) -> tuple[int, bool]:
+        # every client thread keeps its connection alive while the server allows it
+        connection = getattr(connections, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            connections.connection = connection
+        connection.request(scenario.method, scenario.path(number))
+        response = connection.getresponse()
+        response.read()
+        if response.will_close:
+            connection.close()
+            connections.connection = None
+        return response.status, response.getheader("X-Cache") == "HIT"
+
+    return send
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not listen on port {port} in {timeout}s")
+
+
+def _run(
+    send, requests: int, concurrency: int
+) -> tuple[list[float], list[int], int, float]:
+    numbers = iter(range(requests))
+    lock = threading.Lock()
+    latencies: list[float] = []
+    statuses: list[int] = []
+    hits = 0
+
+    def worker():
+        nonlocal hits
+        while True:
+            with lock:
+                number = next(numbers, None)
+            if number is None:
+                return
+            started_at = time.perf_counter()
+            status, hit = send(number)
+            elapsed = time.perf_counter() - started_at
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+                hits += hit
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, hits, time.perf_counter() - started_at
+
+
+def summarize(
+    latencies: list[float],
+    statuses: list[int],
+    hits: int,
+    seconds: float,
+    scenario: Scenario,
+    peak_rss: float,
+) -> Result:
+    milliseconds = np.array(latencies) * 1000
+    return Result(
+        requests=len(latencies),
+        errors=sum(status not in scenario.statuses for status in statuses),
+        seconds=round(seconds, 3),
+        requests_per_second=round(len(latencies) / seconds, 1),
+        p50_ms=round(float(np.percentile(milliseconds, 50)), 3),
+        p99_ms=round(float(np.percentile(milliseconds, 99)), 3),
+        peak_rss_mb=round(peak_rss, 1),
+        cache_hit_ratio=round(hits / len(latencies), 3),
+    )
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def process_tree_rss_mb(pid: int) -> float:
+    # peak RSS of a server summed with its worker processes, read from /proc on Linux
+    pids = [pid]
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as file:
+                if int(file.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    pids.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    kilobytes = 0
+    for number in pids:
+        try:
+            with open(f"/proc/{number}/status", encoding="utf-8") as file:
+                for line in file:
+                    if line.startswith("VmHWM:"):
+                        kilobytes += int(line.split()[1])
+        except OSError:
+            continue
+    return kilobytes / 1024
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, results: dict[str, dict], tolerance: float) -> list[str]:
+    """
+    Print changes against the baseline, returns keys of scenarios slower by more than the tolerance.
+    """
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit')} of {baseline.get('created_at')}")
+    print(f"{'scenario':<40}{'p50':>10}{'p99':>10}{'req/s':>10}")
+    for key, result in results.items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        changes = {
+            name: (
+                (result[name] - previous[name]) / previous[name]
+                if previous[name]
+                else 0.0
+            )
+            for name in ("p50_ms", "p99_ms", "requests_per_second")
+        }
+        slower = (
+            changes["p50_ms"] > tolerance or changes["requests_per_second"] < -tolerance
+        )
+        if slower:
+            regressions.append(key)
+        print(
+            f"{key:<40}{changes['p50_ms']:>+10.1%}{changes['p99_ms']:>+10.1%}"
+            f"{changes['requests_per_second']:>+10.1%}" + ("  slower" if slower else "")
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument(
+        "--requests", type=int, default=500, help="requests of every scenario"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="client threads of a real server"
+    )
+    parser.add_argument(
+        "--drivers",
+        nargs="+",
+        choices=list(DRIVERS),
+        default=["test-client", "werkzeug"],
+        help="gunicorn driver needs `poetry install --extras server`, uvicorn one `--extras async`",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="worker processes of gunicorn and uvicorn",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=4, help="threads of a gunicorn worker"
+    )
+    parser.add_argument(
+        "--response-cache",
+        action="store_true",
+        help="serve repeated reads from the response cache instead of the database",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--database-url",
+        help="empty database to fill, a temporary SQLite database by default",
+    )
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="compare results with a JSON baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="relative change of p50 latency or req/s reported as a regression",
+    )
+    args = parser.parse_args()
+
+    library = Library(
+        args.books, args.users, args.requests, len(args.drivers), args.seed
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or (
+            f"sqlite:///{os.path.join(directory, 'library.db')}"
+        )
+        config = {
+            "SQLALCHEMY_DATABASE_URI": database_url,
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            "NOTIFICATION_SINK": "file:" + os.path.join(directory, "sent.jsonl"),
+            # contended SQLite writes would interleave slow query logs with results
+            "SLOW_QUERY_THRESHOLD": None,
+            # scenarios repeat their reads, cached ones would measure only the cache lookup
+            "RESPONSE_CACHE_MAX_SIZE": (
+                RESPONSE_CACHE_DEFAULTS["RESPONSE_CACHE_MAX_SIZE"]
+                if args.response_cache
+                else 0
+            ),
+        }
+        setup = create_app(test_config=config)
+        with setup.app_context():
+            db.create_all()
+            library.populate()
+            db.engine.dispose()
+        app = create_app(test_config=config)
+        # in-process drivers deliver notifications like a server worker
+        start_notifications(app)
+
+        results: dict[str, dict] = {}
+        print(
+            f"\n{'scenario':<40}{'requests':>9}{'errors':>7}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>8}{'hits':>6}"
+        )
+        for driver, name in enumerate(args.drivers):
+            with DRIVERS[name](app, args) as (send, concurrency, peak_rss):
+                for scenario in library.scenarios(driver, name):
+                    latencies, statuses, hits, seconds = _run(
+                        functools.partial(send, scenario), args.requests, concurrency
+                    )
+                    result = summarize(
+                        latencies, statuses, hits, seconds, scenario, peak_rss()
+                    )
+                    key = f"{name} {scenario.name}"
+                    results[key] = asdict(result)
+                    print(
+                        f"{key:<40}{result.requests:>9}{result.errors:>7}"
+                        f"{result.requests_per_second:>9.0f}{result.p50_ms:>9.2f}"
+                        f"{result.p99_ms:>9.2f}{result.peak_rss_mb:>8.0f}"
+                        f"{result.cache_hit_ratio:>6.0%}"
+                    )
+
+        with app.app_context():
+            get_dispatcher().stop()
+            db.engine.dispose()
+
+    baseline = {
+        "commit": current_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            name: getattr(args, name)
+            for name in (
+                "books",
+                "users",
+                "requests",
+                "concurrency",
+                "workers",
+                "threads",
+                "seed",
+                "response_cache",
+            )
+        },
+        "database": (
+            "sqlite" if args.database_url is None else args.database_url.split(":")[0]
+        ),
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2)
+        print(f"\nBaseline saved into {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+        if previous.get("config") != baseline["config"]:
+            print("Baseline was measured with a different configuration")
+        if compare(previous, results, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
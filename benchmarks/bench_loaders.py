@@ -0,0 +1,104 @@
+"""
+Compare CSV loaders against the row by row loader they replaced.
+
+    python -m benchmarks.bench_loaders --rows 200000
+"""
+
+import argparse
+import contextlib
+import csv
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from app import create_app, db
+from app.db.models import Book
+from app.utils.inventory_loader import load_inventory
+
+
+def legacy_load_inventory(csv_path):
+    df = pd.read_csv(csv_path, header=0, skip_blank_lines=True)
+
+    db.session.query(Book).delete()
+    db.session.commit()
+
+    books = []
+    for _, row in df.iterrows():
+        print(f"Row {row=}")
+        book = Book(
+            book_id=row["Id"],
+            isbn=row["ISBN"],
+            authors=row["Authors"],
+            publication_year=int(row["Publication Year"]),
+            title=row["Title"],
+            language=row["Language"],
+        )
+        books.append(book)
+
+    db.session.add_all(books)
+    db.session.commit()
+    print(f"Inserted {len(df)} book into the database.")
+
+
+def write_inventory(csv_path, rows):
+    with open(csv_path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(
+            ["Id", "ISBN", "Authors", "Publication Year", "Title", "Language"]
+        )
+        for number in range(rows):
+            writer.writerow(
+                [
+                    number + 1,
+                    9780000000000 + number,
+                    f"Author {number % 5000}",
+                    1900 + number % 120,
+                    f"Title {number}",
+                    "eng",
+                ]
+            )
+
+
+def measure(loader, csv_path, database_path):
+    app = create_app(
+        test_config={
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_path}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            started_at = time.perf_counter()
+            loader(csv_path)
+            elapsed = time.perf_counter() - started_at
+        db.session.remove()
+        db.engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "inventory.csv")
+        write_inventory(csv_path, args.rows)
+
+        for name, loader in (
+            ("legacy", legacy_load_inventory),
+            ("bulk", load_inventory),
+        ):
+            elapsed = measure(loader, csv_path, os.path.join(directory, f"{name}.db"))
+            print(
+                f"{name:>8}: {args.rows} rows in {elapsed:.2f}s "
+                f"({args.rows / elapsed:.0f} rows/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
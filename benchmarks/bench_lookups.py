@@ -0,0 +1,111 @@
+"""
+Measure latency of hot path lookups against table size with and without secondary indexes.
+
+    python -m benchmarks.bench_lookups --sizes 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from app import create_app, db
+from app.db.models import Book, Rentals, User, Wishlist
+from app.utils.bulk_insert import bulk_insert
+
+LOOKUPS = {
+    "book by book_id": lambda size: Book.query.filter_by(book_id=size // 2).first(),
+    "user by user_name": lambda size: User.query.filter_by(
+        user_name=f"user-{size // 2}"
+    ).first(),
+    "wishlists by book": lambda size: Wishlist.query.filter_by(book_id=size // 2).all(),
+    "wishlist by user and book": lambda size: Wishlist.query.filter_by(
+        user_id=size // 2, book_id=size // 2
+    ).first(),
+    "rental by book": lambda size: Rentals.query.filter_by(book_id=size // 2).first(),
+}
+
+
+def populate(size):
+    ids = pd.RangeIndex(1, size + 1)
+    bulk_insert(
+        Book,
+        pd.DataFrame(
+            {
+                "id": ids,
+                "book_id": ids * 7,
+                "isbn": ids,
+                "authors": "Author",
+                "publication_year": 2000,
+                "title": [f"Title {number}" for number in ids],
+                "language": "en",
+            }
+        ),
+    )
+    bulk_insert(
+        User,
+        pd.DataFrame(
+            {
+                "id": ids,
+                "user_name": [f"user-{number}" for number in ids],
+                "user_type": "user",
+            }
+        ),
+    )
+    links = pd.DataFrame({"user_id": ids, "book_id": ids[::-1]})
+    bulk_insert(Wishlist, links)
+    bulk_insert(Rentals, links.assign(created_at=pd.Timestamp.now().to_pydatetime()))
+    db.session.commit()
+
+
+def drop_secondary_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            db.session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    db.session.commit()
+
+
+def measure(size, indexed, repeat):
+    app = create_app(
+        test_config={
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    results = {}
+    with app.app_context():
+        db.create_all()
+        populate(size)
+        if not indexed:
+            drop_secondary_indexes()
+
+        for name, lookup in LOOKUPS.items():
+            started_at = time.perf_counter()
+            for _ in range(repeat):
+                lookup(size)
+                db.session.expunge_all()
+            results[name] = (time.perf_counter() - started_at) / repeat * 1000
+        db.session.remove()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'lookup':<28}{'rows':>10}{'no index ms':>14}{'indexed ms':>14}")
+    for size in args.sizes:
+        before = measure(size, indexed=False, repeat=args.repeat)
+        after = measure(size, indexed=True, repeat=args.repeat)
+        for name in LOOKUPS:
+            print(f"{name:<28}{size:>10}{before[name]:>14.3f}{after[name]:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
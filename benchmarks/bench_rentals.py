@@ -0,0 +1,110 @@
+"""
+Compare returning books one request at a time with a single bulk request.
+
+    python -m benchmarks.bench_rentals --books 1000 --waiting 3
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from app import create_app, db
+from app.db.models import Book, Rentals, User, Wishlist
+from app.utils.bulk_insert import bulk_insert
+
+
+def populate(books, waiting):
+    ids = pd.RangeIndex(1, books + 1)
+    bulk_insert(
+        Book,
+        pd.DataFrame(
+            {
+                "id": ids,
+                "book_id": ids,
+                "isbn": ids,
+                "authors": "Author",
+                "publication_year": 2000,
+                "title": [f"Title {number}" for number in ids],
+                "language": "en",
+            }
+        ),
+    )
+    user_ids = pd.RangeIndex(1, waiting + 2)
+    bulk_insert(
+        User,
+        pd.DataFrame(
+            {
+                "id": user_ids,
+                "user_name": [f"user-{number}" for number in user_ids],
+                "user_type": "user",
+            }
+        ),
+    )
+    # every book is borrowed by the first user and wishlisted by the others
+    bulk_insert(
+        Rentals,
+        pd.DataFrame({"user_id": 1, "book_id": ids}).assign(
+            created_at=pd.Timestamp.now().to_pydatetime()
+        ),
+    )
+    bulk_insert(
+        Wishlist,
+        pd.DataFrame(
+            [
+                {"user_id": user_id, "book_id": book_id}
+                for book_id in ids
+                for user_id in user_ids[1:]
+            ]
+        ),
+    )
+    db.session.commit()
+
+
+def measure(mode, books, waiting):
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(
+            test_config={
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(directory, 'library.db')}",
+                "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            }
+        )
+        with app.app_context():
+            db.create_all()
+            populate(books, waiting)
+        client = app.test_client()
+
+        started_at = time.perf_counter()
+        if mode == "per book":
+            for book_id in range(1, books + 1):
+                assert client.post(f"/v1/rentals/{book_id}").status_code == 200
+        else:
+            response = client.post(
+                "/v1/rentals/bulk", json={"book_ids": list(range(1, books + 1))}
+            )
+            assert response.status_code == 200
+        elapsed = time.perf_counter() - started_at
+
+        with app.app_context():
+            assert db.session.query(Rentals).count() == 0
+            db.engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000)
+    parser.add_argument("--waiting", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'books':>8}{'seconds':>10}{'books/s':>10}")
+    for mode in ("per book", "bulk"):
+        elapsed = measure(mode, args.books, args.waiting)
+        print(f"{mode:<12}{args.books:>8}{elapsed:>10.3f}{args.books / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
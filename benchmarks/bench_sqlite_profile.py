@@ -0,0 +1,120 @@
+"""
+Concurrent read/write load against a file database with each SQLite profile.
+
+    python -m benchmarks.bench_sqlite_profile --threads 8 --seconds 5
+"""
+
+import argparse
+import contextlib
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.db.engine import SQLITE_PROFILES
+from app.db.models import Book, User
+from app.utils.bulk_insert import bulk_insert
+
+
+def populate(books, users):
+    ids = pd.RangeIndex(1, books + 1)
+    bulk_insert(
+        Book,
+        pd.DataFrame(
+            {
+                "book_id": ids,
+                "isbn": ids,
+                "authors": [f"Author {number % 100}" for number in ids],
+                "publication_year": 2000,
+                "title": [f"Title {number}" for number in ids],
+                "language": "en",
+            }
+        ),
+    )
+    bulk_insert(
+        User,
+        pd.DataFrame(
+            {"user_name": [f"user-{number}" for number in range(users)]}
+        ).assign(user_type="user"),
+    )
+    db.session.commit()
+
+
+def run(profile, threads, seconds, books):
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(
+            test_config={
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(directory, 'library.db')}",
+                "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+                "SQLITE_PROFILE": profile,
+                "NOTIFICATION_WORKERS": 0,
+            }
+        )
+        with app.app_context():
+            db.create_all()
+            populate(books, threads)
+
+        counters = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker(number):
+            client = app.test_client()
+            user_name = f"user-{number}"
+            iteration = 0
+            while time.perf_counter() < deadline:
+                iteration += 1
+                book_id = (number * 7919 + iteration) % books + 1
+                try:
+                    if number % 2:
+                        response = client.post(f"/v1/wishlists/{user_name}/{book_id}")
+                        client.delete(f"/v1/wishlists/{user_name}/{book_id}")
+                        kind = "writes"
+                    else:
+                        response = client.get(
+                            f"/v1/books/search?author=author%20{iteration % 100}&limit=10"
+                        )
+                        kind = "reads"
+                    kind = kind if response.status_code < 500 else "errors"
+                except OperationalError:
+                    kind = "errors"
+                with lock:
+                    counters[kind] += 1
+
+        workers = [
+            threading.Thread(target=worker, args=(number,)) for number in range(threads)
+        ]
+        # notifications are printed, keep them out of the results
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+
+        with app.app_context():
+            db.engine.dispose()
+    return {name: value / seconds for name, value in counters.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--books", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'reads/s':>10}{'writes/s':>10}{'errors/s':>10}")
+    for profile in SQLITE_PROFILES:
+        result = run(profile, args.threads, args.seconds, args.books)
+        print(
+            f"{profile:<10}{result['reads']:>10.1f}{result['writes']:>10.1f}"
+            f"{result['errors']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Measure cold start of the production application in fresh interpreters: importing app.wsgi, which creates
+the application over an existing database, the first request and the first hit of the Swagger spec.
+Medians of every phase and modules loaded at startup are printed, saved as a JSON baseline and compared
+with a baseline of another commit.
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --runs 10 --save startup.json
+    python -m benchmarks.bench_startup --runs 10 --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from app import create_app, db
+from app.db.models import Book
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# modules the application should not import before they are needed
+LAZY_MODULES = ("pandas", "flasgger")
+PHASES = ("interpreter_ms", "create_app_ms", "first_request_ms", "apidocs_ms")
+
+# run by a fresh interpreter, prints timings of its phases as the last line
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app.wsgi import app
+created = time.perf_counter()
+loaded = len(sys.modules)
+lazy = [name for name in LAZY_MODULES if name in sys.modules]
+client = app.test_client()
+assert client.get("/v1/books/search?title=title").status_code == 200
+first_request = time.perf_counter()
+assert client.get("/apispec_1.json").status_code == 200
+apidocs = time.perf_counter()
+print(json.dumps({
+    "create_app_ms": (created - started) * 1000,
+    "first_request_ms": (first_request - created) * 1000,
+    "apidocs_ms": (apidocs - first_request) * 1000,
+    "modules": loaded,
+    "lazy_modules_loaded": lazy,
+}))
+"""
+
+
+def populate(database_url: str, books: int):
+    app = create_app(
+        test_config={
+            "SQLALCHEMY_DATABASE_URI": database_url,
+            "NOTIFICATION_WORKERS": 0,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(
+            Book(
+                book_id=number,
+                isbn=number,
+                authors="Author",
+                publication_year=2000,
+                title=f"Title {number}",
+                language="en",
+            )
+            for number in range(books)
+        )
+        db.session.commit()
+        db.engine.dispose()
+
+
+def probe(database_url: str) -> dict:
+    environment = {**os.environ, "DATABASE_URL": database_url}
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"LAZY_MODULES = {LAZY_MODULES!r}\n{PROBE}",
+        ],
+        cwd=ROOT,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["interpreter_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def summarize(runs: list[dict]) -> dict:
+    summary = {
+        phase: round(statistics.median(run[phase] for run in runs), 1)
+        for phase in PHASES
+    }
+    summary["modules"] = runs[-1]["modules"]
+    summary["lazy_modules_loaded"] = runs[-1]["lazy_modules_loaded"]
+    return summary
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, summary: dict, tolerance: float) -> list[str]:
+    """
+    Print changes against the baseline, returns phases slower by more than the tolerance.
+    """
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit')} of {baseline.get('created_at')}")
+    for phase in PHASES:
+        previous = baseline["summary"].get(phase)
+        if not previous:
+            continue
+        change = (summary[phase] - previous) / previous
+        slower = change > tolerance
+        if slower:
+            regressions.append(phase)
+        print(f"{phase:<20}{change:>+10.1%}" + ("  slower" if slower else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="compare results with a JSON baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="relative change of a phase reported as a regression",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'library.db')}"
+        populate(database_url, args.books)
+        # the first run warms the page cache of the interpreter and the database
+        probe(database_url)
+        runs = [probe(database_url) for _ in range(args.runs)]
+
+    summary = summarize(runs)
+    print(f"\n{'phase':<20}{'median ms':>10}{'min ms':>10}{'max ms':>10}")
+    for phase in PHASES:
+        values = [run[phase] for run in runs]
+        print(
+            f"{phase:<20}{summary[phase]:>10.1f}{min(values):>10.1f}{max(values):>10.1f}"
+        )
+    print(f"\nModules loaded by app.wsgi: {summary['modules']}")
+    print(
+        "Lazily loaded modules imported at startup: "
+        + (", ".join(summary["lazy_modules_loaded"]) or "none")
+    )
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "commit": current_commit(),
+                    "created_at": datetime.now().isoformat(timespec="seconds"),
+                    "config": {"runs": args.runs, "books": args.books},
+                    "summary": summary,
+                },
+                file,
+                indent=2,
+            )
+        print(f"\nSaved baseline into {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, summary, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} phases slower than the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
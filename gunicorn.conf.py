@@ -0,0 +1,53 @@
+"""
+Settings of the production server, read by `gunicorn app.wsgi:app` from the working directory.
+Every setting can be changed by an environment variable without rebuilding the image.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+# every worker is a process with its own pool of database connections and its own caches
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8))
+)
+# requests mostly wait for the database, so threads of a worker serve requests concurrently
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# the application is created once by the master and forked into workers,
+# startup work such as database upgrades runs only once and memory is shared copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+# seconds an idle keep-alive connection is held open, longer than the idle timeout of a proxy in front
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+# workers silent for longer are killed and replaced
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# in-flight requests are finished within this many seconds on reload or shutdown
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# workers are replaced after serving this many requests, 0 disables it
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def when_ready(server):
+    # connections and notification threads of the preloaded application must not be shared by forked workers
+    if not server.cfg.preload_app:
+        return
+    from app import db
+    from app.notifications.dispatcher import get_dispatcher
+    from app.wsgi import app
+
+    with app.app_context():
+        get_dispatcher().stop()
+        db.engine.dispose()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from app.notifications.dispatcher import get_dispatcher
+    from app.wsgi import app
+
+    with app.app_context():
+        get_dispatcher().start()
@@ -0,0 +1,35 @@
+import pytest
+
+from app import create_app, db
+from tests.database import DATABASE_URI
+
+
+def create_test_app(database_uri=DATABASE_URI, **config):
+    return create_app(
+        test_config={
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": database_uri,
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            **config,
+        }
+    )
+
+
+@pytest.fixture
+def app():
+    app = create_test_app()
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def init_database(app):
+    db.create_all()
+    yield db
+    db.session.remove()
+    db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
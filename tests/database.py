@@ -0,0 +1,10 @@
+import os
+
+import pytest
+
+# run the suite against PostgreSQL with e.g. TEST_DATABASE_URL=postgresql://postgres@localhost/libraryapp
+DATABASE_URI = os.environ.get("TEST_DATABASE_URL", "sqlite:///:memory:")
+
+requires_sqlite = pytest.mark.skipif(
+    not DATABASE_URI.startswith("sqlite"), reason="SQLite specific behaviour"
+)
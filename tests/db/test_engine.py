@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app import db
+from tests.conftest import create_test_app
+
+
+def pragma(name):
+    return db.session.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_tuned_profile_is_applied_to_file_database(tmp_path):
+    app = create_test_app(f"sqlite:///{tmp_path / 'library.db'}")
+    with app.app_context():
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1
+        assert pragma("busy_timeout") == 5000
+        assert pragma("cache_size") == -64000
+        assert isinstance(db.engine.pool, QueuePool)
+        assert db.engine.pool.size() == 10
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_default_profile_keeps_sqlite_defaults(tmp_path):
+    app = create_test_app(
+        f"sqlite:///{tmp_path / 'library.db'}", SQLITE_PROFILE="default"
+    )
+    with app.app_context():
+        assert pragma("journal_mode") == "delete"
+        assert pragma("synchronous") == 2
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_pragmas_and_engine_options_can_be_overridden(tmp_path):
+    app = create_test_app(
+        f"sqlite:///{tmp_path / 'library.db'}",
+        SQLITE_PRAGMAS={"busy_timeout": 100},
+        SQLALCHEMY_ENGINE_OPTIONS={"pool_size": 2},
+    )
+    with app.app_context():
+        assert pragma("journal_mode") == "wal"
+        assert pragma("busy_timeout") == 100
+        assert db.engine.pool.size() == 2
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_memory_database_keeps_static_pool():
+    app = create_test_app("sqlite:///:memory:")
+    with app.app_context():
+        assert isinstance(db.engine.pool, StaticPool)
+        assert pragma("busy_timeout") == 5000
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        create_test_app("sqlite:///:memory:", SQLITE_PROFILE="fastest")
@@ -0,0 +1,119 @@
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+from sqlalchemy import inspect
+
+from app import create_app, db
+from app.db.migrations import upgrade_database
+from app.db.models import Book, BookRentalStats, Rentals, User, Wishlist
+from tests.conftest import create_test_app
+
+DATABASE = Path(__file__).parents[2] / "app" / "db" / "data" / "database.db"
+
+LEGACY_SCHEMA = """
+CREATE TABLE book (
+    id INTEGER NOT NULL, book_id INTEGER NOT NULL, isbn INTEGER NOT NULL,
+    authors VARCHAR NOT NULL, publication_year INTEGER NOT NULL,
+    title VARCHAR, language VARCHAR, PRIMARY KEY (id)
+);
+CREATE TABLE user (
+    id INTEGER NOT NULL, user_name VARCHAR NOT NULL, user_type VARCHAR NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE wishlist (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, book_id INTEGER NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE rentals (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, book_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, PRIMARY KEY (id)
+);
+INSERT INTO book VALUES (1, 10, 1, 'Author', 2000, 'Title', 'en');
+INSERT INTO book VALUES (2, 10, 1, 'Author', 2000, 'Title', 'en');
+INSERT INTO book VALUES (3, 11, 2, 'Author', 2001, 'Other', 'en');
+INSERT INTO user VALUES (1, 'John', 'user');
+INSERT INTO user VALUES (2, 'John', 'user');
+INSERT INTO wishlist VALUES (1, 1, 1);
+INSERT INTO wishlist VALUES (2, 2, 2);
+INSERT INTO wishlist VALUES (3, 1, 3);
+INSERT INTO rentals (id, user_id, book_id) VALUES (1, 2, 2);
+INSERT INTO rentals (id, user_id, book_id) VALUES (2, 1, 1);
+CREATE INDEX ix_rentals_book_id ON rentals (book_id);
+"""
+
+
+def index_names(table):
+    return {index["name"] for index in inspect(db.engine).get_indexes(table)}
+
+
+def test_upgrade_database_merges_duplicates_and_creates_indexes(tmp_path):
+    database_path = tmp_path / "legacy.db"
+    with sqlite3.connect(database_path) as connection:
+        connection.executescript(LEGACY_SCHEMA)
+
+    app = create_test_app(f"sqlite:///{database_path}")
+    with app.app_context():
+        upgrade_database()
+
+        assert index_names("book") == {"ix_book_book_id"}
+        assert index_names("user") == {"ix_user_user_name"}
+        assert index_names("wishlist") == {
+            "ix_wishlist_book_id",
+            "ix_wishlist_user_id_book_id",
+        }
+        assert index_names("rentals") == {"uq_rentals_book_id", "ix_rentals_user_id"}
+
+        assert [book.id for book in Book.query.order_by(Book.id)] == [1, 3]
+        assert [user.id for user in User.query.all()] == [1]
+        assert sorted(
+            (wishlist.user_id, wishlist.book_id) for wishlist in Wishlist.query.all()
+        ) == [(1, 1), (1, 3)]
+        rental = Rentals.query.one()
+        assert (rental.user_id, rental.book_id) == (1, 1)
+        assert [
+            (stats.book_id, stats.rental_count) for stats in BookRentalStats.query.all()
+        ] == [(1, 1)]
+
+        assert (
+            len(app.test_client().get("/v1/books/search?title=title").get_json()) == 1
+        )
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_upgrade_database_is_idempotent_for_bundled_database(tmp_path):
+    database_path = tmp_path / "database.db"
+    shutil.copy(DATABASE, database_path)
+
+    app = create_test_app(f"sqlite:///{database_path}")
+    with app.app_context():
+        upgrade_database()
+        upgrade_database()
+
+        assert "ix_book_book_id" in index_names("book")
+        assert Book.query.count() == 99
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_upgrade_database_creates_schema_of_empty_database(tmp_path):
+    app = create_test_app(f"sqlite:///{tmp_path / 'empty.db'}")
+    with app.app_context():
+        upgrade_database()
+
+        assert set(db.metadata.tables) <= set(inspect(db.engine).get_table_names())
+        assert "ix_book_book_id" in index_names("book")
+        db.engine.dispose()
+
+
+def test_application_serves_requests_over_empty_database(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'empty.db'}")
+    app = create_app()
+
+    response = app.test_client().get("/v1/books/search?title=title")
+
+    assert response.status_code == 200
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,137 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import db
+from app.db.models import Book, RentalDailyStats, RentalEvent, Rentals, User, Wishlist
+from app.db.rental_history import (
+    CHECKOUT,
+    RETURN,
+    compact_rental_events,
+    ensure_rental_history,
+    record_events,
+    rental_history_query,
+)
+from app.db.rental_stats import rebuild_rental_stats
+
+TODAY = date(2024, 6, 30)
+
+
+@pytest.fixture
+def init_database(init_database):
+    db.session.add_all(
+        [
+            User(id=1, user_name="Anna", user_type="user"),
+            User(id=2, user_name="Bob", user_type="user"),
+        ]
+        + [
+            Book(
+                id=number,
+                book_id=number,
+                isbn=number,
+                authors="Author",
+                publication_year=2000,
+                title=f"Title {number}",
+                language="en",
+            )
+            for number in (1, 2)
+        ]
+    )
+    db.session.commit()
+    return init_database
+
+
+def at(days_ago, hour=12):
+    return datetime.combine(TODAY - timedelta(days=days_ago), datetime.min.time()) + (
+        timedelta(hours=hour)
+    )
+
+
+def history(start, end):
+    return {
+        row.book_id: (row.checkouts, row.returns)
+        for row in db.session.execute(rental_history_query(start, end))
+    }
+
+
+def test_rental_transitions_are_logged(init_database, app):
+    db.session.add(Wishlist(user_id=1, book_id=1))
+    db.session.commit()
+    client = app.test_client()
+
+    client.post("/v1/rentals/1")
+    client.post("/v1/rentals/1")
+
+    events = RentalEvent.query.order_by(RentalEvent.id).all()
+    assert [(event.event_type, event.book_id, event.user_id) for event in events] == [
+        (CHECKOUT, 1, 1),
+        (RETURN, 1, 1),
+    ]
+
+
+def test_compaction_keeps_history(init_database):
+    record_events(CHECKOUT, [(1, 1), (2, 1)], at(200, hour=9))
+    record_events(RETURN, [(1, 1)], at(200, hour=18))
+    record_events(CHECKOUT, [(1, 2)], at(120))
+    record_events(CHECKOUT, [(1, 1)], at(10))
+    db.session.commit()
+    before = history(TODAY - timedelta(days=365), TODAY)
+
+    compacted = compact_rental_events(retention_days=90, today=TODAY)
+    db.session.commit()
+
+    assert compacted == 4
+    assert RentalEvent.query.count() == 1
+    assert {
+        (row.day, row.book_id, row.user_id, row.checkouts, row.returns)
+        for row in RentalDailyStats.query.all()
+    } == {
+        (TODAY - timedelta(days=200), 1, 1, 1, 1),
+        (TODAY - timedelta(days=200), 2, 1, 1, 0),
+        (TODAY - timedelta(days=120), 1, 2, 1, 0),
+    }
+    assert (
+        history(TODAY - timedelta(days=365), TODAY)
+        == before
+        == {
+            1: (3, 1),
+            2: (1, 0),
+        }
+    )
+    # ranges are split on days of both compacted and raw events
+    assert history(TODAY - timedelta(days=200), TODAY - timedelta(days=200)) == {
+        1: (1, 1),
+        2: (1, 0),
+    }
+    assert history(TODAY - timedelta(days=119), TODAY) == {1: (1, 0)}
+
+
+def test_compaction_adds_to_existing_days(init_database):
+    record_events(CHECKOUT, [(1, 1)], at(200, hour=9))
+    db.session.commit()
+    compact_rental_events(retention_days=90, today=TODAY)
+    record_events(CHECKOUT, [(1, 1)], at(200, hour=10))
+    compact_rental_events(retention_days=90, today=TODAY)
+    db.session.commit()
+
+    assert RentalDailyStats.query.one().checkouts == 2
+
+
+def test_rental_stats_are_rebuilt_from_history(init_database):
+    record_events(CHECKOUT, [(1, 1), (1, 2)], at(200))
+    record_events(CHECKOUT, [(1, 1)], at(10))
+    # history outlives removed books
+    record_events(CHECKOUT, [(7, 1)], at(10))
+    compact_rental_events(retention_days=90, today=TODAY)
+
+    assert rebuild_rental_stats() == (1, 2)
+
+
+def test_history_starts_with_current_rentals(init_database):
+    db.session.add(Rentals(user_id=2, book_id=2, created_at=at(3)))
+    db.session.commit()
+
+    assert ensure_rental_history()
+    assert not ensure_rental_history()
+    event = RentalEvent.query.one()
+    assert (event.event_type, event.book_id, event.user_id) == (CHECKOUT, 2, 2)
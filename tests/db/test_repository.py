@@ -0,0 +1,135 @@
+import textwrap
+import time
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.db.models import Book, User
+from app.db.repository import LookupCache, Repository, get_repository
+from app.utils.users_loader import load_users
+
+
+@pytest.fixture
+def init_database(init_database):
+    db.session.add_all(
+        [
+            User(user_name="Anna", user_type="user"),
+            Book(
+                book_id=10,
+                isbn=1,
+                authors="Author",
+                publication_year=2000,
+                title="Title",
+                language="en",
+            ),
+        ]
+    )
+    db.session.commit()
+    return init_database
+
+
+def test_lookups_are_read_through(init_database):
+    repository = get_repository()
+
+    first = repository.get_book(10)
+    second = repository.get_book(10)
+
+    assert first is second
+    assert first.title == "Title"
+    assert repository.get_book(11) is None
+    assert repository.metrics()["books"]["hits"] == 1
+    assert repository.metrics()["books"]["misses"] == 2
+
+
+def test_cached_lookups_do_not_query(init_database):
+    repository = get_repository()
+    repository.get_user("Anna")
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        assert repository.get_user("Anna").user_type == "user"
+        assert repository.get_users(["Anna"])["Anna"].user_name == "Anna"
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+    assert statements == []
+
+
+def test_cache_evicts_least_recently_used_and_expired():
+    cache = LookupCache(max_size=2, ttl=0.05)
+    for key in "abc":
+        cache.put(key, key.upper(), cache.generation)
+
+    assert cache.get("a") is None
+    assert cache.get("c") == "C"
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_value_read_before_invalidation_is_not_cached():
+    cache = LookupCache(max_size=2, ttl=60)
+    generation = cache.generation
+    cache.invalidate(["a"])
+
+    cache.put("a", "stale", generation)
+
+    assert cache.get("a") is None
+
+
+def test_created_user_is_found(client, init_database):
+    repository = get_repository()
+    assert repository.get_user("Bob") is None
+
+    client.post("/v1/users/Bob/user")
+
+    assert repository.get_user("Bob").user_type == "user"
+    assert client.post("/v1/users/Bob/user").status_code == 409
+
+
+def test_load_users_invalidates_users(tmp_path, init_database):
+    repository = get_repository()
+    anna = repository.get_user("Anna")
+    users = tmp_path / "users.csv"
+    users.write_text(
+        textwrap.dedent(
+            """\
+            User Name,User Type
+            Anna,Staff
+            """
+        )
+    )
+
+    load_users(str(users))
+
+    assert repository.get_user("Anna").user_type == "Staff"
+    assert anna.user_type == "user"
+
+
+def test_invalidation_is_shared_by_workers(app, init_database):
+    app.config["CACHE_SYNC_INTERVAL"] = 0.01
+    worker = Repository(app)
+    other_worker = Repository(app)
+    assert worker.get_book(10).title == "Title"
+
+    Book.query.filter_by(book_id=10).update({"title": "New title"})
+    db.session.commit()
+    other_worker.invalidate_books([10])
+
+    time.sleep(0.02)
+    assert worker.get_book(10).title == "New title"
+    assert worker.metrics()["books"]["generation"] == 1
+
+
+def test_cache_metrics_endpoint(client, init_database):
+    client.post("/v1/wishlists/Anna/10")
+
+    response = client.get("/v1/cache")
+
+    assert response.get_json()["users"]["misses"] == 1
+    assert response.get_json()["books"]["size"] == 1
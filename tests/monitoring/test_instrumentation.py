@@ -0,0 +1,123 @@
+import pstats
+
+import pytest
+
+from app import db
+from app.db.models import Book
+from app.monitoring.instrumentation import PROFILE_FILE_HEADER, get_monitoring
+from app.monitoring.metrics import Histogram, Metric
+from tests.conftest import create_test_app
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {"PROFILE_DIRECTORY": str(tmp_path)}
+
+
+@pytest.fixture
+def app(config):
+    app = create_test_app(**config)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def init_database(init_database):
+    db.session.add(
+        Book(
+            book_id=10,
+            isbn=1,
+            authors="Author",
+            publication_year=2000,
+            title="Title",
+            language="en",
+        )
+    )
+    db.session.commit()
+    return init_database
+
+
+def test_requests_and_statements_are_measured(client, init_database):
+    response = client.get("/v1/books/search?title=title")
+
+    monitoring = get_monitoring()
+    assert monitoring.requests.value("books.search_books", "GET", "200") == 1
+    assert monitoring.latency.count("books.search_books", "GET") == 1
+    assert monitoring.statements.value("books.search_books") >= 1
+    assert "db;dur=" in response.headers["Server-Timing"]
+
+
+def test_metrics_endpoint(client, init_database):
+    client.get("/v1/books/search?title=title")
+    client.get("/v1/books/search?title=title")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    lines = response.get_data(as_text=True).splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert (
+        'http_request_duration_seconds_count{endpoint="books.search_books",method="GET"} 2'
+        in lines
+    )
+    assert (
+        'http_requests_total{endpoint="books.search_books",method="GET",status="200"} 2'
+        in lines
+    )
+    assert 'cache_hits_total{cache="responses"} 1' in lines
+
+
+def test_slow_queries_are_logged(app, client, init_database, capsys):
+    get_monitoring().slow_query_threshold = 0
+
+    client.get("/v1/books/search?title=title")
+
+    output = capsys.readouterr().out
+    assert "Slow query of books.search_books took" in output
+    assert get_monitoring().slow_statements.value("books.search_books") >= 1
+
+
+def test_profiling_is_opt_in(client, init_database, tmp_path):
+    response = client.get("/v1/books/search?title=title", headers={"X-Profile": "1"})
+
+    assert PROFILE_FILE_HEADER not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profiled_request(config, tmp_path):
+    app = create_test_app(**config, PROFILING_ENABLED=True)
+    with app.app_context():
+        db.create_all()
+        try:
+            response = app.test_client().get(
+                "/v1/books/search?title=title", headers={"X-Profile": "1"}
+            )
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+    profile = tmp_path / response.headers[PROFILE_FILE_HEADER]
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency", "Latency", ("endpoint",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, "search")
+
+    assert histogram.render()[2:] == [
+        'latency_bucket{endpoint="search",le="0.1"} 2',
+        'latency_bucket{endpoint="search",le="1.0"} 3',
+        'latency_bucket{endpoint="search",le="+Inf"} 4',
+        'latency_sum{endpoint="search"} 2.65',
+        'latency_count{endpoint="search"} 4',
+    ]
+
+
+def test_metric_without_samples_cannot_be_created():
+    class IncompleteMetric(Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError):
+        IncompleteMetric("incomplete", "Incomplete")
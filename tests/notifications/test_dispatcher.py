@@ -0,0 +1,249 @@
+import json
+import time
+
+import pytest
+
+from app import db
+from app.db.models import NotificationOutbox
+from app.notifications import notifications
+from app.notifications.dispatcher import get_dispatcher, start_notifications
+from app.notifications.notifications import FAILED, PENDING
+from app.notifications.sinks import FileSink, Sink
+from tests.conftest import create_test_app
+from tests.database import DATABASE_URI
+
+
+class FailingSink(Sink):
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, notifications):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("sink is down")
+        self.sent.extend(notifications)
+
+
+@pytest.fixture
+def sink_path(tmp_path):
+    return tmp_path / "notifications.jsonl"
+
+
+@pytest.fixture
+def app(sink_path):
+    app = create_test_app(NOTIFICATION_SINK=FileSink(sink_path))
+    with app.app_context():
+        yield app
+
+
+def read_sink(path):
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_notifications_are_delivered_after_commit(init_database, sink_path):
+    notifications.notify(user_name="Anna", book_title="Title")
+    notifications.notify(user_name="Bob", book_title="Title")
+    db.session.commit()
+
+    assert NotificationOutbox.query.count() == 2
+    assert get_dispatcher().queue.qsize() == 2
+
+    assert get_dispatcher().drain() == 2
+    assert [line["user_name"] for line in read_sink(sink_path)] == ["Anna", "Bob"]
+    assert read_sink(sink_path)[0]["message"] == (
+        "Notification - User's 'Anna' book 'Title' changed the status"
+    )
+    assert NotificationOutbox.query.count() == 0
+
+
+def test_notifications_are_discarded_on_rollback(init_database, sink_path):
+    notifications.notify(user_name="Anna", book_title="Title")
+    db.session.flush()
+    db.session.rollback()
+
+    assert get_dispatcher().queue.qsize() == 0
+    assert get_dispatcher().drain() == 0
+    assert read_sink(sink_path) == []
+
+
+def test_failed_delivery_is_retried_with_backoff(init_database):
+    dispatcher = get_dispatcher()
+    dispatcher.sink = FailingSink(failures=1)
+    dispatcher.backoff = 0.05
+    notifications.notify(user_name="Anna", book_title="Title")
+    db.session.commit()
+
+    assert dispatcher.drain() == 0
+    outbox = NotificationOutbox.query.one()
+    assert outbox.status == PENDING
+    assert outbox.attempts == 1
+    assert "sink is down" in outbox.last_error
+
+    time.sleep(0.1)
+    assert dispatcher.drain() == 1
+    assert [notification.user_name for notification in dispatcher.sink.sent] == ["Anna"]
+
+
+def test_delivery_gives_up_after_max_attempts(init_database):
+    dispatcher = get_dispatcher()
+    dispatcher.sink = FailingSink(failures=10)
+    dispatcher.backoff = 0
+    dispatcher.max_attempts = 3
+    notifications.notify(user_name="Anna", book_title="Title")
+    db.session.commit()
+
+    assert dispatcher.drain() == 0
+    outbox = NotificationOutbox.query.one()
+    assert outbox.status == FAILED
+    assert outbox.attempts == 3
+
+
+def test_claimed_notifications_are_not_delivered_twice(init_database, sink_path):
+    dispatcher = get_dispatcher()
+    notifications.notify(user_name="Anna", book_title="Title")
+    db.session.commit()
+    ids = dispatcher.due_ids(10)
+
+    assert dispatcher.deliver(ids) == 1
+    assert dispatcher.deliver(ids) == 0
+    assert len(read_sink(sink_path)) == 1
+
+
+def test_workers_deliver_in_background(tmp_path, sink_path):
+    database_uri = (
+        f"sqlite:///{tmp_path / 'library.db'}"
+        if DATABASE_URI.startswith("sqlite")
+        else DATABASE_URI
+    )
+    app = create_test_app(
+        database_uri,
+        NOTIFICATION_WORKERS=2,
+        NOTIFICATION_SWEEP_INTERVAL=0.1,
+        NOTIFICATION_SINK=FileSink(sink_path),
+    )
+    try:
+        with app.app_context():
+            db.create_all()
+        start_notifications(app)
+        with app.app_context():
+            # left over by a previous run, found by the sweep
+            db.session.add(
+                NotificationOutbox(
+                    user_name="Anna",
+                    book_title="Title",
+                    status=PENDING,
+                    attempts=0,
+                    next_attempt_at=notifications.utcnow(),
+                    created_at=notifications.utcnow(),
+                )
+            )
+            db.session.flush()
+            db.session.info.clear()
+            db.session.commit()
+            for number in range(20):
+                notifications.notify(user_name=f"user-{number}", book_title="Title")
+            db.session.commit()
+
+            deadline = time.monotonic() + 10
+            while len(read_sink(sink_path)) < 21 and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+            delivered = [line["user_name"] for line in read_sink(sink_path)]
+            assert sorted(delivered) == sorted(
+                ["Anna", *(f"user-{number}" for number in range(20))]
+            )
+            assert NotificationOutbox.query.count() == 0
+    finally:
+        get_dispatcher_of(app).stop()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+
+def get_dispatcher_of(app):
+    with app.app_context():
+        return get_dispatcher()
+
+
+def test_notifications_of_a_user_are_coalesced(init_database, sink_path):
+    notifications.notify_many(["Anna", "Bob", "Anna"], book_title="First")
+    notifications.notify_many(["Anna"], book_title="Second")
+    db.session.commit()
+
+    assert NotificationOutbox.query.count() == 3
+    assert get_dispatcher().drain() == 3
+    lines = {line["user_name"]: line for line in read_sink(sink_path)}
+    assert lines["Anna"]["book_titles"] == ["First", "Second"]
+    assert lines["Anna"]["message"] == (
+        "Notification - User's 'Anna' books 'First', 'Second' changed the status"
+    )
+    assert lines["Bob"]["book_titles"] == ["First"]
+
+
+def test_notifications_wait_for_coalesce_window(sink_path):
+    app = create_test_app(
+        NOTIFICATION_SINK=FileSink(sink_path), NOTIFICATION_COALESCE_WINDOW=0.2
+    )
+    with app.app_context():
+        db.create_all()
+        try:
+            notifications.notify(user_name="Anna", book_title="First")
+            db.session.commit()
+            assert get_dispatcher().drain() == 0
+
+            time.sleep(0.1)
+            notifications.notify(user_name="Anna", book_title="Second")
+            db.session.commit()
+            time.sleep(0.15)
+
+            # the first notification is due and takes the second one along
+            assert get_dispatcher().drain() == 2
+            assert [line["book_titles"] for line in read_sink(sink_path)] == [
+                ["First", "Second"]
+            ]
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_stopped_workers_start_again(tmp_path):
+    # a preloaded application stops its workers before it is forked into server processes
+    database_uri = (
+        f"sqlite:///{tmp_path / 'library.db'}"
+        if DATABASE_URI.startswith("sqlite")
+        else DATABASE_URI
+    )
+    app = create_test_app(database_uri, NOTIFICATION_WORKERS=1)
+    dispatcher = get_dispatcher_of(app)
+    try:
+        # started by serving entry points, not by create_app
+        assert dispatcher._threads == []
+        with app.app_context():
+            db.create_all()
+        start_notifications(app)
+        dispatcher.stop()
+        assert dispatcher._threads == []
+
+        dispatcher.start()
+
+        assert len(dispatcher._threads) == 2
+        assert all(thread.is_alive() for thread in dispatcher._threads)
+    finally:
+        dispatcher.stop()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+
+def test_sink_without_send_cannot_be_created():
+    class IncompleteSink(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteSink()
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.routes.apidocs import EXTENSION, flasgger_ui_directory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_spec_is_built_by_first_request(app, client):
+    assert EXTENSION not in app.extensions
+
+    response = client.get("/apispec_1.json")
+
+    assert response.status_code == 200
+    spec = response.get_json()
+    assert spec["info"]["title"] == "LibraryApp"
+    assert "/v1/books/search" in spec["paths"]
+    assert "/apidocs/" not in spec["paths"]
+    assert client.get("/apispec_1.json").get_json() == spec
+    assert app.extensions[EXTENSION].apispecs
+
+
+def test_swagger_ui_is_served(client):
+    response = client.get("/apidocs/")
+
+    assert response.status_code == 200
+    assert b"/apispec_1.json" in response.data
+    assert client.get("/flasgger_static/swagger-ui.css").status_code == 200
+    assert client.get("/apidocs/index.html").status_code == 302
+
+
+def test_missing_flasgger_is_reported(monkeypatch):
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+
+    with pytest.raises(ImportError, match="flasgger is required"):
+        flasgger_ui_directory()
+
+
+def test_startup_imports_no_pandas_or_flasgger():
+    # a fresh interpreter, modules imported by other tests are already loaded here
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys\n"
+            "from app import create_app\n"
+            "create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})\n"
+            "print(sorted({'pandas', 'flasgger'} & set(sys.modules)))",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert completed.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,267 @@
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.db.models import Book, Wishlist, User
+from app.db.search_index import (
+    SEARCH_TABLE,
+    build_match_expression,
+    ensure_search_index,
+)
+from app.utils.pagination import encode_cursor
+from tests.conftest import create_test_app
+from tests.database import requires_sqlite
+
+
+@pytest.fixture
+def init_database(init_database):
+    db.session.add_all(
+        [
+            Book(
+                book_id=1,
+                isbn=9780132350884,
+                authors="Robert C. Martin",
+                publication_year=2008,
+                title="Clean Code",
+                language="en",
+            ),
+            Book(
+                book_id=2,
+                isbn=9780134685991,
+                authors="Robert C. Martin",
+                publication_year=2017,
+                title="Clean Architecture",
+                language="en",
+            ),
+            Book(
+                book_id=3,
+                isbn=439554934,
+                authors="J.K. Rowling, Mary GrandPré",
+                publication_year=1997,
+                title="Harry Potter and the Philosopher's Stone",
+                language="eng",
+            ),
+        ]
+    )
+    db.session.commit()
+    return init_database
+
+
+def test_build_match_expression():
+    assert build_match_expression("Clean Code", None) == (
+        '(title : ("Clean"* AND "Code"*))'
+    )
+    assert build_match_expression(None, "rowl") == '(authors : ("rowl"*))'
+    assert build_match_expression("harry", "martin") == (
+        '(title : ("harry"*)) OR (authors : ("martin"*))'
+    )
+    assert build_match_expression('"*', None) is None
+
+
+def test_search_books_by_title_prefix(client, init_database):
+    response = client.get("/v1/books/search?title=CLEAN%20arch")
+
+    assert response.status_code == 200
+    assert [book["title"] for book in response.get_json()] == ["Clean Architecture"]
+
+
+def test_search_books_by_author_ignores_case(client, init_database):
+    response = client.get("/v1/books/search?author=GRANDPR")
+
+    assert response.status_code == 200
+    books = response.get_json()
+    assert len(books) == 1
+    # ISBN is kept as text by PostgreSQL
+    assert str(books[0].pop("isbn")) == "439554934"
+    assert books[0] == {
+        "id": 3,
+        "book_id": 3,
+        "authors": "J.K. Rowling, Mary GrandPré",
+        "publication_year": 1997,
+        "title": "Harry Potter and the Philosopher's Stone",
+        "language": "eng",
+        "is_wishlisted": False,
+    }
+
+
+@requires_sqlite
+def test_search_books_by_author_ignores_diacritics(client, init_database):
+    response = client.get("/v1/books/search?author=grandpre")
+
+    assert [book["book_id"] for book in response.get_json()] == [3]
+
+
+def test_search_books_by_title_or_author(client, init_database):
+    response = client.get("/v1/books/search?title=harry&author=martin")
+
+    assert response.status_code == 200
+    assert {book["book_id"] for book in response.get_json()} == {1, 2, 3}
+
+
+def test_search_books_ranks_best_match_first(client, init_database):
+    response = client.get("/v1/books/search?title=clean")
+
+    titles = [book["title"] for book in response.get_json()]
+    assert titles[0] == "Clean Code"
+    assert set(titles) == {"Clean Code", "Clean Architecture"}
+
+
+def test_search_books_reports_wishlisted_books(client, init_database):
+    user = User(user_name="John", user_type="user")
+    book = Book.query.filter_by(book_id=1).first()
+    db.session.add(Wishlist(user=user, book=book))
+    db.session.commit()
+
+    response = client.get("/v1/books/search?author=martin")
+
+    wishlisted = {
+        book["book_id"]: book["is_wishlisted"] for book in response.get_json()
+    }
+    assert wishlisted == {1: True, 2: False}
+
+
+def test_search_index_follows_book_changes(client, init_database):
+    book = Book.query.filter_by(book_id=1).first()
+    book.title = "Refactoring"
+    db.session.delete(Book.query.filter_by(book_id=2).first())
+    db.session.commit()
+
+    assert client.get("/v1/books/search?title=clean").get_json() == []
+    assert len(client.get("/v1/books/search?title=refactor").get_json()) == 1
+
+
+def test_search_books_requires_title_or_author(client, init_database):
+    response = client.get("/v1/books/search")
+
+    assert response.status_code == 400
+
+
+@requires_sqlite
+def test_ensure_search_index_builds_missing_index(client, init_database):
+    db.session.execute(db.text(f"DROP TABLE {SEARCH_TABLE}"))
+    db.session.commit()
+
+    assert ensure_search_index()
+    assert not ensure_search_index()
+    assert len(client.get("/v1/books/search?title=harry").get_json()) == 1
+
+
+def test_search_books_statement_count_does_not_depend_on_matches(client, init_database):
+    user = User(user_name="John", user_type="user")
+    books = [
+        Book(
+            book_id=100 + number,
+            isbn=number,
+            authors="Robert C. Martin",
+            publication_year=2000,
+            title=f"Volume {number}",
+            language="en",
+        )
+        for number in range(50)
+    ]
+    db.session.add_all(books)
+    db.session.add_all(Wishlist(user=user, book=book) for book in books[::2])
+    db.session.commit()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        narrow = client.get("/v1/books/search?title=harry").get_json()
+        narrow_count = len(statements)
+        statements.clear()
+        broad = client.get("/v1/books/search?author=martin").get_json()
+        broad_count = len(statements)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert len(narrow) == 1
+    assert len(broad) == 52
+    assert sum(book["is_wishlisted"] for book in broad) == 25
+    assert narrow_count == broad_count == 1
+
+
+def test_search_books_pages_with_cursor(client, init_database):
+    first_page = client.get("/v1/books/search?author=r&limit=2")
+    assert first_page.status_code == 200
+    assert len(first_page.get_json()) == 2
+    cursor = first_page.headers["X-Next-Cursor"]
+    assert 'rel="next"' in first_page.headers["Link"]
+
+    second_page = client.get(f"/v1/books/search?author=r&limit=2&after={cursor}")
+    assert second_page.status_code == 200
+    assert len(second_page.get_json()) == 1
+    assert "X-Next-Cursor" not in second_page.headers
+
+    all_books = client.get("/v1/books/search?author=r")
+    assert first_page.get_json() + second_page.get_json() == all_books.get_json()
+
+
+def test_search_books_streams_ndjson(client, init_database):
+    response = client.get("/v1/books/search?author=martin&stream=ndjson")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["book_id"] for line in lines] == [1, 2]
+
+
+def test_search_books_streams_json_array(client, init_database):
+    streamed = client.get("/v1/books/search?author=martin&stream=json")
+
+    assert (
+        streamed.get_json() == client.get("/v1/books/search?author=martin").get_json()
+    )
+
+
+def test_search_books_streams_after_request_teardown():
+    # servers push no application context of their own, so the session of the request is removed before streaming
+    app = create_test_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(
+            Book(
+                book_id=number,
+                isbn=number,
+                authors="Author",
+                publication_year=2000,
+                title=f"Title {number}",
+                language="en",
+            )
+            for number in range(3)
+        )
+        db.session.commit()
+    try:
+        response = app.test_client().get("/v1/books/search?title=title&stream=ndjson")
+
+        assert len(response.get_data(as_text=True).splitlines()) == 3
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "limit=0",
+        "limit=abc",
+        "limit=100000",
+        "after=abc",
+        f"after={encode_cursor([None, None])}",
+        f"after={encode_cursor([{'rank': 1}, 1])}",
+        f"after={encode_cursor([True, 1])}",
+        f"after={encode_cursor([0.5, 10**20])}",
+        "stream=xml",
+    ],
+)
+def test_search_books_rejects_invalid_page_args(client, init_database, query):
+    response = client.get(f"/v1/books/search?author=martin&{query}")
+
+    assert response.status_code == 400
@@ -0,0 +1,281 @@
+import threading
+
+import pytest
+from sqlalchemy import event, func, select
+
+from app import db
+from app.db.models import (
+    Book,
+    BookRentalStats,
+    NotificationOutbox,
+    Rentals,
+    User,
+    Wishlist,
+)
+from app.notifications.dispatcher import get_dispatcher
+from tests.conftest import create_test_app
+from tests.database import DATABASE_URI
+
+
+def add_book_with_wishlists(user_names):
+    book = Book(
+        book_id=42,
+        isbn=1,
+        authors="Author",
+        publication_year=2000,
+        title="Title",
+        language="en",
+    )
+    users = [User(user_name=name, user_type="user") for name in user_names]
+    db.session.add(book)
+    for user in users:
+        db.session.add(Wishlist(user=user, book=book))
+        db.session.flush()
+    db.session.commit()
+    return book
+
+
+def test_change_rental_status_lends_book_to_first_wishlist(client, init_database):
+    book = add_book_with_wishlists(["Anna", "Bob"])
+
+    response = client.post("/v1/rentals/42")
+
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"book_id": book.id, "book_title": "Title", "book_status": "borrowed"}
+    ]
+    rental = Rentals.query.one()
+    assert rental.user.user_name == "Anna"
+    assert [wishlist.user.user_name for wishlist in Wishlist.query.all()] == ["Bob"]
+    assert [n.user_name for n in NotificationOutbox.query.all()] == ["Anna"]
+
+
+def test_change_rental_status_returns_borrowed_book(client, init_database, capsys):
+    book = add_book_with_wishlists(["Anna", "Bob"])
+    client.post("/v1/rentals/42")
+
+    response = client.post("/v1/rentals/42")
+
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"book_id": book.id, "book_title": "Title", "book_status": "available"}
+    ]
+    assert Rentals.query.count() == 0
+    # borrowing notified Anna, returning the book notifies Bob still waiting for it
+    assert get_dispatcher().drain() == 2
+    output = capsys.readouterr().out
+    assert "User's 'Anna' book 'Title' changed the status" in output
+    assert "User's 'Bob' book 'Title' changed the status" in output
+    assert NotificationOutbox.query.count() == 0
+
+
+def test_change_rental_status_without_wishlists(client, init_database):
+    add_book_with_wishlists([])
+
+    response = client.post("/v1/rentals/42")
+
+    assert response.status_code == 404
+    assert Rentals.query.count() == 0
+
+
+def test_change_rental_status_of_unknown_book(client, init_database):
+    response = client.post("/v1/rentals/7")
+
+    assert response.status_code == 404
+
+
+def test_concurrent_rental_transitions_keep_invariants(tmp_path):
+    database_uri = (
+        f"sqlite:///{tmp_path / 'library.db'}"
+        if DATABASE_URI.startswith("sqlite")
+        else DATABASE_URI
+    )
+    app = create_test_app(database_uri)
+    user_names = [f"user-{number}" for number in range(40)]
+    with app.app_context():
+        db.create_all()
+        add_book_with_wishlists(user_names)
+
+    threads = 8
+    requests_per_thread = 10
+    statuses = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def hammer():
+        client = app.test_client()
+        barrier.wait()
+        for _ in range(requests_per_thread):
+            response = client.post("/v1/rentals/42")
+            with lock:
+                statuses.append(
+                    (response.status_code, response.get_json()[0]["book_status"])
+                    if response.status_code == 200
+                    else (response.status_code, None)
+                )
+
+    workers = [threading.Thread(target=hammer) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    borrowed = statuses.count((200, "borrowed"))
+    returned = statuses.count((200, "available"))
+    try:
+        with app.app_context():
+            # every request either lent or returned the book, it was never borrowed twice
+            assert len(statuses) == threads * requests_per_thread
+            # a transition losing races repeatedly gives up with 409 and changes nothing
+            assert {status for status, _ in statuses} <= {200, 409}
+            assert borrowed > 0
+            assert borrowed - returned == Rentals.query.count()
+            assert Rentals.query.count() <= 1
+            # every lending consumed a different wishlist
+            assert Wishlist.query.count() == len(user_names) - borrowed
+            remaining = {wishlist.user.user_name for wishlist in Wishlist.query.all()}
+            assert remaining == set(user_names[borrowed:])
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+
+def test_returning_book_notifies_waiting_users_in_constant_statements(
+    client, init_database
+):
+    def count_statements(user_names):
+        add_book_with_wishlists(user_names)
+        client.post("/v1/rentals/42")
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        try:
+            assert client.post("/v1/rentals/42").status_code == 200
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+
+        waiting = NotificationOutbox.query.filter(
+            NotificationOutbox.user_name != user_names[0]
+        ).count()
+        assert waiting == len(user_names) - 1
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        return len(statements)
+
+    assert count_statements(["Anna", "Bob"]) == count_statements(
+        [f"user-{number}" for number in range(50)]
+    )
+
+
+def add_books_with_wishlists(count, waiting):
+    # books 1..count, every one wishlisted by the same waiting users
+    users = [
+        User(user_name=f"user-{number}", user_type="user") for number in range(waiting)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    for number in range(1, count + 1):
+        book = Book(
+            book_id=number,
+            isbn=number,
+            authors="Author",
+            publication_year=2000,
+            title=f"Title {number}",
+            language="en",
+        )
+        db.session.add(book)
+        db.session.flush()
+        # a user holds many wishlists, which the one-to-one User.wishlist relationship cannot express
+        for user in users:
+            db.session.add(Wishlist(user_id=user.id, book_id=book.id))
+            db.session.flush()
+    db.session.commit()
+
+
+def test_bulk_change_rental_status(client, init_database):
+    add_books_with_wishlists(3, waiting=2)
+    client.post("/v1/rentals/2")
+    Wishlist.query.filter_by(book_id=Book.query.filter_by(book_id=3).one().id).delete()
+    db.session.commit()
+
+    response = client.post("/v1/rentals/bulk", json={"book_ids": [1, 2, 3, 7, 1]})
+
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"book_id": 1, "book_title": "Title 1", "book_status": "borrowed"},
+        {"book_id": 2, "book_title": "Title 2", "book_status": "available"},
+        {
+            "book_id": 3,
+            "book_title": "Title 3",
+            "error": "No wishlists found being linked to Title 3",
+        },
+        {"book_id": 7, "error": "Book not found"},
+    ]
+    rentals = Rentals.query.all()
+    assert [(rental.book.book_id, rental.user.user_name) for rental in rentals] == [
+        (1, "user-0")
+    ]
+    assert {(w.book.book_id, w.user.user_name) for w in Wishlist.query.all()} == {
+        (1, "user-1"),
+        (2, "user-1"),
+    }
+    notified = [(n.user_name, n.book_title) for n in NotificationOutbox.query.all()]
+    # user-0 borrowed book 2 by the single request, the rest comes from the bulk one
+    assert sorted(notified) == sorted(
+        [
+            ("user-0", "Title 2"),
+            ("user-0", "Title 1"),
+            ("user-1", "Title 2"),
+        ]
+    )
+
+
+def test_bulk_change_rental_status_toggles_back(client, init_database):
+    add_books_with_wishlists(5, waiting=1)
+
+    client.post("/v1/rentals/bulk", json={"book_ids": [1, 2, 3, 4, 5]})
+    response = client.post("/v1/rentals/bulk", json={"book_ids": [1, 2, 3, 4, 5]})
+
+    assert {result["book_status"] for result in response.get_json()} == {"available"}
+    assert Rentals.query.count() == 0
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [None, {}, {"book_ids": []}, {"book_ids": "1"}, {"book_ids": [1, "2"]}, [1]],
+)
+def test_bulk_change_rental_status_invalid_payload(client, init_database, payload):
+    response = client.post("/v1/rentals/bulk", json=payload)
+
+    assert response.status_code == 400
+    assert "book_ids" in response.get_json()["error"]
+
+
+def test_bulk_change_rental_status_statement_count_does_not_depend_on_books(
+    client, init_database
+):
+    add_books_with_wishlists(60, waiting=2)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        client.post("/v1/rentals/bulk", json={"book_ids": [1, 2]})
+        few = len(statements)
+        statements.clear()
+        client.post("/v1/rentals/bulk", json={"book_ids": list(range(3, 61))})
+        many = len(statements)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert few == many
+    assert Rentals.query.count() == 60
+    assert db.session.scalar(select(func.sum(BookRentalStats.rental_count))) == 60
@@ -0,0 +1,254 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.db.models import Book, BookRentalStats, Rentals, User, Wishlist
+from app.db.rental_history import ensure_rental_history
+from app.db.rental_stats import rebuild_rental_stats
+from app.utils.pagination import encode_cursor
+
+
+@pytest.fixture
+def rentals(init_database):
+    users = [User(user_name=name, user_type="user") for name in ("Anna", "Bob")]
+    books = [
+        Book(
+            book_id=10 + number,
+            isbn=number,
+            authors="Author",
+            publication_year=2000,
+            title=f"Title {number}",
+            language="en",
+        )
+        for number in range(4)
+    ]
+    now = datetime.now()
+    for user, book, days in (
+        (users[0], books[0], 5),
+        (users[1], books[1], 3),
+        (users[0], books[2], 1),
+        (users[1], books[3], 0),
+    ):
+        db.session.add(
+            Rentals(user=user, book=book, created_at=now - timedelta(days=days))
+        )
+        db.session.flush()
+    db.session.commit()
+    ensure_rental_history()
+    rebuild_rental_stats()
+    db.session.commit()
+    return books
+
+
+def test_amount_report(client, rentals):
+    response = client.get("/v1/reports/amount/borrowed")
+
+    assert response.status_code == 200
+    assert [row["days_rented"] for row in response.get_json()] == [5, 3, 1, 0]
+
+
+def test_amount_report_without_rentals(client, init_database):
+    response = client.get("/v1/reports/amount/borrowed")
+
+    assert response.status_code == 404
+
+
+def test_amount_report_pages(client, rentals):
+    first_page = client.get("/v1/reports/amount/borrowed?limit=3")
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = client.get(f"/v1/reports/amount/borrowed?limit=3&after={cursor}")
+
+    assert [row["days_rented"] for row in first_page.get_json()] == [5, 3, 1]
+    assert [row["days_rented"] for row in second_page.get_json()] == [0]
+    assert "X-Next-Cursor" not in second_page.headers
+
+
+def test_amount_report_page_past_the_end_is_empty(client, rentals):
+    cursor = encode_cursor([4])
+
+    response = client.get(f"/v1/reports/amount/borrowed?limit=3&after={cursor}")
+
+    assert response.status_code == 200
+    assert response.get_json() == []
+
+
+def test_top_rentals(client, rentals):
+    response = client.get("/v1/reports/top_rentals")
+
+    assert response.get_json() == [
+        {"title": f"Title {number}", "authors": "Author", "rental_count": 1}
+        for number in range(4)
+    ]
+
+
+def test_top_rentals_pages(client, rentals):
+    everything = client.get("/v1/reports/top_rentals").get_json()
+
+    pages = []
+    url = "/v1/reports/top_rentals?limit=1"
+    while url:
+        response = client.get(url)
+        pages.extend(response.get_json())
+        cursor = response.headers.get("X-Next-Cursor")
+        url = f"/v1/reports/top_rentals?limit=1&after={cursor}" if cursor else None
+
+    assert pages == everything
+
+
+def test_top_rentals_without_rentals(client, init_database):
+    response = client.get("/v1/reports/top_rentals")
+
+    assert response.get_json() == {"error": "No rentals found"}
+
+
+def test_top_rentals_by_username_pages(client, rentals):
+    everything = client.get("/v1/reports/top_rentals_by_username").get_json()
+    assert len(everything) == 4
+
+    first_page = client.get("/v1/reports/top_rentals_by_username?limit=2")
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = client.get(
+        f"/v1/reports/top_rentals_by_username?limit=2&after={cursor}"
+    )
+
+    assert first_page.get_json() + second_page.get_json() == everything
+
+
+def test_top_rentals_by_username_streams_ndjson(client, rentals):
+    response = client.get("/v1/reports/top_rentals_by_username?stream=ndjson")
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert rows == client.get("/v1/reports/top_rentals_by_username").get_json()
+
+
+def test_top_rentals_counts_every_borrowing(client, rentals):
+    anna = User.query.filter_by(user_name="Anna").one()
+    db.session.add(Wishlist(user_id=anna.id, book_id=rentals[3].id))
+    db.session.commit()
+
+    # book 13 is returned and borrowed again by Anna
+    client.post("/v1/rentals/13")
+    client.post("/v1/rentals/13")
+
+    top = client.get("/v1/reports/top_rentals?limit=1").get_json()
+    assert top == [{"title": "Title 3", "authors": "Author", "rental_count": 2}]
+    by_username = client.get("/v1/reports/top_rentals_by_username").get_json()
+    assert {
+        (row["title"], row["user_name"]): row["rental_count"] for row in by_username
+    } == {
+        ("Title 0", "Anna"): 1,
+        ("Title 1", "Bob"): 1,
+        ("Title 2", "Anna"): 1,
+        ("Title 3", "Bob"): 1,
+        ("Title 3", "Anna"): 1,
+    }
+
+
+def test_rebuild_rental_stats(client, rentals):
+    db.session.query(BookRentalStats).delete()
+    db.session.commit()
+    assert client.get("/v1/reports/top_rentals").get_json() == {
+        "error": "No rentals found"
+    }
+
+    response = client.post("/v1/reports/rental_stats/rebuild")
+
+    assert response.get_json() == {"books": 4, "book_users": 4}
+    assert len(client.get("/v1/reports/top_rentals").get_json()) == 4
+
+
+def test_rebuild_rental_stats_counts_returned_rentals(client, rentals):
+    before = client.get("/v1/reports/top_rentals").get_json()
+    assert client.post("/v1/rentals/10").status_code == 200
+
+    client.post("/v1/reports/rental_stats/rebuild")
+
+    assert client.get("/v1/reports/top_rentals").get_json() == before
+
+
+def test_rental_history_report(client, rentals):
+    today = datetime.now().date()
+    response = client.get(
+        f"/v1/reports/rental_history?from={today - timedelta(days=3)}"
+    )
+
+    # fixture rentals were checked out 5, 3, 1 and 0 days ago
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"book_id": 11, "title": "Title 1", "checkouts": 1, "returns": 0},
+        {"book_id": 12, "title": "Title 2", "checkouts": 1, "returns": 0},
+        {"book_id": 13, "title": "Title 3", "checkouts": 1, "returns": 0},
+    ]
+
+    first_page = client.get("/v1/reports/rental_history?limit=2")
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = client.get(f"/v1/reports/rental_history?limit=2&after={cursor}")
+    assert [row["book_id"] for row in first_page.get_json()] == [10, 11]
+    assert [row["book_id"] for row in second_page.get_json()] == [12, 13]
+
+
+@pytest.mark.parametrize(
+    "query", ["from=yesterday", "to=2024-13-01", "from=2024-02-01&to=2024-01-01"]
+)
+def test_rental_history_report_invalid_range(client, rentals, query):
+    response = client.get(f"/v1/reports/rental_history?{query}")
+
+    assert response.status_code == 400
+
+
+def test_compact_rental_history(client, rentals):
+    response = client.post("/v1/reports/rental_history/compact?retention_days=2")
+
+    assert response.get_json() == {"compacted": 2}
+    assert len(client.get("/v1/reports/rental_history").get_json()) == 4
+
+
+def test_amount_report_filters_by_days(client, rentals):
+    response = client.get(
+        "/v1/reports/amount/borrowed?min_days=1&max_days=3&overdue_days=2"
+    )
+
+    assert response.get_json() == [
+        {"book_id": 11, "title": "Title 1", "days_rented": 3, "overdue": True},
+        {"book_id": 12, "title": "Title 2", "days_rented": 1, "overdue": False},
+    ]
+
+
+def test_amount_report_histogram(client, rentals):
+    response = client.get("/v1/reports/amount/borrowed?histogram=2&overdue_days=2")
+
+    # fixture rentals were checked out 5, 3, 1 and 0 days ago
+    assert response.get_json() == [
+        {"from_days": 0, "to_days": 1, "count": 2, "overdue": 0},
+        {"from_days": 2, "to_days": 3, "count": 1, "overdue": 1},
+        {"from_days": 4, "to_days": 5, "count": 1, "overdue": 1},
+    ]
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/v1/reports/amount/available",
+        "/v1/reports/amount/borrowed?min_days=-1",
+        "/v1/reports/amount/borrowed?histogram=0",
+    ],
+)
+def test_amount_report_invalid_arguments(client, rentals, url):
+    assert client.get(url).status_code == 400
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        f"/v1/reports/amount/borrowed?after={encode_cursor([{'id': 1}])}",
+        f"/v1/reports/top_rentals?after={encode_cursor([None, None])}",
+        f"/v1/reports/top_rentals_by_username?after={encode_cursor(['1', 1, 1])}",
+    ],
+)
+def test_reports_reject_malformed_cursor(client, rentals, url):
+    response = client.get(url)
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "'after' is not a valid cursor."}
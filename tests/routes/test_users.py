@@ -0,0 +1,120 @@
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.db.models import User
+from app.db.repository import get_repository
+
+
+@pytest.fixture
+def init_database(init_database):
+    db.session.add(User(user_name="Anna", user_type="user"))
+    db.session.commit()
+    return init_database
+
+
+def test_create_users(client, init_database):
+    response = client.post(
+        "/v1/users/bulk",
+        json={
+            "users": [
+                {"user_name": "Anna", "user_type": "user"},
+                {"user_name": "Bob", "user_type": "staff"},
+                {"user_name": "Bob", "user_type": "user"},
+                {"user_name": "Carl", "user_type": "admin"},
+                {"user_type": "user"},
+                "Dave",
+            ]
+        },
+    )
+
+    assert response.status_code == 200
+    results = response.get_json()
+    assert [result["status"] for result in results] == [
+        "exists",
+        "created",
+        "duplicate",
+        "invalid",
+        "invalid",
+        "invalid",
+    ]
+    bob = User.query.filter_by(user_name="Bob").one()
+    assert results[1]["user_id"] == bob.id
+    assert bob.user_type == "staff"
+    assert User.query.count() == 2
+
+
+def test_create_users_from_ndjson(client, init_database):
+    body = (
+        '{"user_name": "Bob", "user_type": "user"}\n'
+        "\n"
+        '{"user_name": "Carl", "user_type": "staff"}\n'
+    )
+
+    response = client.post(
+        "/v1/users/bulk", data=body, content_type="application/x-ndjson"
+    )
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()] == [
+        "created",
+        "created",
+    ]
+    assert {user.user_name for user in User.query.all()} == {"Anna", "Bob", "Carl"}
+
+
+@pytest.mark.parametrize(
+    "body, content_type",
+    [
+        ('{"users": []}', "application/json"),
+        ('{"users": "Bob"}', "application/json"),
+        ("[]", "application/json"),
+        ('{"user_name": "Bob"}\nnot json\n', "application/x-ndjson"),
+    ],
+)
+def test_create_users_invalid_body(client, init_database, body, content_type):
+    response = client.post("/v1/users/bulk", data=body, content_type=content_type)
+
+    assert response.status_code == 400
+    assert User.query.count() == 1
+
+
+def test_create_users_statement_count_does_not_depend_on_users(client, init_database):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def create(names):
+        statements.clear()
+        response = client.post(
+            "/v1/users/bulk",
+            json={
+                "users": [{"user_name": name, "user_type": "user"} for name in names]
+            },
+        )
+        assert response.status_code == 200
+        return len(statements)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        few = create(["Bob", "Carl"])
+        many = create([f"user-{number}" for number in range(300)])
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert few == many
+    assert User.query.count() == 303
+
+
+def test_create_user_created_concurrently_is_a_conflict(
+    client, init_database, monkeypatch
+):
+    # the lookup misses a user committed by a concurrent request
+    monkeypatch.setattr(get_repository(), "get_user", lambda user_name: None)
+
+    response = client.post("/v1/users/Anna/user")
+
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "Username already exists"}
+    assert User.query.filter_by(user_name="Anna").count() == 1
@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import event, insert
+
+from app import db
+from app.db.models import Book, NotificationOutbox, User, Wishlist
+
+
+@pytest.fixture
+def init_database(init_database):
+    users = [User(user_name=name, user_type="user") for name in ("Anna", "Bob")]
+    books = [
+        Book(
+            book_id=number,
+            isbn=number,
+            authors="Author",
+            publication_year=2000,
+            title=f"Title {number}",
+            language="en",
+        )
+        for number in (1, 2, 3)
+    ]
+    db.session.add_all(users + books)
+    db.session.flush()
+    db.session.add(Wishlist(user_id=users[0].id, book_id=books[0].id))
+    db.session.commit()
+    return init_database
+
+
+def test_add_to_wishlist_added_concurrently_is_not_an_error(client, init_database):
+    bob = User.query.filter_by(user_name="Bob").one()
+    book = Book.query.filter_by(book_id=2).one()
+
+    def add_concurrently(session, flush_context, instances):
+        # the lookup misses a wishlist committed by a concurrent request
+        session.execute(insert(Wishlist).values(user_id=bob.id, book_id=book.id))
+
+    event.listen(db.session, "before_flush", add_concurrently, once=True)
+    response = client.post("/v1/wishlists/Bob/2")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "message": "Given user 'Bob' already has this book in a wishlist"
+    }
+    assert NotificationOutbox.query.count() == 0
+
+
+def test_add_to_wishlists(client, init_database):
+    response = client.post(
+        "/v1/wishlists/bulk",
+        json={
+            "wishlists": [
+                {"user_name": "Anna", "book_id": 1},
+                {"user_name": "Bob", "book_id": 1},
+                {"user_name": "Bob", "book_id": 2},
+                {"user_name": "Bob", "book_id": 2},
+                {"user_name": "Anna", "book_id": 2},
+                {"user_name": "Anna", "book_id": 3},
+                {"user_name": "Carl", "book_id": 3},
+                {"user_name": "Anna", "book_id": 7},
+                {"user_name": "Anna", "book_id": "3"},
+            ]
+        },
+    )
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()] == [
+        "exists",
+        "conflict",
+        "created",
+        "duplicate",
+        "conflict",
+        "created",
+        "not_found",
+        "not_found",
+        "invalid",
+    ]
+    wishlists = {
+        (wishlist.user.user_name, wishlist.book.book_id)
+        for wishlist in Wishlist.query.all()
+    }
+    assert wishlists == {("Anna", 1), ("Bob", 2), ("Anna", 3)}
+    notified = {(n.user_name, n.book_title) for n in NotificationOutbox.query.all()}
+    assert notified == {("Bob", "Title 2"), ("Anna", "Title 3")}
+
+
+def test_add_to_wishlists_from_ndjson(client, init_database):
+    response = client.post(
+        "/v1/wishlists/bulk",
+        data='{"user_name": "Bob", "book_id": 2}\n{"user_name": "Bob", "book_id": 3}\n',
+        content_type="application/x-ndjson",
+    )
+
+    assert [result["status"] for result in response.get_json()] == [
+        "created",
+        "created",
+    ]
+    assert Wishlist.query.count() == 3
+
+
+def test_add_to_wishlists_invalid_body(client, init_database):
+    response = client.post("/v1/wishlists/bulk", json={"users": []})
+
+    assert response.status_code == 400
+    assert "wishlists" in response.get_json()["error"]
@@ -0,0 +1,227 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("greenlet")
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import event
+
+from app import db
+from app.async_app import AsyncApp
+from app.db.models import Book, Rentals, User, Wishlist
+from app.db.rental_history import ensure_rental_history
+from app.db.rental_stats import rebuild_rental_stats
+from tests.conftest import create_test_app
+from tests.database import DATABASE_URI, requires_sqlite
+
+
+@pytest.fixture
+def loop():
+    # pooled connections of the asyncio engine belong to the loop which opened them
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def app(tmp_path, loop):
+    # an in-memory database would not be shared by both engines
+    database_uri = (
+        f"sqlite:///{tmp_path / 'library.db'}"
+        if DATABASE_URI.startswith("sqlite")
+        else DATABASE_URI
+    )
+    app = AsyncApp(create_test_app(database_uri))
+    with app.app.app_context():
+        db.create_all()
+        anna = User(user_name="Anna", user_type="user")
+        books = [
+            Book(
+                book_id=10 + number,
+                isbn=number,
+                authors="Author",
+                publication_year=2000,
+                title=f"Title {number}",
+                language="en",
+            )
+            for number in range(2)
+        ]
+        db.session.add_all([anna, *books])
+        db.session.flush()
+        db.session.add(
+            Rentals(
+                user=anna, book=books[0], created_at=datetime.now() - timedelta(days=3)
+            )
+        )
+        db.session.add(Wishlist(user_id=anna.id, book_id=books[1].id))
+        db.session.commit()
+        ensure_rental_history()
+        rebuild_rental_stats()
+        db.session.commit()
+    yield app
+    loop.run_until_complete(app.engine.dispose())
+    with app.app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+def call(app, loop, method, path, headers=()):
+    """
+    Send a request without a body to the ASGI application, returns status, headers and body
+    """
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    loop.run_until_complete(app(scope, receive, send))
+    start = messages[0]
+    response_headers = {
+        name.decode(): value.decode() for name, value in start["headers"]
+    }
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], response_headers, body
+
+
+def count_statements(engine):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    return statements
+
+
+def test_search_is_served_by_asyncio_engine(app, loop):
+    async_statements = count_statements(app.engine.sync_engine)
+    with app.app.app_context():
+        sync_statements = count_statements(db.engine)
+
+    status, headers, body = call(app, loop, "GET", "/v1/books/search?title=title")
+
+    assert status == 200
+    assert [book["book_id"] for book in json.loads(body)] == [10, 11]
+    assert json.loads(body)[1]["is_wishlisted"] is True
+    assert async_statements
+    assert sync_statements == []
+    assert headers["x-cache"] == "MISS"
+    assert "db;dur=" in headers["server-timing"]
+
+
+def test_reports_match_flask_responses(app, loop):
+    client = app.app.test_client()
+    for path in (
+        "/v1/reports/amount/borrowed?overdue_days=2",
+        "/v1/reports/amount/borrowed?histogram=7",
+        "/v1/reports/top_rentals?limit=1",
+        "/v1/reports/top_rentals_by_username",
+        "/v1/reports/rental_history",
+    ):
+        status, headers, body = call(app, loop, "GET", path)
+
+        expected = client.get(path)
+        assert status == expected.status_code
+        assert json.loads(body) == expected.get_json()
+        assert headers.get("link") == expected.headers.get("Link")
+
+
+def test_cached_responses_are_served_without_queries(app, loop):
+    _, headers, _ = call(app, loop, "GET", "/v1/reports/top_rentals")
+    statements = count_statements(app.engine.sync_engine)
+
+    status, cached_headers, _ = call(app, loop, "GET", "/v1/reports/top_rentals")
+    not_modified, _, body = call(
+        app,
+        loop,
+        "GET",
+        "/v1/reports/top_rentals",
+        headers=[("If-None-Match", headers["etag"])],
+    )
+
+    assert status == 200
+    assert cached_headers["x-cache"] == "HIT"
+    assert not_modified == 304
+    assert body == b""
+    assert statements == []
+
+
+def test_writes_are_served_by_flask(app, loop):
+    call(app, loop, "GET", "/v1/books/search?title=title")
+
+    # the wishlisted book is lent to Anna
+    status, _, _ = call(app, loop, "POST", "/v1/rentals/11")
+
+    assert status == 200
+    _, headers, body = call(app, loop, "GET", "/v1/books/search?title=title")
+    assert headers["x-cache"] == "MISS"
+    assert json.loads(body)[1]["is_wishlisted"] is False
+
+
+def test_invalid_arguments_and_streams(app, loop):
+    status, _, body = call(app, loop, "GET", "/v1/books/search")
+    assert status == 400
+    assert "error" in json.loads(body)
+
+    status, headers, body = call(
+        app, loop, "GET", "/v1/books/search?title=title&stream=ndjson"
+    )
+    assert status == 200
+    assert headers["content-type"] == "application/x-ndjson"
+    assert len(body.splitlines()) == 2
+
+
+@requires_sqlite
+def test_in_memory_database_is_served_by_flask(loop, capsys):
+    app = AsyncApp(create_test_app("sqlite:///:memory:"))
+    with app.app.app_context():
+        db.create_all()
+
+    status, _, body = call(app, loop, "GET", "/v1/books/search?title=title")
+
+    assert app.engine is None
+    assert "served by the Flask application" in capsys.readouterr().out
+    assert status == 200
+    assert json.loads(body) == []
+
+
+def test_lifespan_starts_and_stops_notification_workers(app, loop):
+    dispatcher = app.app.extensions["notifications"]
+    dispatcher.workers = 1
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        message = next(messages)
+        if message["type"] == "lifespan.shutdown":
+            assert all(thread.is_alive() for thread in dispatcher._threads)
+            assert len(dispatcher._threads) == 2
+        return message
+
+    async def send(message):
+        sent.append(message["type"])
+
+    loop.run_until_complete(app({"type": "lifespan"}, receive, send))
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert dispatcher._threads == []
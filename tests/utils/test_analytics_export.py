@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from app import db
+from app.db.models import Book, Rentals, User, Wishlist
+from app.db.rental_history import CHECKOUT, record_events
+from app.utils.analytics_export import export_database
+from tests.conftest import create_test_app
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_test_app(EXPORT_DIRECTORY=str(tmp_path / "exports"))
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def library(init_database):
+    users = [User(user_name=name, user_type="user") for name in ("Anna", "Bob")]
+    books = [
+        Book(
+            book_id=10 + number,
+            isbn=number,
+            authors="Author",
+            publication_year=2000,
+            title=f"Title {number}",
+            language="en",
+        )
+        for number in range(3)
+    ]
+    db.session.add_all(users + books)
+    db.session.flush()
+    db.session.add(Wishlist(user_id=users[1].id, book_id=books[0].id))
+    db.session.add(
+        Rentals(
+            user_id=users[0].id,
+            book_id=books[0].id,
+            created_at=datetime.now() - timedelta(days=2),
+        )
+    )
+    db.session.commit()
+    return users, books
+
+
+def borrow(user, book):
+    db.session.add(Rentals(user_id=user.id, book_id=book.id))
+    record_events(CHECKOUT, [(book.id, user.id)])
+    db.session.commit()
+
+
+def test_export_database(tmp_path, library):
+    report = export_database(tmp_path, chunksize=1)
+
+    assert report.rows == {
+        "book": 3,
+        "user": 2,
+        "wishlist": 1,
+        "rentals": 1,
+        "rental_event": 0,
+    }
+    books = pd.read_parquet(tmp_path / "book.parquet")
+    assert sorted(books["title"]) == ["Title 0", "Title 1", "Title 2"]
+    # one row group per chunk
+    assert books["isbn"].tolist() == ["0", "1", "2"]
+    rentals = pd.read_parquet(tmp_path / "rentals")
+    assert len(rentals) == 1
+    assert rentals["created_at"].dtype.kind == "M"
+
+
+def test_incremental_export_adds_new_rentals(tmp_path, library):
+    users, books = library
+    now = datetime.now()
+    export_database(tmp_path, until=now - timedelta(seconds=1))
+    borrow(users[1], books[1])
+
+    report = export_database(
+        tmp_path, incremental=True, until=now + timedelta(seconds=2)
+    )
+
+    assert report.rows["rentals"] == 1
+    assert report.rows["rental_event"] == 1
+    assert report.rows["book"] == 3
+    rentals = pd.read_parquet(tmp_path / "rentals")
+    assert sorted(rentals["book_id"]) == [books[0].id, books[1].id]
+
+    report = export_database(
+        tmp_path, incremental=True, until=now + timedelta(seconds=3)
+    )
+    assert report.rows["rentals"] == 0
+    assert len(pd.read_parquet(tmp_path / "rentals")) == 2
+
+    # full export replaces the parts
+    export_database(tmp_path, until=now + timedelta(seconds=4))
+    assert len(pd.read_parquet(tmp_path / "rentals")) == 2
+
+
+def test_export_endpoint(app, client, library):
+    response = client.post("/v1/reports/export?incremental=true")
+
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["since"] is None
+    assert report["rows"]["user"] == 2
+    users = pd.read_parquet(f"{app.config['EXPORT_DIRECTORY']}/user.parquet")
+    assert sorted(users["user_name"]) == ["Anna", "Bob"]
+
+    second = client.post("/v1/reports/export?incremental=true").get_json()
+    assert second["since"] == report["until"]
+    assert second["rows"]["rentals"] == 0
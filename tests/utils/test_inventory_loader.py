@@ -1,31 +1,13 @@
+import os
 import textwrap
 
 import pytest
 
-from app import create_app, db
-from app.db.models import Book
-from app.utils.inventory_loader import load_inventory
-
-
-@pytest.fixture
-def app():
-    app = create_app(
-        test_config={
-            "TESTING": True,
-            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
-            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
-        }
-    )
-    with app.app_context():
-        yield app
-
-
-@pytest.fixture
-def init_database(app):
-    db.create_all()
-    yield db
-    db.session.remove()
-    db.drop_all()
+from app import db
+from app.db.models import Book, ImportCheckpoint, Rentals, User, Wishlist
+from app.utils import inventory_loader
+from app.utils.bulk_insert import bulk_upsert
+from app.utils.inventory_loader import book_staging, load_inventory
 
 
 def test_load_inventory(tmp_path, init_database):
@@ -52,3 +34,174 @@ def test_load_inventory(tmp_path, init_database):
     second_book = Book.query.filter_by(isbn=9780134685991).first()
     assert second_book.authors == "Robert C. Martin"
     assert second_book.publication_year == 2017
+
+
+def test_load_inventory_replaces_books_and_keeps_missing_values(
+    tmp_path, init_database
+):
+    csv_content = textwrap.dedent(
+        """\
+    Id,ISBN,Authors,Publication Year,Title,Language
+    3,014028009X,"Helen Fielding",1996,,eng
+    """
+    )
+
+    tmp_file = tmp_path / "inventory.csv"
+    tmp_file.write_text(csv_content)
+
+    load_inventory(str(tmp_file))
+    load_inventory(str(tmp_file))
+
+    books = Book.query.all()
+    assert len(books) == 1
+    assert books[0].isbn == "014028009X"
+    assert books[0].title is None
+    assert books[0].language == "eng"
+
+
+def write_inventory(path, rows):
+    lines = ["Id,ISBN,Authors,Publication Year,Title,Language"]
+    lines += [
+        f"{number},{number},Author {number},2000,Title {number},en" for number in rows
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_load_inventory_in_chunks(tmp_path, init_database):
+    tmp_file = tmp_path / "inventory.csv"
+    write_inventory(tmp_file, range(1, 11))
+
+    load_inventory(str(tmp_file), chunksize=3)
+
+    assert sorted(book.book_id for book in Book.query.all()) == list(range(1, 11))
+    assert ImportCheckpoint.query.count() == 0
+
+
+def test_load_inventory_in_chunks_resumes_interrupted_import(
+    tmp_path, init_database, monkeypatch
+):
+    tmp_file = tmp_path / "inventory.csv"
+    write_inventory(tmp_file, range(1, 11))
+
+    calls = []
+
+    def fail_on_third_chunk(table, df, key):
+        calls.append(len(df))
+        if len(calls) == 3:
+            raise RuntimeError("killed")
+        return bulk_upsert(table, df, key)
+
+    monkeypatch.setattr(inventory_loader, "bulk_upsert", fail_on_third_chunk)
+    with pytest.raises(RuntimeError):
+        load_inventory(str(tmp_file), chunksize=3)
+    db.session.rollback()
+
+    # books are synchronized only once the whole file has been staged
+    assert Book.query.count() == 0
+    assert db.session.query(book_staging).count() == 6
+    assert ImportCheckpoint.query.one().rows_committed == 6
+
+    monkeypatch.setattr(inventory_loader, "bulk_upsert", bulk_upsert)
+    load_inventory(str(tmp_file), chunksize=4)
+
+    assert sorted(book.book_id for book in Book.query.all()) == list(range(1, 11))
+    assert ImportCheckpoint.query.count() == 0
+
+
+def test_load_inventory_discards_checkpoint_of_interrupted_import(
+    tmp_path, init_database, monkeypatch
+):
+    tmp_file = tmp_path / "inventory.csv"
+    write_inventory(tmp_file, range(1, 7))
+
+    def fail_on_second_chunk(table, df, key):
+        if df["book_id"].iloc[0] > 2:
+            raise RuntimeError("killed")
+        return bulk_upsert(table, df, key)
+
+    monkeypatch.setattr(inventory_loader, "bulk_upsert", fail_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        load_inventory(str(tmp_file), chunksize=2)
+    db.session.rollback()
+    monkeypatch.setattr(inventory_loader, "bulk_upsert", bulk_upsert)
+
+    load_inventory(str(tmp_file))
+    assert ImportCheckpoint.query.count() == 0
+
+    load_inventory(str(tmp_file), chunksize=2)
+    assert sorted(book.book_id for book in Book.query.all()) == list(range(1, 7))
+
+
+def test_load_inventory_in_chunks_restarts_when_file_changed(tmp_path, init_database):
+    tmp_file = tmp_path / "inventory.csv"
+    write_inventory(tmp_file, range(1, 11))
+    db.session.add(
+        ImportCheckpoint(
+            source=os.path.abspath(tmp_file), signature="outdated", rows_committed=6
+        )
+    )
+    db.session.commit()
+
+    load_inventory(str(tmp_file), chunksize=3)
+
+    assert Book.query.count() == 10
+
+
+def test_load_inventory_writes_only_differences(tmp_path, init_database):
+    tmp_file = tmp_path / "inventory.csv"
+    write_inventory(tmp_file, range(1, 101))
+    load_inventory(str(tmp_file))
+    ids = {book.book_id: book.id for book in Book.query.all()}
+
+    write_inventory(tmp_file, [number for number in range(2, 102)])
+    content = tmp_file.read_text().replace("Title 50,", "Title Fifty,")
+    tmp_file.write_text(content)
+    report = load_inventory(str(tmp_file))
+
+    assert (report.rows, report.inserted, report.updated, report.deleted) == (
+        100,
+        1,
+        1,
+        1,
+    )
+    books = {book.book_id: book for book in Book.query.all()}
+    assert sorted(books) == list(range(2, 102))
+    assert books[50].title == "Title Fifty"
+    assert all(books[number].id == ids[number] for number in range(2, 101))
+    assert db.session.query(book_staging).count() == 0
+
+
+def test_load_inventory_removes_wishlists_and_keeps_rented_books(
+    tmp_path, init_database
+):
+    tmp_file = tmp_path / "inventory.csv"
+    write_inventory(tmp_file, range(1, 5))
+    load_inventory(str(tmp_file))
+    books = {book.book_id: book.id for book in Book.query.all()}
+    anna = User(user_name="Anna", user_type="user")
+    db.session.add(anna)
+    db.session.flush()
+    db.session.add_all(
+        [
+            Wishlist(user_id=anna.id, book_id=books[2]),
+            Wishlist(user_id=anna.id, book_id=books[3]),
+            Rentals(user_id=anna.id, book_id=books[3]),
+        ]
+    )
+    db.session.commit()
+
+    write_inventory(tmp_file, [1, 4])
+    report = load_inventory(str(tmp_file))
+
+    assert (report.deleted, report.kept_rented) == (1, 1)
+    assert sorted(book.book_id for book in Book.query.all()) == [1, 3, 4]
+    assert [wish.book_id for wish in Wishlist.query.all()] == [books[3]]
+    assert Rentals.query.one().book.book_id == 3
+
+    db.session.delete(Rentals.query.one())
+    db.session.commit()
+    report = load_inventory(str(tmp_file))
+
+    assert (report.deleted, report.kept_rented) == (1, 0)
+    assert sorted(book.book_id for book in Book.query.all()) == [1, 4]
+    assert Wishlist.query.count() == 0
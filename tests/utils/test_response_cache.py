@@ -0,0 +1,115 @@
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.db.models import Book, CacheGeneration, User, Wishlist
+from app.db.repository import get_repository
+from app.utils.response_cache import RESPONSES
+
+
+@pytest.fixture
+def init_database(init_database):
+    anna = User(user_name="Anna", user_type="user")
+    book = Book(
+        book_id=10,
+        isbn=1,
+        authors="Author",
+        publication_year=2000,
+        title="Title",
+        language="en",
+    )
+    db.session.add_all([anna, book])
+    db.session.flush()
+    db.session.add(Wishlist(user_id=anna.id, book_id=book.id))
+    db.session.commit()
+    return init_database
+
+
+def test_repeated_request_is_served_from_memory(client, init_database):
+    first = client.get("/v1/books/search?title=title&author=author")
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        # arguments are normalized, so their order does not matter
+        second = client.get("/v1/books/search?author=author&title=title")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert statements == []
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.get_json() == first.get_json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert not second.headers["ETag"].startswith("W/")
+    assert second.headers["Cache-Control"] == "public, no-cache"
+
+
+def test_matching_etag_is_not_modified(client, init_database):
+    etag = client.get("/v1/books/search?title=title").headers["ETag"]
+
+    response = client.get(
+        "/v1/books/search?title=title", headers={"If-None-Match": etag}
+    )
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+
+
+def test_writes_drop_cached_responses(client, init_database):
+    before = client.get("/v1/books/search?title=title")
+    assert before.get_json()[0]["is_wishlisted"] is True
+
+    # the book is lent to Anna consuming her wishlist
+    client.post("/v1/rentals/10")
+
+    after = client.get(
+        "/v1/books/search?title=title",
+        headers={"If-None-Match": before.headers["ETag"]},
+    )
+    assert after.status_code == 200
+    assert after.headers["X-Cache"] == "MISS"
+    assert after.get_json()[0]["is_wishlisted"] is False
+    assert client.get("/v1/reports/top_rentals").get_json()[0]["rental_count"] == 1
+
+
+def test_shared_invalidation_is_recorded_after_commit(app, client, init_database):
+    get_repository().sync_interval = 60
+    events = []
+    event.listen(
+        db.engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: events.append(statement),
+    )
+    event.listen(db.engine, "commit", lambda conn: events.append("COMMIT"))
+
+    assert client.post("/v1/rentals/10").status_code == 200
+
+    upserts = [
+        number
+        for number, statement in enumerate(events)
+        if statement.startswith("INSERT INTO cache_generation")
+    ]
+    # the write commits before the generation row is locked
+    assert upserts and events.index("COMMIT") < upserts[0]
+    assert db.session.get(CacheGeneration, RESPONSES).generation >= 1
+
+
+def test_failed_write_keeps_cached_responses(client, init_database):
+    client.get("/v1/books/search?title=title")
+
+    client.post("/v1/wishlists/Nobody/10")
+
+    assert client.get("/v1/books/search?title=title").headers["X-Cache"] == "HIT"
+
+
+def test_errors_and_streams_are_not_cached(client, init_database):
+    assert client.get("/v1/books/search").status_code == 400
+    assert "ETag" not in client.get("/v1/books/search").headers
+
+    streamed = client.get("/v1/books/search?title=title&stream=ndjson")
+    assert "X-Cache" not in streamed.headers
@@ -1,33 +1,9 @@
 import textwrap
 
-import pytest
-
-from app import create_app, db
 from app.db.models import User
 from app.utils.users_loader import load_users
 
 
-@pytest.fixture
-def app():
-    app = create_app(
-        test_config={
-            "TESTING": True,
-            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
-            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
-        }
-    )
-    with app.app_context():
-        yield app
-
-
-@pytest.fixture
-def init_database(app):
-    db.create_all()
-    yield db
-    db.session.remove()
-    db.drop_all()
-
-
 def test_load_users(tmp_path, init_database):
     csv_content = textwrap.dedent(
         """\